@@ -0,0 +1,315 @@
+"""Discover Python interpreters and pick the fastest suitable one.
+
+Candidates are collected from ``PATH``, the active virtual environment, a
+``.venv`` in the working directory, and the interpreters managed by pyenv and
+uv. Each distinct interpreter is probed concurrently: its version, the
+installed versions of the packages named on the command line, and its startup
+time. The report is printed as one JSON object.
+
+Each candidate is probed by running it, not the file it resolves to, with the
+``--json`` probe of ``get_package_version.py``. Candidates resolving to the same
+file are only merged if they also report the same ``sys.prefix``, so virtual
+environments are kept apart from their base interpreter.
+
+With ``--cache-dir DIR`` the capability records are cached on disk, keyed by
+the candidate path and its modification time, and invalidated when any of its
+``sys.path`` directories change, so later runs only re-probe interpreters that
+were added or modified. Startup times are cached as well.
+"""
+
+from __future__ import annotations
+
+from argparse import ArgumentParser
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from glob import glob
+from json import dumps, loads
+from os import X_OK, access, environ, getcwd, makedirs, pathsep, replace, stat
+from os.path import abspath, dirname, expanduser, isdir, isfile, join, realpath
+from subprocess import DEVNULL, SubprocessError, run
+from sys import argv, platform
+from time import perf_counter
+from typing import Any
+
+"""Public API of this module."""
+__all__ = ("candidates", "discover", "main", "probe")
+
+"""Minimum interpreter version that can run the plugin's Python helpers."""
+_MINIMUM_VERSION = (3, 9)
+
+"""Interpreter file names searched for in each ``PATH`` directory."""
+_PATH_NAMES = (
+    ("python.exe", "python3.exe")
+    if platform == "win32"
+    else ("python3", "python", *(f"python3.{minor}" for minor in range(9, 15)))
+)
+
+"""Relative path of the interpreter inside a virtual environment."""
+_VENV_INTERPRETER = (
+    join("Scripts", "python.exe") if platform == "win32" else join("bin", "python")
+)
+
+"""Name of the cache file written under ``--cache-dir``."""
+_CACHE_FILE = "python-interpreters.json"
+
+"""Version of the cache file format; bump when `probe` records change."""
+_CACHE_FORMAT = 2
+
+"""File name of the probe script run by each candidate, next to this module."""
+_PROBE_SCRIPT = "get_package_version.py"
+
+
+def candidates(
+    env: Mapping[str, str] = environ, cwd: str | None = None
+) -> Iterator[str]:
+    """Yield candidate interpreter paths, most preferred first.
+
+    Paths may repeat or resolve to the same interpreter; `discover` removes
+    duplicates.
+    """
+    for directory in env.get("PATH", "").split(pathsep):
+        if directory:
+            for name in _PATH_NAMES:
+                yield join(directory, name)
+    virtual_env = env.get("VIRTUAL_ENV", "")
+    if virtual_env:
+        yield join(virtual_env, _VENV_INTERPRETER)
+    yield join(getcwd() if cwd is None else cwd, ".venv", _VENV_INTERPRETER)
+    pyenv_root = env.get("PYENV_ROOT") or expanduser(join("~", ".pyenv"))
+    yield from sorted(glob(join(pyenv_root, "versions", "*", _VENV_INTERPRETER)))
+    uv_python = env.get("UV_PYTHON_INSTALL_DIR") or (
+        join(env.get("APPDATA", ""), "uv", "python")
+        if platform == "win32"
+        else join(
+            env.get("XDG_DATA_HOME") or expanduser(join("~", ".local", "share")),
+            "uv",
+            "python",
+        )
+    )
+    yield from sorted(
+        glob(
+            join(uv_python, "*", "python.exe")
+            if platform == "win32"
+            else join(uv_python, "*", "bin", "python3")
+        )
+    )
+
+
+def _executable(path: str) -> bool:
+    """Check if `path` is an executable file."""
+    return isfile(path) and access(path, X_OK)
+
+
+def probe(
+    interpreter: str, packages: Sequence[str], timeout: float, source: str
+) -> dict[str, Any]:
+    """Describe `interpreter` by running it with the probe script `source`.
+
+    The record is the ``--json`` probe of ``get_package_version.py`` for
+    `packages`, with the unresolved `interpreter` path and the startup time
+    in milliseconds, the time taken to run an empty program. If the
+    interpreter fails or times out, the record has an ``error`` instead.
+    """
+    path = abspath(interpreter)
+    try:
+        start = perf_counter()
+        run(
+            (path, "-c", ""),
+            stdin=DEVNULL,
+            stdout=DEVNULL,
+            stderr=DEVNULL,
+            timeout=timeout,
+            check=False,
+        )
+        startup = perf_counter() - start
+        process = run(
+            (path, "-c", source, "--json", *packages),
+            stdin=DEVNULL,
+            capture_output=True,
+            timeout=timeout,
+            check=True,
+        )
+        record = loads(process.stdout)
+    except (OSError, SubprocessError, ValueError) as exc:
+        return {
+            "executable": path,
+            "error": f"{type(exc).__name__}: {exc}",
+        }
+    record["executable"] = path
+    record["startup_ms"] = round(startup * 1000, 3)
+    return record
+
+
+def _version(record: Mapping[str, Any]) -> tuple[int, ...]:
+    """Return the major and minor version of the probed interpreter."""
+    return tuple(int(part) for part in record["python"].split(".")[:2])
+
+
+def _suitable(record: Mapping[str, Any], packages: Iterable[str]) -> bool:
+    """Check if the probed interpreter is supported and has all `packages`."""
+    if "error" in record or _version(record) < _MINIMUM_VERSION:
+        return False
+    return all(record["packages"].get(package) for package in packages)
+
+
+def _load_cache(cache_dir: str) -> dict[str, Any]:
+    """Load the cache records in `cache_dir`, keyed by interpreter path."""
+    try:
+        with open(join(cache_dir, _CACHE_FILE), encoding="UTF-8") as file:
+            cache = loads(file.read())
+        if cache["format"] == _CACHE_FORMAT:
+            return dict(cache["interpreters"])
+    except (KeyError, OSError, TypeError, ValueError):
+        pass
+    return {}
+
+
+def _cached(
+    cache: Mapping[str, Any], path: str, packages: Iterable[str]
+) -> dict[str, Any] | None:
+    """Return the cached record of the interpreter `path` if it is still valid."""
+    try:
+        entry = cache[path]
+        record = entry["record"]
+        if (
+            entry["mtime_ns"] != stat(path).st_mtime_ns
+            or "error" in record
+            or not isdir(record["prefix"])
+            or any(package not in record["packages"] for package in packages)
+            or any(
+                stat(directory).st_mtime_ns != mtime
+                for directory, mtime in record["site"].items()
+            )
+        ):
+            return None
+    except (KeyError, OSError, TypeError):
+        return None
+    return record
+
+
+def _store_cache(cache_dir: str, records: Iterable[Mapping[str, Any]]) -> None:
+    """Write the successful `records` to the cache in `cache_dir`."""
+    interpreters = dict[str, Any]()
+    for record in records:
+        if "error" not in record:
+            with suppress(OSError):
+                interpreters[record["executable"]] = {
+                    "mtime_ns": stat(record["executable"]).st_mtime_ns,
+                    "record": record,
+                }
+    cache_file = join(cache_dir, _CACHE_FILE)
+    with suppress(OSError):
+        makedirs(cache_dir, exist_ok=True)
+        with open(f"{cache_file}.tmp", "w", encoding="UTF-8") as file:
+            file.write(dumps({"format": _CACHE_FORMAT, "interpreters": interpreters}))
+        replace(f"{cache_file}.tmp", cache_file)
+
+
+def _merge(records: Iterable[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+    """Yield the first of the `records` of each distinct interpreter.
+
+    Records are of the same interpreter if their paths resolve to the same
+    file and they report the same ``sys.prefix``.
+    """
+    seen: set[tuple[str, str | None]] = set()
+    for record in records:
+        key = (realpath(record["executable"]), record.get("prefix"))
+        if key not in seen:
+            seen.add(key)
+            yield record
+
+
+def discover(
+    paths: Iterable[str],
+    packages: Sequence[str] = (),
+    *,
+    script: str | None = None,
+    cache_dir: str | None = None,
+    jobs: int | None = None,
+    timeout: float = 10.0,
+) -> dict[str, Any]:
+    """Probe the interpreters at `paths` concurrently.
+
+    Returns the records of the distinct interpreters found, sorted by startup
+    time, and ``best``, the path of the fastest suitable one or `None`. A
+    record is ``suitable`` if the interpreter is supported and has all
+    `packages` installed. Interpreters are probed with the probe script at
+    `script`, by default ``get_package_version.py`` next to this module.
+    Valid records in the cache in `cache_dir` are reused instead of probing.
+    """
+    paths = list(dict.fromkeys(abspath(path) for path in paths if _executable(path)))
+    cache = {} if cache_dir is None else _load_cache(cache_dir)
+    records = dict[str, Any]()
+    for path in paths:
+        record = _cached(cache, path, packages)
+        if record is not None:
+            records[path] = record
+    pending = [path for path in paths if path not in records]
+    if pending:
+        if script is None:
+            script = join(dirname(abspath(__file__)), _PROBE_SCRIPT)
+        with open(script, encoding="UTF-8") as file:
+            source = file.read()
+        with ThreadPoolExecutor(min(jobs or len(pending), len(pending))) as pool:
+            records.update(
+                zip(
+                    pending,
+                    pool.map(
+                        lambda path: probe(path, packages, timeout, source), pending
+                    ),
+                )
+            )
+    unique = list(_merge(records[path] for path in paths))
+    for record in unique:
+        record["suitable"] = _suitable(record, packages)
+    interpreters = sorted(
+        unique,
+        key=lambda record: (
+            "error" in record,
+            record.get("startup_ms", 0.0),
+            record["executable"],
+        ),
+    )
+    if cache_dir is not None and pending:
+        _store_cache(cache_dir, records.values())
+    best = next((record for record in interpreters if record["suitable"]), None)
+    return {
+        "interpreters": interpreters,
+        "best": None if best is None else best["executable"],
+    }
+
+
+def main(argv: Sequence[str]) -> None:
+    """Print the discovery report of the packages named in `argv` as JSON."""
+    parser = ArgumentParser(prog="discover_python")
+    parser.add_argument("--cache-dir", metavar="DIR")
+    parser.add_argument(
+        "--probe-script",
+        metavar="PATH",
+        help=f"path of {_PROBE_SCRIPT}, by default next to this script",
+    )
+    parser.add_argument("--jobs", type=int, metavar="N")
+    parser.add_argument("--timeout", type=float, default=10.0, metavar="SECONDS")
+    parser.add_argument(
+        "--interpreter",
+        action="append",
+        default=[],
+        metavar="PATH",
+        help="additional candidate interpreter",
+    )
+    parser.add_argument("packages", nargs="*")
+    options = parser.parse_args(argv[1:])
+    report = discover(
+        (*options.interpreter, *candidates()),
+        options.packages,
+        script=options.probe_script,
+        cache_dir=options.cache_dir,
+        jobs=options.jobs,
+        timeout=options.timeout,
+    )
+    print(dumps(report))
+
+
+if __name__ == "__main__":
+    main(argv)
@@ -1,21 +1,187 @@
 """Print package name and installed version from command-line.
 
 Utility used by scripts and tests to query an installed package's version.
+
+With ``--json`` it instead probes the interpreter in a single launch: its
+version and platform, the versions of every package named on the command line
+and whether optional accelerators are importable, printed as one JSON object.
+``--cache-dir DIR`` also stores that result on disk, keyed by the interpreter
+path given with ``--interpreter``, so that the caller can look it up with
+``stat`` calls alone before launching the interpreter again, see `load_cached`.
+
+This script also runs on interpreters older than the plugin supports, so
+that they are reported as unsatisfied rather than broken: keep it free of
+syntax and runtime features newer than Python 3.8.
 """
 
+from __future__ import annotations
+
+from argparse import ArgumentParser
 from collections.abc import Sequence
+from contextlib import suppress
+from hashlib import sha256
 from importlib.metadata import PackageNotFoundError, version
-from sys import argv
+from importlib.util import find_spec
+from json import dumps, loads
+from os import makedirs, replace, stat
+from os.path import abspath, dirname, isdir, join
+from platform import machine, python_version
+from sys import argv, executable, implementation, path, platform, prefix
+from typing import Any
 
 """Public API of this module."""
-__all__ = ("main",)
+__all__ = ("load_cached", "main", "probe")
+
+"""Optional modules that speed up the plugin's Python helpers when importable."""
+_ACCELERATORS = ("uvloop", "winloop")
+
+"""Version of the cache record format; bump when the probe result changes."""
+_CACHE_FORMAT = 3
+
+"""File marking a virtual environment, next to or above its interpreter."""
+_VENV_CONFIG = "pyvenv.cfg"
+
+
+def probe(packages: Sequence[str]) -> dict[str, Any]:
+    """Describe this interpreter and the installed versions of `packages`.
+
+    Missing packages have a `None` version. ``executable`` is not resolved,
+    and together with ``prefix`` tells virtual environments of the same base
+    interpreter apart. ``site`` maps the directories packages are installed
+    into to their modification times, so a cached result can tell when
+    packages were added or removed.
+    """
+    versions: dict[str, str | None] = {}
+    for package in packages:
+        try:
+            versions[package] = version(package)
+        except (ValueError, PackageNotFoundError):
+            versions[package] = None
+    return {
+        "executable": abspath(executable),
+        "prefix": prefix,
+        "python": python_version(),
+        "implementation": implementation.name,
+        "platform": platform,
+        "machine": machine(),
+        "packages": versions,
+        "accelerators": {name: find_spec(name) is not None for name in _ACCELERATORS},
+        "site": {
+            entry: stat(entry).st_mtime_ns
+            for entry in dict.fromkeys(path)
+            if entry and isdir(entry)
+        },
+    }
+
+
+def _cache_file(cache_dir: str, interpreter: str) -> str:
+    """Return the cache file of the interpreter at `interpreter` in `cache_dir`."""
+    key = abspath(interpreter).encode("UTF-8", "surrogateescape")
+    return join(cache_dir, f"{sha256(key).hexdigest()[:32]}.json")
+
+
+def _stamps(paths: Sequence[str]) -> dict[str, str | None]:
+    """Map `paths` to their modification times, or `None` if missing.
+
+    Times are decimal strings, as they do not fit in a JavaScript number.
+    """
+    stamps: dict[str, str | None] = {}
+    for entry in paths:
+        try:
+            stamps[entry] = str(stat(entry).st_mtime_ns)
+        except OSError:
+            stamps[entry] = None
+    return stamps
+
+
+def _venv_configs(interpreter: str) -> tuple[str, ...]:
+    """Return the paths a virtual environment of `interpreter` is marked at."""
+    return tuple(
+        dict.fromkeys(
+            (
+                join(dirname(interpreter), _VENV_CONFIG),
+                join(dirname(dirname(interpreter)), _VENV_CONFIG),
+            )
+        )
+    )
+
+
+def load_cached(
+    cache_dir: str, interpreter: str, packages: Sequence[str] = ()
+) -> dict[str, Any] | None:
+    """Return the cached probe of the interpreter at `interpreter` if still valid.
+
+    `interpreter` is not resolved, so virtual environments sharing a base
+    interpreter do not share records. The record must cover every name in
+    `packages`, and none of its ``stamps`` may have changed: the modification
+    times of the interpreter, of the ``pyvenv.cfg`` next to or above it, and of
+    the ``site`` directories of the result. This only needs ``stat`` calls, so
+    callers can check the cache without launching the interpreter.
+    """
+    try:
+        with open(_cache_file(cache_dir, interpreter), encoding="UTF-8") as file:
+            record = loads(file.read())
+        result, stamps = record["result"], record["stamps"]
+        if (
+            record["format"] != _CACHE_FORMAT
+            or record["interpreter"] != abspath(interpreter)
+            or stamps.get(record["interpreter"]) is None
+            or any(package not in result["packages"] for package in packages)
+            or _stamps(tuple(stamps)) != stamps
+        ):
+            return None
+    except (AttributeError, KeyError, OSError, TypeError, ValueError):
+        return None
+    return result
+
+
+def _store(cache_dir: str, interpreter: str, result: dict[str, Any]) -> None:
+    """Cache the probe `result` of `interpreter`; errors are ignored."""
+    interpreter = abspath(interpreter)
+    stamps = _stamps((interpreter, *_venv_configs(interpreter)))
+    if stamps[interpreter] is None:
+        return
+    stamps.update((entry, str(mtime)) for entry, mtime in result["site"].items())
+    record = {
+        "format": _CACHE_FORMAT,
+        "interpreter": interpreter,
+        "stamps": stamps,
+        "result": result,
+    }
+    cache_file = _cache_file(cache_dir, interpreter)
+    with suppress(OSError):
+        makedirs(cache_dir, exist_ok=True)
+        with open(f"{cache_file}.tmp", "w", encoding="UTF-8") as file:
+            file.write(dumps(record))
+        replace(f"{cache_file}.tmp", cache_file)
+
+
+def _main_json(argv: Sequence[str]) -> None:
+    """Print the probe of this interpreter as JSON, storing it if asked to."""
+    parser = ArgumentParser(prog="get_package_version --json")
+    parser.add_argument("--cache-dir", metavar="DIR")
+    parser.add_argument(
+        "--interpreter",
+        metavar="PATH",
+        help="path the caller launched this interpreter by, to key the cache on",
+    )
+    parser.add_argument("packages", nargs="*")
+    options = parser.parse_args(argv)
+    result = probe(options.packages)
+    if options.cache_dir is not None:
+        _store(options.cache_dir, options.interpreter or executable, result)
+    print(dumps(result))
 
 
 def main(argv: Sequence[str]) -> None:
     """Print "<package> <version>" for the package named in argv[1].
 
-    If the package cannot be found the printed version is empty.
+    If the package cannot be found the printed version is empty. If argv[1]
+    is ``--json``, the remaining arguments are handled by the batch probe.
     """
+    if len(argv) > 1 and argv[1] == "--json":
+        _main_json(argv[2:])
+        return
     pkg = argv[1] if len(argv) > 1 else ""
     try:
         ver = version(pkg)
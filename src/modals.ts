@@ -31,7 +31,12 @@ import {
   useSubsettings,
 } from "@polyipseity/obsidian-plugin-library";
 import { constant, identity, noop } from "es-toolkit/compat";
-import { Modal, Setting, sanitizeHTMLToDom } from "obsidian";
+import {
+  FileSystemAdapter,
+  Modal,
+  Setting,
+  sanitizeHTMLToDom,
+} from "obsidian";
 import type { DeepWritable } from "ts-essentials";
 import { BUNDLE } from "./imports.js";
 import { CHECK_EXECUTABLE_WAIT, PYTHON_REQUIREMENTS } from "./magic.js";
@@ -54,12 +59,124 @@ const childProcess = dynamicRequire<typeof import("node:child_process")>(
     BUNDLE,
     "node:child_process",
   ),
+  crypto = dynamicRequire<typeof import("node:crypto")>(BUNDLE, "node:crypto"),
+  fsPromises = dynamicRequire<typeof import("node:fs/promises")>(
+    BUNDLE,
+    "node:fs/promises",
+  ),
+  path = dynamicRequire<typeof import("node:path")>(BUNDLE, "node:path"),
   util = dynamicRequire<typeof import("node:util")>(BUNDLE, "node:util"),
   execFileP = (async () => {
     const [childProcess2, util2] = await Promise.all([childProcess, util]);
     return util2.promisify(childProcess2.execFile);
   })();
 
+// Must match `_CACHE_FORMAT` in `get_package_version.py`
+const PYTHON_PROBE_CACHE_FORMAT = 3;
+
+interface PythonProbe {
+  readonly python: string;
+  readonly packages: Readonly<Record<string, string | null>>;
+}
+
+/** Resolves `file` to the path `execFile` would run, or `null` if not found.
+ *
+ *  Bare names are searched for in `PATH` of `env`, preceded by the working
+ *  directory and followed by the `.com` and `.exe` extensions on Windows.
+ */
+async function findExecutable(
+  file: string,
+  env: NodeJS.ProcessEnv,
+): Promise<string | null> {
+  const [fsPromises2, path2] = await Promise.all([fsPromises, path]),
+    isWin = Platform.CURRENT === "win32",
+    pathKey = isWin
+      ? (Object.keys(env).find((key) => key.toUpperCase() === "PATH") ?? "Path")
+      : "PATH",
+    dirs =
+      path2.isAbsolute(file) || file.includes("/") || file.includes(path2.sep)
+        ? [""]
+        : [
+            ...(isWin ? [""] : []),
+            ...(env[pathKey] ?? "").split(path2.delimiter).filter(Boolean),
+          ],
+    exts = isWin && !path2.extname(file) ? [".com", ".exe"] : [""];
+  for (const dir of dirs) {
+    for (const ext of exts) {
+      const candidate = path2.resolve(dir, `${file}${ext}`);
+      try {
+        if ((await fsPromises2.stat(candidate)).isFile()) {
+          if (!isWin) {
+            await fsPromises2.access(candidate, fsPromises2.constants.X_OK);
+          }
+          return candidate;
+        }
+      } catch {
+        // Not found or not executable
+      }
+    }
+  }
+  return null;
+}
+
+/** Returns the probe of `interpreter` cached by `get_package_version.py`.
+ *
+ *  Mirrors its `load_cached`: the record is valid if it covers `packages` and
+ *  none of its stamped modification times changed, so only `stat` calls are
+ *  needed instead of launching the interpreter. Returns `null` otherwise.
+ */
+async function loadCachedPythonProbe(
+  cacheDir: string,
+  interpreter: string,
+  packages: readonly string[],
+): Promise<PythonProbe | null> {
+  const [crypto2, fsPromises2, path2] = await Promise.all([
+      crypto,
+      fsPromises,
+      path,
+    ]),
+    key = crypto2
+      .createHash("sha256")
+      .update(interpreter, "utf8")
+      .digest("hex")
+      .slice(0, 32);
+  try {
+    const record = JSON.parse(
+        await fsPromises2.readFile(path2.join(cacheDir, `${key}.json`), {
+          encoding: "utf-8",
+        }),
+      ) as {
+        readonly format?: unknown;
+        readonly interpreter?: unknown;
+        readonly stamps?: Readonly<Record<string, string | null>>;
+        readonly result?: PythonProbe;
+      },
+      { result, stamps } = record;
+    if (
+      record.format !== PYTHON_PROBE_CACHE_FORMAT ||
+      record.interpreter !== interpreter ||
+      typeof stamps?.[interpreter] !== "string" ||
+      typeof result?.python !== "string" ||
+      !packages.every((name) => name in result.packages)
+    ) {
+      return null;
+    }
+    const valid = await Promise.all(
+      Object.entries(stamps).map(async ([entry, stamp]) => {
+        try {
+          const { mtimeNs } = await fsPromises2.stat(entry, { bigint: true });
+          return mtimeNs.toString() === stamp;
+        } catch {
+          return stamp === null;
+        }
+      }),
+    );
+    return valid.every(identity) ? result : null;
+  } catch {
+    return null;
+  }
+}
+
 export class TerminalOptionsModal extends EditDataModal<Settings.Profile.TerminalOptions> {
   public constructor(
     context: TerminalPlugin,
@@ -1100,86 +1217,138 @@ export class ProfileModal extends Modal {
                     checkingPython = true;
                     void (async (): Promise<void> => {
                       try {
-                        const [execFileP2, getPackageVersion2] =
-                            await Promise.all([execFileP, getPackageVersion]),
+                        const [execFileP2, getPackageVersion2, path2] =
+                            await Promise.all([
+                              execFileP,
+                              getPackageVersion,
+                              path,
+                            ]),
                           env = await applyEnv(),
-                          { stdout, stderr } = await execFileP2(
+                          requirements = Object.entries(
+                            PYTHON_REQUIREMENTS,
+                          ).filter(([, { platforms }]) =>
+                            inSet(platforms, Platform.CURRENT),
+                          ),
+                          packageNames = requirements
+                            .map(([name]) => name)
+                            .filter((name) => name !== "Python"),
+                          {
+                            app: {
+                              vault: { adapter },
+                            },
+                            manifest: { dir },
+                          } = context,
+                          cacheDir =
+                            adapter instanceof FileSystemAdapter &&
+                            dir !== undefined
+                              ? path2.join(
+                                  adapter.getBasePath(),
+                                  dir,
+                                  "cache",
+                                  "python",
+                                )
+                              : null,
+                          interpreter = await findExecutable(
+                            profile.pythonExecutable,
+                            env,
+                          ),
+                          execOptions = {
+                            env,
+                            timeout: CHECK_EXECUTABLE_WAIT * SI_PREFIX_SCALE,
+                            windowsHide: true,
+                          },
+                          log = (stdout: string, stderr: string): void => {
+                            if (stdout) {
+                              activeSelf(buttonEl).console.log(stdout);
+                            }
+                            if (stderr) {
+                              activeSelf(buttonEl).console.error(stderr);
+                            }
+                          };
+                        let probe =
+                          cacheDir === null || interpreter === null
+                            ? null
+                            : await loadCachedPythonProbe(
+                                cacheDir,
+                                interpreter,
+                                packageNames,
+                              );
+                        if (probe === null) {
+                          try {
+                            const { stdout, stderr } = await execFileP2(
+                              interpreter ?? profile.pythonExecutable,
+                              [
+                                "-c",
+                                getPackageVersion2,
+                                "--json",
+                                ...(cacheDir === null || interpreter === null
+                                  ? []
+                                  : [
+                                      "--cache-dir",
+                                      cacheDir,
+                                      "--interpreter",
+                                      interpreter,
+                                    ]),
+                                ...packageNames,
+                              ],
+                              execOptions,
+                            );
+                            log(stdout, stderr);
+                            probe = JSON.parse(stdout) as typeof probe;
+                          } catch (error) {
+                            /* @__PURE__ */ activeSelf(buttonEl).console.debug(
+                              error,
+                            );
+                          }
+                        }
+                        if (typeof probe?.python !== "string") {
+                          // Interpreters too old for the probe script still
+                          // report their version, to be shown as unsatisfied
+                          const { stdout, stderr } = await execFileP2(
                             profile.pythonExecutable,
                             ["--version"],
-                            {
-                              env,
-                              timeout: CHECK_EXECUTABLE_WAIT * SI_PREFIX_SCALE,
-                              windowsHide: true,
-                            },
+                            execOptions,
                           );
-                        if (stdout) {
-                          activeSelf(buttonEl).console.log(stdout);
-                        }
-                        if (stderr) {
-                          activeSelf(buttonEl).console.error(stderr);
+                          log(stdout, stderr);
+                          if (!stdout.trimStart().startsWith("Python ")) {
+                            throw new Error(i18n.t("errors.not-Python"));
+                          }
+                          probe = { packages: {}, python: stdout };
                         }
-                        if (!stdout.trimStart().startsWith("Python ")) {
-                          throw new Error(i18n.t("errors.not-Python"));
-                        }
-                        const msgs = await Promise.all(
-                          Object.entries(PYTHON_REQUIREMENTS)
-                            .filter(([, { platforms }]) =>
-                              inSet(platforms, Platform.CURRENT),
-                            )
-                            .map(async ([name, { version: req }]) => {
-                              let ver: SemVer | null = null;
-                              try {
-                                if (name === "Python") {
-                                  ver = new SemVer(
-                                    semverCoerce(stdout, { loose: true }) ??
-                                      stdout,
-                                    { loose: true },
-                                  );
-                                } else {
-                                  const { stdout: stdout2, stderr: stderr2 } =
-                                    await execFileP2(
-                                      profile.pythonExecutable,
-                                      ["-c", getPackageVersion2, name],
-                                      {
-                                        env,
-                                        timeout:
-                                          CHECK_EXECUTABLE_WAIT *
-                                          SI_PREFIX_SCALE,
-                                        windowsHide: true,
-                                      },
-                                    );
-                                  if (stdout2) {
-                                    activeSelf(buttonEl).console.log(stdout2);
-                                  }
-                                  if (stderr2) {
-                                    activeSelf(buttonEl).console.error(stderr2);
-                                  }
-                                  ver = new SemVer(
-                                    semverCoerce(stdout2, { loose: true }) ??
-                                      stdout2,
-                                    { loose: true },
-                                  );
-                                }
-                              } catch (error) {
-                                /* @__PURE__ */ activeSelf(
-                                  buttonEl,
-                                ).console.debug(error);
-                              }
-                              const variant =
-                                (ver?.compare(req) ?? -1) >= 0
-                                  ? ""
-                                  : "unsatisfied";
-                              return (): string =>
-                                i18n.t(
-                                  `notices.Python-status-entry-${variant}`,
-                                  {
-                                    interpolation: { escapeValue: false },
-                                    name,
-                                    requirement: `>=${req.version}`,
-                                    version: ver?.version ?? "",
-                                  },
+                        const { packages, python } = probe;
+                        const msgs = requirements.map(
+                          ([name, { version: req }]) => {
+                            let ver: SemVer | null = null;
+                            try {
+                              const found =
+                                name === "Python" ? python : packages[name];
+                              if (found) {
+                                ver = new SemVer(
+                                  semverCoerce(found, { loose: true }) ??
+                                    found,
+                                  { loose: true },
                                 );
-                            }),
+                              }
+                            } catch (error) {
+                              /* @__PURE__ */ activeSelf(
+                                buttonEl,
+                              ).console.debug(error);
+                            }
+                            const variant =
+                              (ver?.compare(req) ?? -1) >= 0
+                                ? ""
+                                : "unsatisfied";
+                            return (): string =>
+                              i18n.t(
+                                `notices.Python-status-entry-${variant}`,
+                                {
+                                  interpolation: { escapeValue: false },
+                                  name,
+                                  requirement: `>=${req.version}`,
+                                  version: ver?.version ?? "",
+                                },
+                              );
+                          },
                         );
                         notice2(
                           () => msgs.map((msg) => msg()).join("\n"),
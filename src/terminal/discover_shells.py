@@ -0,0 +1,303 @@
+"""Discover available shells and measure their time to first prompt.
+
+Shells are collected from ``/etc/shells``, well-known shell names on ``PATH``
+and the paths given on the command line, such as those of profile presets.
+Each available shell is started concurrently in a throwaway pseudoterminal
+and timed until it runs its first command, which it only reads after its rc
+files have run and its first prompt is shown. The report is printed as one
+JSON object; missing shells are reported as unavailable and shells slower
+than ``--slow-threshold`` are flagged.
+
+With ``--cache-dir DIR`` measurements are cached on disk, keyed by the
+resolved shell path and the modification times of the shell and its rc files.
+"""
+
+from __future__ import annotations
+
+import sys
+from argparse import ArgumentParser
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from json import dumps, loads
+from os import (
+    X_OK,
+    _exit,
+    access,
+    close,
+    devnull,
+    environ,
+    execve,
+    makedirs,
+    pathsep,
+    read,
+    replace,
+    stat,
+    waitpid,
+    waitstatus_to_exitcode,
+    write,
+)
+from os.path import basename, expanduser, isfile, join, realpath
+from selectors import EVENT_READ, DefaultSelector
+from struct import pack
+from sys import argv
+from time import monotonic
+from typing import Any
+
+if sys.platform != "win32":
+    from fcntl import ioctl  # ty: ignore[possibly-missing-import]
+    from os import (
+        killpg,  # ty: ignore[possibly-missing-import]
+    )
+    from pty import STDIN_FILENO, fork  # ty: ignore[possibly-missing-import]
+    from signal import SIGKILL  # ty: ignore[possibly-missing-import]
+    from termios import TIOCSWINSZ  # ty: ignore[possibly-missing-import]
+
+"""Public API of this module."""
+__all__ = ("discover", "main", "measure", "shells")
+
+"""Shell names looked up on ``PATH`` in addition to ``/etc/shells``."""
+_SHELL_NAMES = (
+    "bash",
+    "zsh",
+    "fish",
+    "dash",
+    "sh",
+    "ksh",
+    "mksh",
+    "tcsh",
+    "nu",
+    "xonsh",
+    "pwsh",
+)
+
+"""Programs listed in ``/etc/shells`` that are not shells and are skipped.
+
+Terminal multiplexers start a server that outlives the throwaway terminal."""
+_NOT_SHELLS = frozenset({"byobu", "false", "nologin", "screen", "tmux"})
+
+"""Startup files of each shell, relative to the home directory."""
+_RC_FILES: Mapping[str, Sequence[str]] = {
+    "bash": (".bashrc", ".bash_profile", ".bash_login", ".profile"),
+    "zsh": (".zshenv", ".zshrc", ".zprofile", ".zlogin"),
+    "fish": (join(".config", "fish", "config.fish"),),
+    "ksh": (".kshrc", ".profile"),
+    "mksh": (".mkshrc", ".profile"),
+    "tcsh": (".tcshrc", ".cshrc", ".login"),
+    "nu": (join(".config", "nushell", "config.nu"),),
+    "xonsh": (".xonshrc",),
+    "pwsh": (join(".config", "powershell", "Microsoft.PowerShell_profile.ps1"),),
+}
+
+"""Command typed into each shell; its output differs from its echoed input."""
+_READY_COMMAND = b"printf '\\137\\137ready\\137\\137\\n'\r"
+
+"""Output of `_READY_COMMAND`, which marks that the shell is ready."""
+_READY_MARKER = b"__ready__"
+
+"""Cursor position query some prompts wait on, and the reply sent to it."""
+_CURSOR_QUERY, _CURSOR_REPLY = b"\x1b[6n", b"\x1b[1;1R"
+
+"""Window size of the throwaway pseudoterminal as rows and columns."""
+_WINDOW_SIZE = (24, 80)
+
+"""Name of the cache file written under ``--cache-dir``."""
+_CACHE_FILE = "shells.json"
+
+"""Version of the cache file format; bump when `measure` results change."""
+_CACHE_FORMAT = 1
+
+
+def shells(
+    etc_shells: str = "/etc/shells", env: Mapping[str, str] = environ
+) -> Iterator[str]:
+    """Yield shell paths from `etc_shells` and ``PATH``, possibly repeated."""
+    with suppress(OSError), open(etc_shells, encoding="UTF-8") as file:
+        for line in file:
+            line = line.split("#", 1)[0].strip()
+            if line and basename(line) not in _NOT_SHELLS:
+                yield line
+    for directory in env.get("PATH", "").split(pathsep):
+        if directory:
+            for name in _SHELL_NAMES:
+                path = join(directory, name)
+                if isfile(path):
+                    yield path
+
+
+def _key(path: str, home: str) -> list[int | None]:
+    """Return modification times that invalidate a measurement of `path`."""
+    key: list[int | None] = []
+    for file in (path, *(join(home, rc) for rc in _RC_FILES.get(basename(path), ()))):
+        try:
+            key.append(stat(file).st_mtime_ns)
+        except OSError:
+            key.append(None)
+    return key
+
+
+def measure(path: str, timeout: float) -> dict[str, Any]:
+    """Time `path` from spawning to running its first command, in a new PTY.
+
+    The shell is spawned like the pseudoterminal proxy spawns its child, in a
+    new session with the PTY as its controlling terminal, so job control and
+    ``/dev/tty`` work as they would in the terminal. Returns ``prompt_ms`` on
+    success, otherwise ``error``. The shell and its process group are killed
+    afterwards; history is written to the null device where the shell honors
+    ``HISTFILE``.
+    """
+    env = {**environ, "HISTFILE": devnull, "TERM": "xterm-256color"}
+    window_size = pack("HHHH", *_WINDOW_SIZE, 0, 0)
+    start = monotonic()
+    try:
+        pid, master = fork()
+    except OSError as exc:
+        return {"error": f"{type(exc).__name__}: {exc}"}
+    if pid == 0:
+        try:
+            ioctl(STDIN_FILENO, TIOCSWINSZ, window_size)
+            execve(path, (path,), env)
+        finally:
+            _exit(127)
+    exit_code: int | None = None
+    try:
+        write(master, _READY_COMMAND)
+        output = bytearray()
+        with DefaultSelector() as selector:
+            selector.register(master, EVENT_READ)
+            while _READY_MARKER not in output:
+                remaining = start + timeout - monotonic()
+                if remaining <= 0:
+                    return {"error": f"no prompt within {timeout} s"}
+                if not selector.select(remaining):
+                    continue
+                try:
+                    data = read(master, 4096)
+                except OSError:
+                    data = b""
+                if not data:
+                    exit_code = waitstatus_to_exitcode(waitpid(pid, 0)[1])
+                    return {"error": f"exited with {exit_code}"}
+                if _CURSOR_QUERY in data:
+                    write(master, _CURSOR_REPLY)
+                output += data
+        return {"prompt_ms": round((monotonic() - start) * 1000, 3)}
+    finally:
+        with suppress(OSError):
+            killpg(pid, SIGKILL)
+        if exit_code is None:
+            waitpid(pid, 0)
+        close(master)
+
+
+def _load_cache(cache_dir: str) -> dict[str, Any]:
+    """Load the cached measurements in `cache_dir`, keyed by resolved path."""
+    try:
+        with open(join(cache_dir, _CACHE_FILE), encoding="UTF-8") as file:
+            cache = loads(file.read())
+        if cache["format"] == _CACHE_FORMAT:
+            return dict(cache["shells"])
+    except (KeyError, OSError, TypeError, ValueError):
+        pass
+    return {}
+
+
+def _store_cache(cache_dir: str, entries: Mapping[str, Any]) -> None:
+    """Write the measurement `entries` to the cache in `cache_dir`."""
+    cache_file = join(cache_dir, _CACHE_FILE)
+    with suppress(OSError):
+        makedirs(cache_dir, exist_ok=True)
+        with open(f"{cache_file}.tmp", "w", encoding="UTF-8") as file:
+            file.write(dumps({"format": _CACHE_FORMAT, "shells": entries}))
+        replace(f"{cache_file}.tmp", cache_file)
+
+
+def discover(
+    paths: Iterable[str],
+    *,
+    cache_dir: str | None = None,
+    home: str | None = None,
+    jobs: int | None = None,
+    slow_threshold: float = 500.0,
+    timeout: float = 10.0,
+) -> dict[str, Any]:
+    """Report every distinct shell in `paths`, measuring each one once.
+
+    Each entry has the listed ``path`` and whether it is ``available``. An
+    available entry also has the resolved ``executable`` and the result of
+    `measure`, plus ``slow`` if its ``prompt_ms`` exceeds `slow_threshold`.
+    Paths resolving to the same shell share one measurement, and valid cached
+    measurements in `cache_dir` are reused. Rc files are looked up in `home`.
+    """
+    home = expanduser("~") if home is None else home
+    paths = list(dict.fromkeys(paths))
+    resolved = {
+        path: realpath(path) for path in paths if isfile(path) and access(path, X_OK)
+    }
+    keys = {executable: _key(executable, home) for executable in resolved.values()}
+    cache = {} if cache_dir is None else _load_cache(cache_dir)
+    results = {
+        executable: entry["result"]
+        for executable, entry in cache.items()
+        if executable in keys and entry.get("key") == keys[executable]
+    }
+    pending = [executable for executable in keys if executable not in results]
+    if pending:
+        with ThreadPoolExecutor(min(jobs or len(pending), len(pending))) as pool:
+            results.update(
+                zip(
+                    pending,
+                    pool.map(lambda executable: measure(executable, timeout), pending),
+                )
+            )
+        if cache_dir is not None:
+            _store_cache(
+                cache_dir,
+                {
+                    executable: {"key": keys[executable], "result": result}
+                    for executable, result in results.items()
+                    if "error" not in result
+                },
+            )
+    report = list[dict[str, Any]]()
+    for path in paths:
+        executable = resolved.get(path)
+        if executable is None:
+            report.append({"path": path, "available": False})
+            continue
+        result = results[executable]
+        report.append(
+            {
+                "path": path,
+                "available": True,
+                "executable": executable,
+                **result,
+                "slow": result.get("prompt_ms", slow_threshold) > slow_threshold,
+            }
+        )
+    return {"shells": report}
+
+
+def main(argv: Sequence[str]) -> None:
+    """Print the report of the discovered and the given shells as JSON."""
+    parser = ArgumentParser(prog="discover_shells")
+    parser.add_argument("--cache-dir", metavar="DIR")
+    parser.add_argument("--jobs", type=int, metavar="N")
+    parser.add_argument(
+        "--slow-threshold", type=float, default=500.0, metavar="MILLISECONDS"
+    )
+    parser.add_argument("--timeout", type=float, default=10.0, metavar="SECONDS")
+    parser.add_argument("shells", nargs="*", help="additional shell paths")
+    options = parser.parse_args(argv[1:])
+    report = discover(
+        (*options.shells, *shells()),
+        cache_dir=options.cache_dir,
+        jobs=options.jobs,
+        slow_threshold=options.slow_threshold,
+        timeout=options.timeout,
+    )
+    print(dumps(report))
+
+
+if __name__ == "__main__":
+    main(argv)
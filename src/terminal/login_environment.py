@@ -0,0 +1,306 @@
+"""Capture the environment of a login shell and cache it.
+
+Programs launched from a desktop session do not inherit the environment set
+up by the user's login shell, such as ``PATH`` additions. This helper runs
+the shell once as an interactive login shell in a throwaway pseudoterminal,
+starting from a minimal environment, dumps its environment with ``env -0``
+and caches the variables its startup files set in a file. Variables of the
+running session, such as ``DISPLAY`` or ``SSH_AUTH_SOCK``, are never cached,
+so they cannot go stale. The cache is reused while the shell and its system
+and user startup files are unchanged.
+
+The cache file is what ``unix_pseudoterminal.py --environment-file`` reads
+to spawn programs with the captured environment. A summary of the capture is
+printed as one JSON object.
+"""
+
+from __future__ import annotations
+
+import sys
+from argparse import ArgumentParser, Namespace
+from collections.abc import Mapping, Sequence
+from contextlib import suppress
+from json import dumps, loads
+from os import (
+    close,
+    devnull,
+    environ,
+    fdopen,
+    makedirs,
+    read,
+    replace,
+    stat,
+    unlink,
+)
+from os.path import dirname, expanduser, join
+from selectors import EVENT_READ, DefaultSelector
+from shlex import quote
+from subprocess import Popen, TimeoutExpired
+from sys import argv, exit
+from tempfile import mkstemp
+from time import monotonic
+
+if sys.platform != "win32":
+    from os import (
+        getuid,  # ty: ignore[possibly-missing-import]
+        killpg,  # ty: ignore[possibly-missing-import]
+        openpty,  # ty: ignore[possibly-missing-import]
+    )
+    from pwd import getpwuid  # ty: ignore[possibly-missing-import]
+    from signal import SIGKILL  # ty: ignore[possibly-missing-import]
+
+"""Public API of this module."""
+__all__ = ("capture", "load", "main", "store")
+
+"""Variables of the caller passed to the shell; all others start unset."""
+_BASE_VARIABLES = ("HOME", "LOGNAME", "SHELL", "USER")
+
+"""Variables describing the capturing shell or the running session.
+
+Session and agent variables point at sockets and displays of the session the
+capture ran in, so values cached from it would override live ones."""
+_VOLATILE_VARIABLES = frozenset(
+    {
+        "COLUMNS",
+        "HISTFILE",
+        "LINES",
+        "OLDPWD",
+        "PWD",
+        "SHLVL",
+        "TERM",
+        "_",
+        "DBUS_SESSION_BUS_ADDRESS",
+        "DISPLAY",
+        "GPG_AGENT_INFO",
+        "SSH_AGENT_PID",
+        "SSH_AUTH_SOCK",
+        "SSH_CLIENT",
+        "SSH_CONNECTION",
+        "SSH_TTY",
+        "WAYLAND_DISPLAY",
+        "XAUTHORITY",
+        "XDG_RUNTIME_DIR",
+        "XDG_SESSION_ID",
+    }
+)
+
+"""Interval in seconds at which a capture checks whether the shell exited."""
+_EXIT_POLL_INTERVAL = 0.01
+
+"""System startup files of the common shells; changes invalidate the cache."""
+_SYSTEM_FILES = (
+    "/etc/environment",
+    "/etc/profile",
+    "/etc/profile.d",
+    "/etc/bash.bashrc",
+    "/etc/bashrc",
+    "/etc/zshenv",
+    "/etc/zprofile",
+    "/etc/zshrc",
+    "/etc/zlogin",
+    "/etc/zsh",
+    "/etc/fish/config.fish",
+    "/etc/paths",
+    "/etc/paths.d",
+)
+
+"""User startup files of the common shells, relative to the home directory."""
+_USER_FILES = (
+    ".profile",
+    ".bash_profile",
+    ".bash_login",
+    ".bashrc",
+    ".zshenv",
+    ".zprofile",
+    ".zshrc",
+    ".zlogin",
+    join(".config", "fish", "config.fish"),
+    join(".config", "fish", "conf.d"),
+)
+
+"""Version of the cache file format; bump when its contents change."""
+_CACHE_FORMAT = 2
+
+
+def _key(shell: str, home: str) -> list[int | None]:
+    """Return modification times that invalidate a capture of `shell`."""
+    key: list[int | None] = []
+    for file in (shell, *_SYSTEM_FILES, *(join(home, file) for file in _USER_FILES)):
+        try:
+            key.append(stat(file).st_mtime_ns)
+        except OSError:
+            key.append(None)
+    return key
+
+
+def capture(shell: str, timeout: float = 10.0) -> dict[str, str]:
+    """Return the variables set by `shell` as an interactive login shell.
+
+    The shell starts with only `_BASE_VARIABLES` of the caller's environment.
+    The result holds the variables it added or changed, without volatile
+    ones. The capture ends when the shell exits, even if daemons started by
+    its startup files keep the terminal open; its output is only drained.
+    Raises `TimeoutError` if the shell does not exit within `timeout`
+    seconds, and `RuntimeError` if it exits without dumping its environment.
+    """
+    base = {name: environ[name] for name in _BASE_VARIABLES if name in environ}
+    timed_out = f"{shell} did not finish in {timeout} s"
+    fd, dump = mkstemp(prefix="login-environment-")
+    close(fd)
+    try:
+        master, slave = openpty()
+        try:
+            process = Popen(
+                (shell, "-l", "-i", "-c", f"env -0 > {quote(dump)}"),
+                stdin=slave,
+                stdout=slave,
+                stderr=slave,
+                env={**base, "HISTFILE": devnull},
+                start_new_session=True,
+            )
+        finally:
+            close(slave)
+        try:
+            deadline = monotonic() + timeout
+            with DefaultSelector() as selector:
+                selector.register(master, EVENT_READ)
+                while process.poll() is None:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(timed_out)
+                    if not selector.select(min(remaining, _EXIT_POLL_INTERVAL)):
+                        continue
+                    try:
+                        data = read(master, 4096)
+                    except OSError:
+                        data = b""
+                    if not data:
+                        # Every terminal FD is closed; only the exit is left.
+                        try:
+                            process.wait(deadline - monotonic())
+                        except TimeoutExpired:
+                            raise TimeoutError(timed_out) from None
+        finally:
+            with suppress(OSError):
+                killpg(process.pid, SIGKILL)
+            process.wait()
+            close(master)
+        with open(dump, "rb") as file:
+            data = file.read()
+    finally:
+        unlink(dump)
+    if not data:
+        raise RuntimeError(f"{shell} exited without dumping its environment")
+    environment = dict[str, str]()
+    for entry in data.split(b"\0"):
+        name, sep, value = entry.decode("UTF-8", "surrogateescape").partition("=")
+        if sep and name not in _VOLATILE_VARIABLES and base.get(name) != value:
+            environment[name] = value
+    return environment
+
+
+def load(cache_file: str, shell: str, home: str) -> dict[str, str] | None:
+    """Return the environment cached in `cache_file` if it is still valid."""
+    try:
+        with open(cache_file, encoding="UTF-8") as file:
+            record = loads(file.read())
+        if (
+            record["format"] != _CACHE_FORMAT
+            or record["shell"] != shell
+            or record["key"] != _key(shell, home)
+        ):
+            return None
+        environment = dict[str, str](record["environment"])
+    except (KeyError, OSError, TypeError, ValueError):
+        return None
+    if not all(
+        isinstance(name, str) and isinstance(value, str)
+        for name, value in environment.items()
+    ):
+        return None
+    return environment
+
+
+def store(
+    cache_file: str, shell: str, home: str, environment: Mapping[str, str]
+) -> None:
+    """Write `environment` captured from `shell` to `cache_file` atomically.
+
+    The file is only readable by its owner, as the environment may hold
+    secrets.
+    """
+    directory = dirname(cache_file) or "."
+    makedirs(directory, exist_ok=True)
+    fd, temporary = mkstemp(dir=directory, prefix=".login-environment-")
+    try:
+        with fdopen(fd, "w", encoding="UTF-8") as file:
+            file.write(
+                dumps(
+                    {
+                        "format": _CACHE_FORMAT,
+                        "shell": shell,
+                        "key": _key(shell, home),
+                        "environment": dict(environment),
+                    }
+                )
+            )
+        replace(temporary, cache_file)
+    except BaseException:
+        unlink(temporary)
+        raise
+
+
+def _default_cache_file() -> str:
+    """Return the per-user default cache file."""
+    cache_home = environ.get("XDG_CACHE_HOME") or expanduser(join("~", ".cache"))
+    return join(cache_home, "obsidian-terminal", "login-environment.json")
+
+
+def _arguments(argv: Sequence[str]) -> Namespace:
+    """Parse `argv` (without the program name) into options."""
+    parser = ArgumentParser(prog="login_environment")
+    parser.add_argument(
+        "--cache-file",
+        metavar="FILE",
+        default=_default_cache_file(),
+        help="file to cache the environment in (default: %(default)s)",
+    )
+    parser.add_argument("--refresh", action="store_true", help="ignore the cache")
+    parser.add_argument("--timeout", type=float, default=10.0, metavar="SECONDS")
+    parser.add_argument(
+        "shell",
+        nargs="?",
+        help="login shell to capture (default: $SHELL or the user's shell)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str]) -> None:
+    """Capture or reuse the login environment and print a summary as JSON."""
+    options = _arguments(argv[1:])
+    shell = options.shell or environ.get("SHELL") or getpwuid(getuid()).pw_shell
+    home = expanduser("~")
+    environment = None
+    if not options.refresh:
+        environment = load(options.cache_file, shell, home)
+    cached = environment is not None
+    if environment is None:
+        try:
+            environment = capture(shell, options.timeout)
+            store(options.cache_file, shell, home, environment)
+        except (OSError, RuntimeError) as exc:
+            exit(f"login_environment: {exc}")
+    print(
+        dumps(
+            {
+                "file": options.cache_file,
+                "shell": shell,
+                "cached": cached,
+                "variables": len(environment),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main(argv)
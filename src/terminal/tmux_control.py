@@ -0,0 +1,391 @@
+"""tmux control-mode backend used by the terminal plugin.
+
+Instead of bridging a raw pseudoterminal, this helper runs a tmux client in
+control mode and speaks the same contract as ``unix_pseudoterminal.py``:
+input for the session arrives on stdin, output is written to stdout, and the
+command FD 3 accepts ``"<columns>x<rows>"`` size lines and JSON request lines
+(``{"id": 1, "type": "panes"}``), each answered with one JSON line.
+
+The session is created on first use and attached to afterwards, e.g.
+``tmux_control.py --session notes -- bash -l``. It lives in the tmux server,
+so it survives the plugin: when stdin or the command FD closes, the helper
+only detaches. On attaching and whenever the active pane changes, the pane's
+visible contents are fetched with ``capture-pane`` and drawn instead of
+replaying its output; afterwards, the ``%output`` notifications of the
+active pane are forwarded.
+"""
+
+from __future__ import annotations
+
+import sys
+from argparse import REMAINDER, ArgumentParser, Namespace
+from collections import deque
+from collections.abc import Callable, Mapping, Sequence
+from contextlib import suppress
+from json import dumps, loads
+from os import read, write
+from re import compile
+from selectors import EVENT_READ, DefaultSelector
+from subprocess import PIPE, Popen
+from sys import exit, stdin, stdout
+from typing import IO
+
+"""Public API of this module."""
+__all__ = ("main",)
+
+"""Chunk size (bytes) used for reads from stdin and the command FD."""
+_CHUNK_SIZE = 1024
+
+"""File descriptor of stdin."""
+_STDIN = stdin.fileno()
+
+"""File descriptor of stdout."""
+_STDOUT = stdout.fileno()
+
+"""File descriptor number used for command IO (resize and JSON requests)."""
+_CMDIO = 3
+
+"""Encoding of the command FD."""
+_CMDIO_ENCODING = "UTF-8"
+
+"""Default name of the tmux session."""
+_DEFAULT_SESSION = "obsidian-terminal"
+
+"""Bytes of input sent per ``send-keys`` command."""
+_SEND_KEYS_CHUNK = 256
+
+"""Pattern matching an octal escape in ``%output`` notifications."""
+_OCTAL_ESCAPE_PATTERN = compile(rb"\\([0-7]{3})")
+
+"""Command reporting the active pane, its cursor and screen, then capturing it.
+
+Commands on one line run back to back, so no output is missed between them.
+"""
+_REFRESH_COMMAND = (
+    "display-message -p '#{pane_id} #{cursor_x} #{cursor_y} #{alternate_on}'"
+    " ; capture-pane -p -e"
+)
+
+"""Format of a pane in the result of a ``panes`` request."""
+_PANES_FORMAT = "#{pane_id} #{pane_active} #{pane_width} #{pane_height}"
+
+"""Callback receiving the lines of a command reply and whether it failed."""
+_Callback = Callable[[Sequence[bytes], bool], None]
+
+
+def write_all(fd: int, data: bytes | bytearray | memoryview) -> None:
+    """Write all bytes to `fd`, handling partial writes."""
+    view = memoryview(data)
+    while view:
+        view = view[write(fd, view) :]
+
+
+def _read_or_eof(fd: int) -> bytes:
+    """Read a chunk from `fd`, treating read errors as EOF."""
+    with suppress(OSError):
+        return read(fd, _CHUNK_SIZE)
+    return b""
+
+
+def _send_reply(reply: Mapping[str, object]) -> None:
+    """Write one JSON reply line to the command FD."""
+    write_all(_CMDIO, (dumps(reply, separators=(",", ":")) + "\n").encode())
+
+
+def _send_event(type: str, event: Mapping[str, object]) -> None:
+    """Write one unsolicited JSON event line to the command FD.
+
+    Errors are ignored since the host may already have closed the FD.
+    """
+    with suppress(OSError):
+        _send_reply({"type": type, "event": event})
+
+
+def _unescape(data: bytes) -> bytes:
+    """Decode the octal escapes of ``%output`` data."""
+    return _OCTAL_ESCAPE_PATTERN.sub(lambda match: bytes((int(match[1], 8),)), data)
+
+
+def _parse_size(line: str) -> tuple[int, int]:
+    """Parse a ``"<columns>x<rows>"`` control line as sent by the plugin."""
+    columns, rows = (int(ss.strip()) for ss in line.split("x", 2))
+    return columns, rows
+
+
+class _ControlClient:
+    """Speaks tmux control mode on behalf of the host.
+
+    Commands are written to `commands` by `command()`. tmux answers each
+    command of this client with a ``%begin`` ... ``%end`` (or ``%error``)
+    block in order, whose lines are passed to the command's callback.
+    Notifications outside blocks are handled by `feed()` as they arrive:
+    output of the active pane goes to `output`, session and pane changes are
+    reported to `event`. While a redraw is pending, output is dropped since
+    the captured contents already include it.
+    """
+
+    def __init__(
+        self,
+        commands: IO[bytes],
+        output: Callable[[bytes], None],
+        event: Callable[[str, Mapping[str, object]], None],
+    ) -> None:
+        """Initialize a client that has not seen its session yet."""
+        self.commands = commands
+        self.output = output
+        self.event = event
+        self.session: str | None = None
+        self.pane: str | None = None
+        self.exited = False
+        self._callbacks: deque[_Callback | None] = deque()
+        self._block: list[bytes] | None = None
+        self._block_number = b""
+        self._block_ours = False
+        self._refreshing = 0
+        self._cursor = b""
+
+    def command(self, line: str, *callbacks: _Callback | None) -> None:
+        """Send the command `line` with one callback per command it holds."""
+        self._callbacks.extend(callbacks or (None,))
+        self.commands.write(f"{line}\n".encode())
+        self.commands.flush()
+
+    def refresh(self) -> None:
+        """Redraw the active pane from its captured contents."""
+        self._refreshing += 1
+        self.command(_REFRESH_COMMAND, self._on_cursor, self._on_capture)
+
+    def resize(self, columns: int, rows: int) -> None:
+        """Resize the client, which resizes the session's windows."""
+        self.command(f"refresh-client -C {columns}x{rows}")
+
+    def send_keys(self, data: bytes) -> None:
+        """Send `data` as input to the active pane."""
+        if self.pane is None:
+            return
+        for start in range(0, len(data), _SEND_KEYS_CHUNK):
+            chunk = data[start : start + _SEND_KEYS_CHUNK]
+            self.command(
+                f"send-keys -H -t {self.pane} {' '.join(f'{b:02x}' for b in chunk)}"
+            )
+
+    def feed(self, line: bytes) -> None:
+        """Handle one line received from tmux, without its line feed."""
+        if self._block is not None:
+            words = line.split(b" ")
+            if words[0] in (b"%end", b"%error") and words[2:3] == [self._block_number]:
+                self._end_block(self._block, words[0] == b"%error")
+            else:
+                self._block.append(line)
+            return
+        kind, _, rest = line.partition(b" ")
+        if kind == b"%begin":
+            words = rest.split(b" ")
+            self._block = []
+            self._block_number = words[1]
+            self._block_ours = int(words[2]) & 1 == 1
+        elif kind == b"%output":
+            pane, _, data = rest.partition(b" ")
+            if self._refreshing == 0 and pane.decode() == self.pane:
+                self.output(_unescape(data))
+        elif kind == b"%session-changed":
+            self.session = rest.partition(b" ")[2].decode()
+            self.event("tmux.session", {"session": self.session})
+            self.refresh()
+        elif kind in (b"%window-pane-changed", b"%session-window-changed"):
+            self.refresh()
+        elif kind == b"%exit":
+            self.exited = True
+
+    def _end_block(self, lines: list[bytes], failed: bool) -> None:
+        """Pass a finished reply block to its callback."""
+        self._block = None
+        if not self._block_ours:
+            return
+        callback = self._callbacks.popleft() if self._callbacks else None
+        if callback is not None:
+            callback(lines, failed)
+
+    def _on_cursor(self, lines: Sequence[bytes], failed: bool) -> None:
+        """Record the active pane and its cursor before its capture arrives."""
+        if failed or not lines:
+            self._cursor = b""
+            return
+        pane, _, self._cursor = lines[0].partition(b" ")
+        if pane.decode() != self.pane:
+            self.pane = pane.decode()
+            self.event("tmux.pane", {"pane": self.pane})
+
+    def _on_capture(self, lines: Sequence[bytes], failed: bool) -> None:
+        """Draw the captured screen of the active pane and resume output."""
+        self._refreshing -= 1
+        if failed or not self._cursor:
+            return
+        cursor_x, cursor_y, alternate = self._cursor.split(b" ")
+        screen = list(lines)
+        while screen and not screen[-1]:
+            screen.pop()
+        self.output(
+            (b"\x1b[?1049h" if alternate == b"1" else b"\x1b[?1049l")
+            + b"\x1b[H\x1b[2J"
+            + b"\r\n".join(screen)
+            + b"\x1b[0m\x1b[%d;%dH" % (int(cursor_y) + 1, int(cursor_x) + 1)
+        )
+
+
+def _argument_parser() -> ArgumentParser:
+    """Build the parser for helper options and the command of a new session."""
+    parser = ArgumentParser(
+        prog="tmux_control",
+        description="Attach to a tmux session in control mode and proxy its I/O.",
+        allow_abbrev=False,
+    )
+    parser.add_argument(
+        "--session",
+        default=_DEFAULT_SESSION,
+        help="session to attach to, created if missing (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--socket",
+        metavar="PATH",
+        help="socket of the tmux server (default: tmux's own)",
+    )
+    parser.add_argument(
+        "--tmux",
+        default="tmux",
+        metavar="EXECUTABLE",
+        help="tmux executable (default: %(default)s)",
+    )
+    parser.add_argument(
+        "command",
+        nargs=REMAINDER,
+        help="command of a new session (default: the default shell)",
+    )
+    return parser
+
+
+def _parse_arguments(argv: Sequence[str]) -> Namespace:
+    """Parse `argv` (without the program name) into helper options.
+
+    A ``--`` separating options from the command is accepted and dropped.
+    """
+    options = _argument_parser().parse_args(argv)
+    if options.command[:1] == ["--"]:
+        del options.command[0]
+    return options
+
+
+def _tmux_arguments(options: Namespace) -> list[str]:
+    """Return the command line of a control-mode client for `options`.
+
+    ``-C`` is used rather than ``-CC``: the latter wraps the same protocol
+    for a terminal, whereas the client talks to this helper over pipes.
+    """
+    socket = () if options.socket is None else ("-S", options.socket)
+    return [
+        options.tmux,
+        *socket,
+        "-C",
+        "new-session",
+        "-A",
+        "-s",
+        options.session,
+        *options.command,
+    ]
+
+
+def _on_request(client: _ControlClient, line: str) -> None:
+    """Dispatch one JSON request and reply with its result or error.
+
+    ``panes`` lists the panes of the current window and ``refresh`` redraws
+    the active pane. Replies to ``panes`` are sent once tmux answers.
+    """
+    reply: dict[str, object] = {"id": None, "type": None}
+    try:
+        request = loads(line)
+        if not isinstance(request, dict):
+            raise TypeError(request)
+        kind = request.get("type")
+        reply.update(id=request.get("id"), type=kind)
+        if kind == "panes":
+
+            def on_panes(lines: Sequence[bytes], failed: bool) -> None:
+                """Reply with the listed panes."""
+                if failed:
+                    reply["error"] = f"RuntimeError: {b' '.join(lines).decode()}"
+                else:
+                    reply["result"] = [
+                        {
+                            "pane": pane.decode(),
+                            "active": active == b"1",
+                            "columns": int(columns),
+                            "rows": int(rows),
+                        }
+                        for pane, active, columns, rows in (
+                            line.split(b" ") for line in lines
+                        )
+                    ]
+                _send_reply(reply)
+
+            client.command(f"list-panes -F '{_PANES_FORMAT}'", on_panes)
+            return
+        if kind != "refresh":
+            raise LookupError(f"unsupported request type: {kind}")
+        client.refresh()
+        reply["result"] = None
+    except (LookupError, TypeError, ValueError) as exc:
+        reply["error"] = f"{type(exc).__name__}: {exc}"
+    _send_reply(reply)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Attach to the tmux session and proxy it until tmux or the host leaves.
+
+    `argv` defaults to ``sys.argv``; see `_argument_parser` for options.
+    Exits with the tmux client's exit code.
+    """
+    options = _parse_arguments((sys.argv if argv is None else argv)[1:])
+    tmux = Popen(_tmux_arguments(options), stdin=PIPE, stdout=PIPE)
+    assert tmux.stdin is not None and tmux.stdout is not None
+    client = _ControlClient(
+        tmux.stdin, lambda data: write_all(_STDOUT, data), _send_event
+    )
+    tmux_fd = tmux.stdout.fileno()
+    pending = {tmux_fd: b"", _CMDIO: b""}
+    with DefaultSelector() as selector:
+        for fd in (_STDIN, _CMDIO, tmux_fd):
+            selector.register(fd, EVENT_READ)
+        host_connected = True
+        while host_connected and not client.exited:
+            for key, _ in selector.select():
+                data = _read_or_eof(key.fd)
+                if not data:
+                    if key.fd == tmux_fd:
+                        client.exited = True
+                    else:
+                        host_connected = False
+                    break
+                if key.fd == _STDIN:
+                    client.send_keys(data)
+                    continue
+                lines = (pending[key.fd] + data).split(b"\n")
+                pending[key.fd] = lines.pop()
+                for line in lines:
+                    if key.fd == tmux_fd:
+                        client.feed(line)
+                        continue
+                    text = line.decode(_CMDIO_ENCODING).strip()
+                    if text.startswith("{"):
+                        _on_request(client, text)
+                    elif text:
+                        client.resize(*_parse_size(text))
+    if not client.exited:
+        with suppress(OSError):
+            client.command("detach-client")
+    with suppress(OSError):
+        tmux.stdin.close()
+    exit(tmux.wait())
+
+
+if __name__ == "__main__":
+    main()
@@ -3,26 +3,80 @@
 This module implements a simple pseudoterminal bridge that spawns a child
 process on a pty, proxies stdin/stdout, and accepts control frames on a
 separate FD to update terminal window size.
+
+Optional features are enabled by options placed before the command, e.g.
+``unix_pseudoterminal.py --scrollback-index /tmp/session.lines bash -l``.
+Besides ``"<columns>x<rows>"`` lines, the control FD accepts JSON request lines
+(``{"id": 1, "type": "scrollback.search", ...}``); each request is answered
+with a single JSON line written back to the same FD.
+
+With ``--profile-dir``, ``SIGUSR1`` or a ``profile`` request toggles
+``cProfile`` and ``tracemalloc`` on the live proxy. ``--priority`` and
+``priority`` requests set the CPU and I/O priority of the session.
+``--command-timing`` times commands from OSC 133 shell-integration marks and
+``--vault-root`` reports output paths of vault notes as link events.
+``--engine threads`` forwards each direction on its own thread and
+``--encoding`` transcodes a program's legacy encoding to and from UTF-8.
+``--stall-threshold`` dumps thread stacks when the proxy loop stalls and
+``--echo-mode`` reports terminal mode changes for predictive local echo.
+``--synchronized-output`` forwards each DEC 2026 synchronized update in one
+write and ``--environment-file`` spawns the program with a login environment
+captured by ``login_environment.py``. ``--bulk-dir`` diverts large clipboard
+and image payloads to files, removed on exit, leaving references in the
+output. With ``--viewer-socket``, more viewers can attach to the same session
+over a Unix socket using frames of a type byte, a big-endian 32-bit length and
+the payload.
 """
 
 from __future__ import annotations
 
+import faulthandler
 import sys
-from contextlib import suppress
+import tracemalloc
+from argparse import REMAINDER, ArgumentParser, ArgumentTypeError, Namespace
+from array import array
+from bisect import bisect_left
+from codecs import getincrementaldecoder, getincrementalencoder, lookup
+from collections import Counter, deque
+from collections.abc import Callable, Iterable, Mapping, Sequence
+from contextlib import ExitStack, suppress
+from cProfile import Profile
+from errno import EPERM
+from json import dumps, loads
 from os import (
+    chmod,
+    close,
+    curdir,
+    environ,
     execvp,
+    execvpe,
+    fsencode,
+    getpid,
+    listdir,
+    lstat,
+    pipe,
     read,
+    unlink,
     waitpid,
     waitstatus_to_exitcode,
+    walk,
     write,
 )
-from selectors import EVENT_READ, BaseSelector, DefaultSelector
+from posixpath import isabs, normpath, relpath
+from queue import SimpleQueue
+from re import Pattern, compile
+from select import select
+from selectors import EVENT_READ, EVENT_WRITE, BaseSelector, DefaultSelector
 from signal import SIGINT, SIGTERM, signal
-from struct import pack
+from stat import S_IRUSR, S_IWUSR
+from struct import Struct, pack
 from sys import exit, stdin, stdout
-from time import sleep
+from tempfile import gettempdir, mkstemp
+from threading import Event, Lock, Thread
+from time import monotonic, sleep, strftime, time
 from types import FrameType, TracebackType
-from typing import TYPE_CHECKING, TypeVar
+from typing import TYPE_CHECKING, Any, BinaryIO, TypeVar
+from unicodedata import east_asian_width
 
 if TYPE_CHECKING:
     from typing_extensions import Self, override
@@ -40,12 +94,21 @@ else:
         return func
 
 
+try:
+    import psutil
+except ImportError:
+    """Optional ``psutil`` module, used to sample processes without ``/proc``."""
+    psutil = None
+
 """Public API of this module."""
 __all__ = ("main",)
 
-"""Chunk size in bytes used when reading from the PTY."""
+"""Chunk size in bytes used when reading control frames."""
 _CHUNK_SIZE = 1024
 
+"""Size in bytes of the preallocated buffers on the forwarding paths."""
+_BUFFER_SIZE = 1 << 16
+
 """File descriptor for stdin used by the PTY proxy."""
 _STDIN = stdin.fileno()
 
@@ -55,14 +118,168 @@ _STDOUT = stdout.fileno()
 """File descriptor that carries resize/control frames from the host."""
 _CMDIO = 3
 
+"""Encoding of control frames and replies on the command FD."""
+_CMDIO_ENCODING = "UTF-8"
+
+"""Encoding of the host's side of stdin and stdout."""
+_HOST_ENCODING = "UTF-8"
+
+"""Handler for a JSON control request; its return value is the reply result."""
+_RequestHandler = Callable[[Mapping[str, Any]], object]
+
+"""Pattern matching ANSI escape sequences (CSI, OSC, DCS/APC/PM/SOS, others)."""
+_ANSI_ESCAPE_PATTERN = compile(
+    rb"\x1b\[[0-?]*[ -/]*[@-~]"
+    rb"|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)?"
+    rb"|\x1b[P_^X][^\x1b]*(?:\x1b\\)?"
+    rb"|\x1b[ -/]*[0-~]"
+    rb"|[\x00-\x08\x0b-\x0c\x0e-\x1f\x7f]"
+)
+
+"""Pattern matching the words indexed by the scrollback index."""
+_SCROLLBACK_WORD_PATTERN = compile(r"\w+")
+
+"""Ways of forwarding I/O: one selector loop, or one thread per direction."""
+_ENGINES = ("selector", "threads")
+
+"""Longest unterminated line (bytes) buffered before it is indexed anyway."""
+_SCROLLBACK_MAX_LINE = 1 << 16
+
+"""Default number of lines returned by a scrollback search."""
+_SCROLLBACK_SEARCH_LIMIT = 100
+
+"""Suffix of saved ``cProfile`` statistics, loadable with ``pstats``."""
+_PROFILE_SUFFIX = ".pstats"
+
+"""Suffix of saved ``tracemalloc`` snapshots, loadable with ``Snapshot.load``."""
+_TRACEMALLOC_SUFFIX = ".tracemalloc"
+
+"""Traceback frames recorded per allocation while profiling."""
+_TRACEMALLOC_FRAMES = 16
+
+"""Longest parameter string of an OSC 133 mark that is recognized."""
+_OSC_133_MAX_PARAMETERS = 256
+
+"""Pattern matching an OSC 133 shell-integration mark: kind and parameters."""
+_OSC_133_PATTERN = compile(
+    rb"\x1b\]133;([A-D])([^\x07\x1b]{0,%d})(?:\x07|\x1b\\)" % _OSC_133_MAX_PARAMETERS
+)
+
+"""Pattern matching an OSC 133 mark cut off at the end of a chunk."""
+_OSC_133_PARTIAL_PATTERN = compile(
+    rb"\x1b(?:\](?:1(?:3(?:3(?:;[^\x07\x1b]{0,%d}\x1b?)?)?)?)?)?\Z"
+    % (_OSC_133_MAX_PARAMETERS + 1)
+)
+
+"""Pattern matching a DEC 2026 synchronized update begin (``h``) or end (``l``)."""
+_SYNC_OUTPUT_PATTERN = compile(rb"\x1b\[\?2026([hl])")
+
+"""Pattern matching a DEC 2026 sequence cut off at the end of a chunk."""
+_SYNC_OUTPUT_PARTIAL_PATTERN = compile(rb"\x1b(?:\[(?:\?(?:2(?:0(?:2(?:6)?)?)?)?)?)?\Z")
+
+"""Seconds output is held back for a synchronized update before it is sent."""
+_SYNC_OUTPUT_TIMEOUT = 0.15
+
+"""Bytes of a synchronized update held back before it is sent anyway."""
+_SYNC_OUTPUT_LIMIT = 1 << 22
+
+"""Bulk payload introducers: OSC 52 or 1337 (group 1), sixel (2), kitty (3)."""
+_BULK_INTRODUCER_PATTERN = compile(rb"\x1b(?:\](52|1337);|P[0-9;]{0,32}(q)|_(G))")
+
+"""Pattern matching a bulk payload introducer cut off at the end of a chunk."""
+_BULK_PARTIAL_PATTERN = compile(rb"\x1b(?:\](?:52?|1(?:33?7?)?)?|P[0-9;]{0,32}|_)?\Z")
+
+"""Longest bulk payload introducer, in bytes."""
+_BULK_INTRODUCER_MAX = 36
+
+"""Pattern matching the end of an OSC payload: BEL or ST."""
+_BULK_OSC_END_PATTERN = compile(rb"\x07|\x1b\\")
 
-def write_all(fd: int, data: bytes) -> None:
+"""Pattern matching the end of a DCS or APC payload: ST."""
+_BULK_ST_PATTERN = compile(rb"\x1b\\")
+
+"""Kinds of bulk payloads by OSC identifier or introducer group."""
+_BULK_KINDS = {b"52": "clipboard", b"1337": "iterm2", 2: "sixel", 3: "kitty"}
+
+"""OSC identifier of the reference left in place of a diverted payload."""
+_BULK_REFERENCE_OSC = 7710
+
+"""Default bytes of a payload forwarded unchanged before it is diverted."""
+_BULK_THRESHOLD = 1 << 16
+
+"""Seconds a payload is held back while it may still be short enough to forward."""
+_BULK_HOLD_TIMEOUT = 0.15
+
+"""Longest command line, in bytes of echoed output, kept per command."""
+_COMMAND_TEXT_LIMIT = 256
+
+"""Number of recent commands kept by the command timer."""
+_COMMAND_HISTORY = 256
+
+"""Default number of recent commands and programs in a timing summary."""
+_COMMAND_SUMMARY_LIMIT = 20
+
+"""Pattern matching vault note paths, parenthesized (group 1) or bare (group 2).
+
+Mirrors the paren and bare patterns of ``VaultFileLinksAddon``; trying the
+parenthesized form first keeps bare matches out of parenthesized paths.
+"""
+_VAULT_LINK_PATTERN = compile(
+    r"\(([^)\n]+\.md)\)"
+    r"|(?:^|(?<=[\s\"']))([^\s\"'()[\]{}<>|\\:]+\.md)(?=[\s\"'()[\]{}<>|\\:,;]|$)"
+)
+
+"""Bytes every output line containing a vault link must contain."""
+_VAULT_LINK_HINT = b".md"
+
+"""Seconds a vault path index is trusted before a miss rescans the vault."""
+_VAULT_INDEX_MAX_AGE = 30.0
+
+"""East Asian widths shown as two terminal columns, ambiguous ones included."""
+_WIDE_EAST_ASIAN_WIDTHS = frozenset(("W", "F", "A"))
+
+"""Serializes writes to the command FD across threads."""
+_CMDIO_WRITE_LOCK = Lock()
+
+"""Header of a viewer frame: a type byte and the payload length."""
+_VIEWER_HEADER = Struct(">cI")
+
+"""Viewer frame type carrying PTY output to a viewer."""
+_VIEWER_OUTPUT = b"o"
+
+"""Viewer frame type carrying a viewer's input for the PTY."""
+_VIEWER_INPUT = b"i"
+
+"""Viewer frame type carrying a viewer's size as a ``"<columns>x<rows>"`` line."""
+_VIEWER_RESIZE = b"r"
+
+"""Who may write to the PTY: the host on stdin only, or every viewer too."""
+_VIEWER_WRITERS = ("primary", "all")
+
+"""Output bytes queued for a slow viewer before it is disconnected."""
+_VIEWER_BACKLOG_LIMIT = 1 << 20
+
+"""Priority classes: nice value, Linux I/O priority class and level.
+
+I/O class 0 lets the kernel derive the I/O priority from the nice value, 2 is
+best-effort and 3 is idle.
+"""
+_PRIORITY_CLASSES = {
+    "normal": (0, 0, 0),
+    "background": (10, 2, 7),
+    "idle": (19, 3, 0),
+}
+
+
+def write_all(fd: int, data: bytes | bytearray | memoryview) -> None:
     """Write all bytes to `fd`, handling partial writes.
 
-    Repeatedly call `write` until all data is written.
+    Repeatedly call `write` until all data is written. The remainder after a
+    partial write is a `memoryview` slice, so it is never copied.
     """
-    while data:
-        data = data[write(fd, data) :]
+    view = memoryview(data)
+    while view:
+        view = view[write(fd, view) :]
 
 
 def _read_or_eof(fd: int) -> bytes:
@@ -76,21 +293,1185 @@ def _read_or_eof(fd: int) -> bytes:
     return b""
 
 
-def main() -> None:
+def _readinto_or_eof(fd: int, buffer: bytearray) -> int:
+    """Read a chunk from `fd` into `buffer` and return its size, 0 at EOF.
+
+    Like `_read_or_eof`, read errors are treated as EOF.
+    """
+    with suppress(OSError):
+        return readv(fd, (buffer,))
+    return 0
+
+
+def _send_reply(reply: Mapping[str, object]) -> None:
+    """Write one JSON reply line to the command FD."""
+    data = (dumps(reply, separators=(",", ":")) + "\n").encode(_CMDIO_ENCODING)
+    with _CMDIO_WRITE_LOCK:
+        write_all(_CMDIO, data)
+
+
+def _parse_size(line: str) -> tuple[int, int]:
+    """Parse a ``"<columns>x<rows>"`` control line."""
+    columns, rows = (int(ss.strip()) for ss in line.split("x", 2))
+    return columns, rows
+
+
+def _send_event(type: str, event: Mapping[str, object]) -> None:
+    """Write one unsolicited JSON event line to the command FD.
+
+    Events carry no ``id``; they are only sent by features the host enabled.
+    Errors are ignored since the host may already have closed the FD.
+    """
+    with suppress(OSError):
+        _send_reply({"type": type, "event": event})
+
+
+def _split_lines(pending: bytes, data: bytes) -> tuple[list[bytes], bytes]:
+    """Split `pending` + `data` into complete lines and the unterminated rest.
+
+    A rest longer than `_SCROLLBACK_MAX_LINE` is returned as a line, so every
+    consumer numbers lines the same way.
+    """
+    lines = (pending + data).split(b"\n")
+    pending = lines.pop()
+    if len(pending) > _SCROLLBACK_MAX_LINE:
+        lines.append(pending)
+        pending = b""
+    return lines, pending
+
+
+def _visual_width(text: str) -> int:
+    """Return the number of terminal columns `text` occupies."""
+    return sum(
+        2 if east_asian_width(character) in _WIDE_EAST_ASIAN_WIDTHS else 1
+        for character in text
+    )
+
+
+def _strip_line(line: bytes) -> str:
+    """Return the visible text of one raw output line.
+
+    Escape sequences and control characters are removed, and only the text
+    after the last carriage return is kept so progress-bar redraws collapse
+    into their final state.
+    """
+    line = _ANSI_ESCAPE_PATTERN.sub(b"", line.rstrip(b"\r"))
+    return line[line.rfind(b"\r") + 1 :].decode("UTF-8", "replace")
+
+
+class _ScrollbackIndex:
+    """On-disk, ANSI-stripped line store with an in-memory inverted index.
+
+    Output is handed over with `feed()` and processed by a background thread,
+    which strips escape sequences, appends complete lines to the store at
+    `path` and indexes their lowercased words. `search()` may be called from
+    any thread and only sees lines processed so far. The store is truncated
+    on entry and left in place on exit; removing it is up to the host.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initialize an index whose line store is written to `path`."""
+        self.path = path
+        self._lock = Lock()
+        self._queue: SimpleQueue[bytes | Event | None] = SimpleQueue()
+        self._thread = Thread(target=self._run, name="scrollback-index", daemon=True)
+        self._pending = b""
+        self._offsets = array("Q", (0,))
+        self._postings: dict[str, array[int]] = {}
+        self._store = open(path, "w+b")  # noqa: SIM115  # closed in `__exit__`
+
+    def __enter__(self) -> Self:
+        """Start the background indexing thread."""
+        self._thread.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        """Index the remaining output, stop the thread and close the store."""
+        self._queue.put(None)
+        self._thread.join()
+        self._store.close()
+
+    @property
+    def line_count(self) -> int:
+        """Number of lines indexed so far."""
+        return len(self._offsets) - 1
+
+    @property
+    def backlog(self) -> int:
+        """Number of fed chunks not indexed yet."""
+        return self._queue.qsize()
+
+    def feed(self, data: bytes | memoryview) -> None:
+        """Queue a copy of raw PTY output for indexing; never blocks on disk I/O."""
+        self._queue.put(bytes(data))
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until all output fed so far has been indexed.
+
+        Return whether the index caught up within `timeout` seconds.
+        """
+        done = Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def search(
+        self, query: str, limit: int = _SCROLLBACK_SEARCH_LIMIT
+    ) -> list[tuple[int, str]]:
+        """Return up to `limit` ``(line number, text)`` pairs, newest first.
+
+        A line matches when it contains every word of `query`, compared
+        case-insensitively. Queries without any word match nothing.
+        """
+        words = set(_SCROLLBACK_WORD_PATTERN.findall(query.lower()))
+        if not words or limit <= 0:
+            return []
+        with self._lock:
+            postings = sorted(
+                (self._postings.get(word, array("Q")) for word in words), key=len
+            )
+            candidates, others = postings[0], postings[1:]
+            matches = list[int]()
+            for line_number in reversed(candidates):
+                if all(_contains(other, line_number) for other in others):
+                    matches.append(line_number)
+                    if len(matches) >= limit:
+                        break
+            self._store.flush()
+            return [
+                (line_number, self._read_line(line_number)) for line_number in matches
+            ]
+
+    def _read_line(self, line_number: int) -> str:
+        """Read line `line_number` back from the store (lock must be held)."""
+        start, end = self._offsets[line_number], self._offsets[line_number + 1]
+        return pread(self._store.fileno(), end - start - 1, start).decode(
+            "UTF-8", "replace"
+        )
+
+    def _run(self) -> None:
+        """Background loop that indexes queued output until stopped."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                if self._pending:
+                    self._index((self._pending,))
+                    self._pending = b""
+                return
+            if isinstance(item, Event):
+                item.set()
+                continue
+            lines, self._pending = _split_lines(self._pending, item)
+            if lines:
+                self._index(lines)
+
+    def _index(self, lines: Iterable[bytes]) -> None:
+        """Append `lines` to the store and add their words to the index."""
+        texts = [_strip_line(line) for line in lines]
+        with self._lock:
+            offset = self._offsets[-1]
+            for text in texts:
+                encoded = text.encode("UTF-8")
+                self._store.write(encoded)
+                self._store.write(b"\n")
+                line_number = len(self._offsets) - 1
+                for word in set(_SCROLLBACK_WORD_PATTERN.findall(text.lower())):
+                    self._postings.setdefault(word, array("Q")).append(line_number)
+                offset += len(encoded) + 1
+                self._offsets.append(offset)
+
+
+class _SynchronizedOutput:
+    """Coalesces DEC 2026 synchronized updates into single chunks.
+
+    Output from a ``CSI ? 2026 h`` up to the matching ``CSI ? 2026 l`` is
+    held back and released as one chunk, markers included, so the host gets
+    a whole frame at once. Held output is released anyway by `expire()` once
+    `_SYNC_OUTPUT_TIMEOUT` has passed, or when it exceeds
+    `_SYNC_OUTPUT_LIMIT`; either ends the update early. A marker split
+    across chunks is held back too. Outside updates, chunks pass through
+    without copying. Frames, timeouts and overflows are counted in `metrics`.
+    """
+
+    def __init__(self, metrics: Counter[str]) -> None:
+        """Initialize outside of a synchronized update."""
+        self.metrics = metrics
+        self._buffer = bytearray()
+        self._carry = b""
+        self._updating = False
+        self._held_since: float | None = None
+
+    @property
+    def deadline(self) -> float | None:
+        """The `monotonic()` time held output expires at, if any."""
+        if self._held_since is None:
+            return None
+        return self._held_since + _SYNC_OUTPUT_TIMEOUT
+
+    def feed(self, data: memoryview, now: float) -> list[memoryview]:
+        """Return the chunks of output to forward after receiving `data`."""
+        if self._carry:
+            data = memoryview(self._carry + data)
+            self._carry = b""
+        chunks = list[memoryview]()
+        partial = _SYNC_OUTPUT_PARTIAL_PATTERN.search(data, max(len(data) - 7, 0))
+        if partial is not None:
+            self._carry = bytes(data[partial.start() :])
+            data = data[: partial.start()]
+        position = 0
+        for match in _SYNC_OUTPUT_PATTERN.finditer(data):
+            if match[1] == b"h" and not self._updating:
+                chunks.append(data[position : match.start()])
+                position = match.start()
+                self._updating = True
+            elif match[1] == b"l" and self._updating:
+                self._buffer += data[position : match.end()]
+                position = match.end()
+                chunks.append(self._release())
+                self.metrics["sync_frames"] += 1
+        if self._updating:
+            self._buffer += data[position:]
+            if len(self._buffer) > _SYNC_OUTPUT_LIMIT:
+                self.metrics["sync_overflows"] += 1
+                chunks.append(self._release())
+        else:
+            chunks.append(data[position:])
+        if self._updating or self._carry:
+            if self._held_since is None:
+                self._held_since = now
+        else:
+            self._held_since = None
+        return [chunk for chunk in chunks if chunk]
+
+    def expire(self, now: float) -> list[memoryview]:
+        """Release held output if it has been held for too long."""
+        deadline = self.deadline
+        if deadline is None or now < deadline:
+            return []
+        if self._updating:
+            self.metrics["sync_timeouts"] += 1
+        return self.flush()
+
+    def flush(self) -> list[memoryview]:
+        """Release all held output and end the update."""
+        self._buffer += self._carry
+        self._carry = b""
+        chunk = self._release()
+        return [chunk] if chunk else []
+
+    def _release(self) -> memoryview:
+        """End the update and hand over the held output without copying it."""
+        chunk, self._buffer = self._buffer, bytearray()
+        self._updating = False
+        self._held_since = None
+        return memoryview(chunk)
+
+
+class _BulkPayloads:
+    """Diverts large clipboard and image payloads in the output to files.
+
+    OSC 52 clipboard writes, OSC 1337 iTerm2 inline files, DCS sixel images
+    and APC kitty graphics commands are held back from their introducer on.
+    One ending within `threshold` bytes is forwarded unchanged. A longer one
+    is written whole, introducer and terminator included, to a new file in
+    `directory`, and ``OSC 7710 ; <kind> ; <size> ; <path> ST`` is forwarded
+    in its place once it ends, so the host can handle it in bulk instead of
+    parsing every byte. The plugin does not render these references yet. The
+    files are removed on `__exit__`, when the proxy exits, so a host reading
+    them must do so while the program runs. A payload still held when
+    `expire()` is called after `_BULK_HOLD_TIMEOUT` is released unchanged,
+    and the rest of it passes through. Diverted payloads and their bytes, and
+    timeouts are counted in `metrics`.
+    """
+
+    def __init__(self, directory: str, threshold: int, metrics: Counter[str]) -> None:
+        """Initialize outside of a payload."""
+        self.directory = directory
+        self.threshold = threshold
+        self.metrics = metrics
+        self._kind = ""
+        self._end: Pattern[bytes] | None = None
+        self._passing = False
+        self._buffer = bytearray()
+        self._file: int | None = None
+        self._path = ""
+        self._paths = list[str]()
+        self._size = 0
+        self._carry = b""
+        self._held_since: float | None = None
+
+    def __enter__(self) -> Self:
+        """Return the diverter; its files are removed on exit."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        """Close the file being written and remove every diverted file."""
+        if self._file is not None:
+            close(self._file)
+            self._file = None
+        for path in self._paths:
+            with suppress(OSError):
+                unlink(path)
+        self._paths.clear()
+
+    @property
+    def deadline(self) -> float | None:
+        """The `monotonic()` time held output expires at, if any."""
+        if self._held_since is None:
+            return None
+        return self._held_since + _BULK_HOLD_TIMEOUT
+
+    @property
+    def _holding(self) -> bool:
+        """Whether a payload is held in memory."""
+        return self._end is not None and not self._passing and self._file is None
+
+    def feed(self, data: memoryview, now: float) -> list[memoryview]:
+        """Return the chunks of output to forward after receiving `data`."""
+        if self._carry:
+            data = memoryview(self._carry + data)
+            self._carry = b""
+        chunks = list[memoryview]()
+        position = 0
+        while position < len(data):
+            if self._end is None:
+                match = _BULK_INTRODUCER_PATTERN.search(data, position)
+                if match is None:
+                    partial = _BULK_PARTIAL_PATTERN.search(
+                        data, max(position, len(data) - _BULK_INTRODUCER_MAX)
+                    )
+                    end = len(data) if partial is None else partial.start()
+                    chunks.append(data[position:end])
+                    self._carry = bytes(data[end:])
+                    break
+                chunks.append(data[position : match.start()])
+                position = match.start()
+                if match[1] is None:
+                    self._kind = _BULK_KINDS[match.lastindex or 0]
+                    self._end = _BULK_ST_PATTERN
+                else:
+                    self._kind = _BULK_KINDS[match[1]]
+                    self._end = _BULK_OSC_END_PATTERN
+                continue
+            match = self._end.search(data, position)
+            if match is None:
+                # A trailing ESC may start the terminator.
+                end = len(data) - (data[-1] == 0x1B)
+                self._take(data[position:end], chunks)
+                self._carry = bytes(data[end:])
+                break
+            self._take(data[position : match.end()], chunks)
+            chunks.extend(self._finish())
+            position = match.end()
+        if self._holding or (self._carry and self._end is None):
+            if self._held_since is None:
+                self._held_since = now
+        else:
+            self._held_since = None
+        return [chunk for chunk in chunks if chunk]
+
+    def expire(self, now: float) -> list[memoryview]:
+        """Release held output if it has been held for too long."""
+        deadline = self.deadline
+        if deadline is None or now < deadline:
+            return []
+        self._held_since = None
+        if self._end is None:
+            chunk, self._carry = self._carry, b""
+            return [memoryview(chunk)]
+        self.metrics["bulk_timeouts"] += 1
+        self._passing = True
+        return [self._release()]
+
+    def flush(self) -> list[memoryview]:
+        """Release all held output and end the payload."""
+        carry, self._carry = memoryview(self._carry), b""
+        self._held_since = None
+        if self._end is None:
+            return [carry] if carry else []
+        chunks = list[memoryview]()
+        self._take(carry, chunks)
+        chunks.extend(self._finish())
+        return [chunk for chunk in chunks if chunk]
+
+    def _take(self, data: memoryview, chunks: list[memoryview]) -> None:
+        """Hold, divert or pass through `data` of the current payload."""
+        if self._passing:
+            chunks.append(data)
+            return
+        if self._file is None:
+            self._buffer += data
+            if len(self._buffer) <= self.threshold:
+                return
+            self._file, self._path = mkstemp(
+                prefix=f"{self._kind}-", dir=self.directory
+            )
+            self._paths.append(self._path)
+            data = self._release()
+        write_all(self._file, data)
+        self._size += len(data)
+
+    def _finish(self) -> list[memoryview]:
+        """End the current payload and return what to forward in its place."""
+        self._end = None
+        if self._passing:
+            self._passing = False
+            return []
+        if self._file is None:
+            return [self._release()]
+        close(self._file)
+        self._file = None
+        size, self._size = self._size, 0
+        self.metrics["bulk_payloads"] += 1
+        self.metrics["bulk_bytes"] += size
+        return [
+            memoryview(
+                b"\x1b]%d;%s;%d;%s\x1b\\"
+                % (_BULK_REFERENCE_OSC, self._kind.encode(), size, fsencode(self._path))
+            )
+        ]
+
+    def _release(self) -> memoryview:
+        """Hand over the held output without copying it."""
+        chunk, self._buffer = self._buffer, bytearray()
+        return memoryview(chunk)
+
+
+class _Transcoder:
+    """Incrementally converts a byte stream from `source` to `target` encoding.
+
+    A character split across chunks is held back until it is complete, so
+    converted chunks never end mid-character. Undecodable or unencodable
+    characters are replaced.
+    """
+
+    def __init__(self, source: str, target: str) -> None:
+        """Initialize a converter from `source` to `target`."""
+        self._decoder = getincrementaldecoder(source)(errors="replace")
+        self._encoder = getincrementalencoder(target)(errors="replace")
+
+    def __call__(self, data: memoryview) -> bytes:
+        """Convert one chunk; may be empty while a character is incomplete."""
+        return self._encoder.encode(self._decoder.decode(data))
+
+    def flush(self) -> bytes:
+        """Convert what is held back at the end of the stream."""
+        return self._encoder.encode(self._decoder.decode(b"", final=True), final=True)
+
+
+class _Watchdog:
+    """Detects stalls of a loop that calls `beat()` once per iteration.
+
+    A background thread checks four times per `threshold`. When the loop has
+    not beaten for longer than `threshold` seconds, the stall is counted once
+    in `metrics` as ``stalls`` and reported by appending the time, the stall
+    so far, `state()` and the stacks of all threads (via `faulthandler`) to
+    the file at `path`. ``longest_stall_ms`` tracks the longest stall seen.
+    Beating only stores a `monotonic()` reading.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        path: str,
+        metrics: Counter[str],
+        state: Callable[[], Mapping[str, object]] = dict,
+    ) -> None:
+        """Initialize a watchdog allowing `threshold` seconds per iteration."""
+        self.threshold = threshold
+        self.path = path
+        self.metrics = metrics
+        self.state = state
+        self._last = monotonic()
+        self._stop = Event()
+        self._thread = Thread(target=self._run, name="watchdog", daemon=True)
+
+    def __enter__(self) -> Self:
+        """Start watching."""
+        self.metrics["stalls"] += 0
+        self.beat()
+        self._thread.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        """Stop watching."""
+        self._stop.set()
+        self._thread.join()
+
+    def beat(self) -> None:
+        """Record that the loop completed an iteration."""
+        self._last = monotonic()
+
+    def _run(self) -> None:
+        """Check for stalls until stopped."""
+        reported = None
+        while not self._stop.wait(self.threshold / 4):
+            last = self._last
+            stalled = monotonic() - last
+            if stalled <= self.threshold:
+                continue
+            self.metrics["longest_stall_ms"] = max(
+                self.metrics["longest_stall_ms"], int(stalled * 1000)
+            )
+            if reported != last:
+                reported = last
+                self.metrics["stalls"] += 1
+                self._report(stalled)
+
+    def _report(self, stalled: float) -> None:
+        """Append a report of the current stall to `path`."""
+        with suppress(OSError), open(self.path, "a", encoding="UTF-8") as file:
+            file.write(
+                f"--- {strftime('%Y-%m-%dT%H:%M:%S')}: "
+                f"no loop iteration for {stalled:.3f} s\n"
+                f"{dumps(self.state(), default=str)}\n"
+            )
+            file.flush()
+            faulthandler.dump_traceback(file, all_threads=True)
+
+
+class _VaultLinkScanner:
+    """Finds output paths of notes in the vault at `root` off the forwarding path.
+
+    Output is handed over with `feed()` and scanned by a background thread.
+    Only complete lines containing `_VAULT_LINK_HINT` are stripped of escape
+    sequences and matched; candidates are looked up in a cached set of the
+    vault's note paths, which is rebuilt on a miss once older than
+    `_VAULT_INDEX_MAX_AGE` seconds or after `invalidate()`. Links found in a
+    chunk are passed together to `on_links` as ``line`` (numbered like the
+    scrollback index), 0-based ``start`` and exclusive ``end`` columns, and
+    the vault-relative ``path``.
+    """
+
+    def __init__(
+        self, root: str, on_links: Callable[[list[Mapping[str, object]]], None]
+    ) -> None:
+        """Initialize a scanner reporting links to notes under `root`."""
+        self.root = root
+        self.on_links = on_links
+        self._queue: SimpleQueue[bytes | Event | None] = SimpleQueue()
+        self._thread = Thread(target=self._run, name="vault-links", daemon=True)
+        self._pending = b""
+        self._line_number = 0
+        self._paths = frozenset[str]()
+        self._indexed_at: float | None = None
+
+    def __enter__(self) -> Self:
+        """Start the background scanning thread."""
+        self._thread.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        """Scan the remaining output and stop the thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def feed(self, data: bytes | memoryview) -> None:
+        """Queue a copy of raw PTY output for scanning."""
+        self._queue.put(bytes(data))
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until all output fed so far has been scanned.
+
+        Return whether the scanner caught up within `timeout` seconds.
+        """
+        done = Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    @property
+    def backlog(self) -> int:
+        """Number of fed chunks not scanned yet."""
+        return self._queue.qsize()
+
+    def invalidate(self) -> None:
+        """Rescan the vault on the next lookup, e.g. after notes changed."""
+        self._indexed_at = None
+
+    def _run(self) -> None:
+        """Background loop that scans queued output until stopped."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                if self._pending:
+                    self._scan((self._pending,))
+                    self._pending = b""
+                return
+            if isinstance(item, Event):
+                item.set()
+                continue
+            lines, self._pending = _split_lines(self._pending, item)
+            if lines:
+                self._scan(lines)
+
+    def _scan(self, lines: Sequence[bytes]) -> None:
+        """Report the vault links in `lines`."""
+        links = list[Mapping[str, object]]()
+        for line_number, line in enumerate(lines, self._line_number):
+            if _VAULT_LINK_HINT not in line:
+                continue
+            text = _strip_line(line)
+            for match in _VAULT_LINK_PATTERN.finditer(text):
+                group = 1 if match[1] is not None else 2
+                path = self._lookup(match[group])
+                if path is None:
+                    continue
+                start = _visual_width(text[: match.start(group)])
+                links.append(
+                    {
+                        "line": line_number,
+                        "start": start,
+                        "end": start + _visual_width(match[group]),
+                        "path": path,
+                    }
+                )
+        self._line_number += len(lines)
+        if links:
+            self.on_links(links)
+
+    def _lookup(self, candidate: str) -> str | None:
+        """Return the vault path `candidate` refers to, if it is a note."""
+        if isabs(candidate):
+            candidate = relpath(candidate, self.root)
+        path = normpath(candidate)
+        if path in self._paths:
+            return path
+        if (
+            self._indexed_at is not None
+            and monotonic() - self._indexed_at < _VAULT_INDEX_MAX_AGE
+        ):
+            return None
+        self._paths = self._index()
+        return path if path in self._paths else None
+
+    def _index(self) -> frozenset[str]:
+        """Return the paths of all notes in the vault, skipping dot folders."""
+        self._indexed_at = monotonic()
+        paths = set[str]()
+        for directory, directories, files in walk(self.root):
+            directories[:] = (name for name in directories if name[:1] != ".")
+            prefix = relpath(directory, self.root)
+            prefix = "" if prefix == curdir else f"{prefix}/"
+            paths.update(f"{prefix}{name}" for name in files if name.endswith(".md"))
+        return frozenset(paths)
+
+
+class _CommandTimer:
+    """Times shell commands from OSC 133 marks in the PTY output.
+
+    Marks are ``A`` (prompt shown), ``B`` (command input starts), ``C``
+    (command runs) and ``D[;<exit code>]`` (command done). The command text is
+    the visible output echoed between ``B`` and ``C``. Recent commands and
+    per-program totals are kept, along with the time from `spawned` (a
+    `monotonic` time) to the first prompt. Marks split across chunks are
+    carried over to the next `feed()`.
+    """
+
+    def __init__(self, spawned: float) -> None:
+        """Initialize a timer for a shell spawned at `spawned`."""
+        self.spawned = spawned
+        self.first_prompt_seconds: float | None = None
+        self.recent = deque[Mapping[str, object]](maxlen=_COMMAND_HISTORY)
+        self.count = self.failed = 0
+        self.total_seconds = 0.0
+        self._program_counts = Counter[str]()
+        self._program_seconds = dict[str, float]()
+        self._carry = b""
+        self._command: bytearray | None = None
+        self._running: tuple[str, float, float] | None = None
+
+    def feed(self, data: memoryview) -> None:
+        """Scan one chunk of PTY output for marks.
+
+        `summary()` may be called from another thread meanwhile.
+        """
+        if self._carry:
+            data = memoryview(self._carry + data)
+            self._carry = b""
+        position = 0
+        for match in _OSC_133_PATTERN.finditer(data):
+            self._collect(data[position : match.start()])
+            self._mark(match[1], match[2])
+            position = match.end()
+        # A partial mark is at most its 6-byte introducer, the parameters,
+        # one extra byte and a trailing ESC long.
+        partial = _OSC_133_PARTIAL_PATTERN.search(
+            data, max(position, len(data) - _OSC_133_MAX_PARAMETERS - 8)
+        )
+        end = len(data) if partial is None else partial.start()
+        self._collect(data[position:end])
+        if partial is not None:
+            self._carry = bytes(data[end:])
+
+    def summary(self, limit: int = _COMMAND_SUMMARY_LIMIT) -> Mapping[str, object]:
+        """Describe session timing with up to `limit` recent commands and programs.
+
+        Recent commands are newest first; programs are ordered by total time.
+        """
+        return {
+            "first_prompt_seconds": self.first_prompt_seconds,
+            "commands": self.count,
+            "failed": self.failed,
+            "total_seconds": self.total_seconds,
+            "programs": [
+                {
+                    "program": program,
+                    "count": self._program_counts[program],
+                    "seconds": seconds,
+                }
+                for program, seconds in sorted(
+                    self._program_seconds.items(),
+                    key=lambda item: item[1],
+                    reverse=True,
+                )[:limit]
+            ],
+            "recent": list(self.recent)[::-1][:limit],
+        }
+
+    def _collect(self, data: memoryview) -> None:
+        """Keep echoed command text while a command is being entered."""
+        if self._command is not None and data:
+            self._command += data[: _COMMAND_TEXT_LIMIT - len(self._command)]
+
+    def _mark(self, kind: bytes, parameters: bytes) -> None:
+        """Apply one mark of `kind` with its ``;``-prefixed `parameters`."""
+        now = monotonic()
+        if kind == b"A":
+            if self.first_prompt_seconds is None:
+                self.first_prompt_seconds = now - self.spawned
+            self._command = None
+        elif kind == b"B":
+            self._command = bytearray()
+        elif kind == b"C":
+            text = ""
+            if self._command is not None:
+                text = _strip_line(bytes(self._command).rstrip(b"\r\n"))
+            self._running = text.strip(), time(), now
+            self._command = None
+        elif self._running is not None:
+            command, started, start = self._running
+            self._running = None
+            code = parameters.split(b";")[1:2]
+            try:
+                exit_code = int(code[0]) if code else None
+            except ValueError:
+                exit_code = None
+            duration = now - start
+            self.count += 1
+            self.failed += bool(exit_code)
+            self.total_seconds += duration
+            program = command.split(maxsplit=1)[0] if command else ""
+            self._program_counts[program] += 1
+            self._program_seconds[program] = (
+                self._program_seconds.get(program, 0.0) + duration
+            )
+            self.recent.append(
+                {
+                    "command": command,
+                    "started": started,
+                    "seconds": duration,
+                    "exit_code": exit_code,
+                }
+            )
+
+
+class _Profiler:
+    """Toggles ``cProfile`` and ``tracemalloc`` on a running proxy.
+
+    ``cProfile`` covers the thread that calls `start()`, which is the
+    forwarding loop; on Python 3.12+ it is built on ``sys.monitoring``. Each
+    run is saved under `directory` as ``<session>-<time>-<n>.pstats`` and
+    ``.tracemalloc`` on a background thread so forwarding is not held up,
+    after which `on_saved` receives the file names (and ``error`` on failure).
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        session: str,
+        on_saved: Callable[[Mapping[str, object]], None] = lambda _event: None,
+    ) -> None:
+        """Initialize a stopped profiler saving runs of `session` to `directory`."""
+        self.directory = directory
+        self.session = session
+        self.on_saved = on_saved
+        self._profile: Profile | None = None
+        self._owns_tracemalloc = False
+        self._runs = 0
+        self._savers = list[Thread]()
+
+    def __enter__(self) -> Self:
+        """Return this profiler."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        """Stop and save an active run, then wait for pending saves."""
+        self.stop()
+        for saver in self._savers:
+            saver.join()
+
+    @property
+    def active(self) -> bool:
+        """Whether a run is in progress."""
+        return self._profile is not None
+
+    def toggle(self) -> Sequence[str]:
+        """Start a run if stopped, else stop it; return `stop()`'s files."""
+        if self.active:
+            return self.stop()
+        self.start()
+        return ()
+
+    def start(self) -> None:
+        """Start profiling and tracing allocations; no-op if already active."""
+        if self._profile is not None:
+            return
+        self._owns_tracemalloc = not tracemalloc.is_tracing()
+        if self._owns_tracemalloc:
+            tracemalloc.start(_TRACEMALLOC_FRAMES)
+        self._profile = Profile()
+        self._profile.enable()
+
+    def stop(self) -> Sequence[str]:
+        """Stop the active run and return the files it is being saved to."""
+        profile = self._profile
+        if profile is None:
+            return ()
+        profile.disable()
+        self._profile = None
+        snapshot = tracemalloc.take_snapshot()
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+        self._runs += 1
+        base = f"{self.directory}/{self.session}-{strftime('%Y%m%dT%H%M%S')}"
+        files = (
+            f"{base}-{self._runs}{_PROFILE_SUFFIX}",
+            f"{base}-{self._runs}{_TRACEMALLOC_SUFFIX}",
+        )
+        self._savers = [saver for saver in self._savers if saver.is_alive()]
+        saver = Thread(
+            target=self._save,
+            args=(profile, snapshot, files),
+            name="profile",
+            daemon=True,
+        )
+        self._savers.append(saver)
+        saver.start()
+        return files
+
+    def _save(
+        self, profile: Profile, snapshot: tracemalloc.Snapshot, files: Sequence[str]
+    ) -> None:
+        """Write one run to `files` and report it to `on_saved`."""
+        event: dict[str, object] = {"files": list(files)}
+        try:
+            profile.dump_stats(files[0])
+            snapshot.dump(files[1])
+        except OSError as exc:
+            event["error"] = f"{type(exc).__name__}: {exc}"
+        self.on_saved(event)
+
+
+def _contains(sorted_values: Sequence[int], value: int) -> bool:
+    """Return whether `value` occurs in the ascending `sorted_values`."""
+    index = bisect_left(sorted_values, value)
+    return index < len(sorted_values) and sorted_values[index] == value
+
+
+def _positive_float(value: str) -> float:
+    """Parse a strictly positive float command-line value."""
+    ret = float(value)
+    if not ret > 0:
+        raise ArgumentTypeError(f"must be positive: {value}")
+    return ret
+
+
+def _positive_int(value: str) -> int:
+    """Parse a strictly positive integer command-line value."""
+    ret = int(value)
+    if not ret > 0:
+        raise ArgumentTypeError(f"must be positive: {value}")
+    return ret
+
+
+def _encoding(value: str) -> str | None:
+    """Parse an encoding command-line value; `None` if it needs no transcoding."""
+    try:
+        name = lookup(value).name
+    except LookupError as exc:
+        raise ArgumentTypeError(f"unknown encoding: {value}") from exc
+    return None if name == lookup(_HOST_ENCODING).name else name
+
+
+def _environment_file(value: str) -> dict[str, str]:
+    """Parse an environment file command-line value into its variables."""
+    try:
+        with open(value, encoding="UTF-8") as file:
+            environment = dict[str, str](loads(file.read())["environment"])
+    except (KeyError, OSError, TypeError, ValueError) as exc:
+        raise ArgumentTypeError(f"invalid environment file: {value}: {exc}") from exc
+    if not all(
+        isinstance(name, str) and isinstance(variable, str)
+        for name, variable in environment.items()
+    ):
+        raise ArgumentTypeError(f"invalid environment file: {value}")
+    return environment
+
+
+def _argument_parser() -> ArgumentParser:
+    """Build the parser for proxy options and the command to run."""
+    parser = ArgumentParser(
+        prog="unix_pseudoterminal",
+        description="Run a command on a pseudoterminal and proxy its I/O.",
+        allow_abbrev=False,
+    )
+    parser.add_argument(
+        "--scrollback-index",
+        metavar="PATH",
+        help="store ANSI-stripped output lines at PATH and index them for search",
+    )
+    parser.add_argument(
+        "--resource-interval",
+        type=_positive_float,
+        metavar="SECONDS",
+        help="sample CPU, RSS and process count of the child's process tree",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        metavar="DIR",
+        help="allow toggling cProfile and tracemalloc with SIGUSR1, saving to DIR",
+    )
+    parser.add_argument(
+        "--session-id",
+        metavar="ID",
+        help="name of this session in saved files (default: the proxy PID)",
+    )
+    parser.add_argument(
+        "--priority",
+        choices=tuple(_PRIORITY_CLASSES),
+        default="normal",
+        help="CPU and I/O priority class of the session",
+    )
+    parser.add_argument(
+        "--command-timing",
+        action="store_true",
+        help="time commands and shell startup from OSC 133 prompt marks",
+    )
+    parser.add_argument(
+        "--vault-root",
+        metavar="DIR",
+        help="report output paths of notes in the vault at DIR as link events",
+    )
+    parser.add_argument(
+        "--viewer-socket",
+        metavar="PATH",
+        help="listen at PATH for more viewers of this session; the socket is "
+        "only accessible to the current user",
+    )
+    parser.add_argument(
+        "--viewer-writers",
+        choices=_VIEWER_WRITERS,
+        default=_VIEWER_WRITERS[0],
+        help="whether attached viewers may write to the session",
+    )
+    parser.add_argument(
+        "--encoding",
+        type=_encoding,
+        metavar="NAME",
+        help="encoding of the program's I/O, e.g. gbk; converted to/from UTF-8",
+    )
+    parser.add_argument(
+        "--stall-threshold",
+        type=_positive_float,
+        metavar="SECONDS",
+        help="report proxy loop iterations taking longer than SECONDS "
+        "(besides waiting for I/O) to the diagnostics directory",
+    )
+    parser.add_argument(
+        "--diagnostics-dir",
+        metavar="DIR",
+        default=gettempdir(),
+        help="directory of the per-session stall reports (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--echo-mode",
+        action="store_true",
+        help="report changes of the terminal's echo and canonical modes",
+    )
+    parser.add_argument(
+        "--synchronized-output",
+        action="store_true",
+        help="forward each DEC 2026 synchronized update in a single write",
+    )
+    parser.add_argument(
+        "--bulk-dir",
+        metavar="DIR",
+        help="divert OSC 52 clipboard, sixel, iTerm2 and kitty image payloads "
+        "longer than --bulk-threshold to files in DIR, leaving OSC 7710 "
+        "references in the output; the files are removed on exit",
+    )
+    parser.add_argument(
+        "--bulk-threshold",
+        type=_positive_int,
+        default=_BULK_THRESHOLD,
+        metavar="BYTES",
+        help="longest payload forwarded unchanged (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--environment-file",
+        type=_environment_file,
+        metavar="FILE",
+        help="spawn the command with the variables set by the login shell, "
+        "as captured in FILE, overriding inherited ones; session variables "
+        "such as DISPLAY are never captured and stay live",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=_ENGINES,
+        default=_ENGINES[0],
+        help="forward I/O on one selector loop or on one thread per direction",
+    )
+    parser.add_argument("command", nargs=REMAINDER, help="command to run")
+    return parser
+
+
+def _parse_arguments(argv: Sequence[str]) -> Namespace:
+    """Parse `argv` (without the program name) into proxy options.
+
+    A ``--`` separating options from the command is accepted and dropped.
+    """
+    parser = _argument_parser()
+    options = parser.parse_args(argv)
+    if options.command[:1] == ["--"]:
+        del options.command[0]
+    if not options.command:
+        parser.error("the following arguments are required: command")
+    if options.engine == "threads":
+        if options.viewer_socket is not None:
+            parser.error("--viewer-socket requires --engine selector")
+        if options.synchronized_output:
+            parser.error("--synchronized-output requires --engine selector")
+        if options.bulk_dir is not None:
+            parser.error("--bulk-dir requires --engine selector")
+    if options.session_id is None:
+        options.session_id = str(getpid())
+    return options
+
+
+def main(argv: Sequence[str] | None = None) -> None:
     """Not available on Windows — resize proxy is POSIX-only here."""
     raise NotImplementedError(sys.platform)
 
 
 if sys.platform != "win32":
+    from ctypes import CDLL, get_errno
     from fcntl import ioctl  # ty: ignore[possibly-missing-import]
-    from os import getpgid, getppid, killpg  # ty: ignore[possibly-missing-import]
+    from os import (
+        PRIO_PGRP,  # ty: ignore[possibly-missing-import]
+        getpgid,  # ty: ignore[possibly-missing-import]
+        getppid,
+        getpriority,  # ty: ignore[possibly-missing-import]
+        getuid,  # ty: ignore[possibly-missing-import]
+        killpg,  # ty: ignore[possibly-missing-import]
+        pread,  # ty: ignore[possibly-missing-import]
+        readv,  # ty: ignore[possibly-missing-import]
+        setpriority,  # ty: ignore[possibly-missing-import]
+        strerror,
+        sysconf,  # ty: ignore[possibly-missing-import]
+        tcgetpgrp,  # ty: ignore[possibly-missing-import]
+    )
+    from platform import machine
     from pty import fork  # ty: ignore[possibly-missing-import]
-    from signal import SIGHUP, SIGKILL  # ty: ignore[possibly-missing-import]
-    from termios import TIOCSWINSZ  # ty: ignore[possibly-missing-import]
+    from resource import (
+        RUSAGE_CHILDREN,  # ty: ignore[possibly-missing-import]
+        getrusage,  # ty: ignore[possibly-missing-import]
+    )
+    from signal import (
+        SIGHUP,  # ty: ignore[possibly-missing-import]
+        SIGKILL,  # ty: ignore[possibly-missing-import]
+        SIGUSR1,  # ty: ignore[possibly-missing-import]
+    )
+    from socket import (
+        AF_UNIX,  # ty: ignore[possibly-missing-import]
+        SOCK_STREAM,
+        socket,
+    )
+    from termios import (
+        ECHO,  # ty: ignore[possibly-missing-import]
+        ICANON,  # ty: ignore[possibly-missing-import]
+        ISIG,  # ty: ignore[possibly-missing-import]
+        TIOCSWINSZ,  # ty: ignore[possibly-missing-import]
+        tcgetattr,  # ty: ignore[possibly-missing-import]
+    )
+    from termios import (
+        error as termios_error,  # ty: ignore[possibly-missing-import]
+    )
 
     """Selector timeout used to periodically check parent process liveness."""
     _SELECT_TIMEOUT_SECONDS = 0.5
 
+    """Most PTY output bytes forwarded per scheduling slice before yielding."""
+    _OUTPUT_SLICE_BYTES = 1 << 16
+
+    """Longest time in seconds spent forwarding PTY output per slice."""
+    _OUTPUT_SLICE_SECONDS = 0.01
+
+    """Root of the Linux process information pseudo-filesystem."""
+    _PROCFS = "/proc"
+
+    """Kernel clock ticks per second, the unit of CPU times in ``/proc``."""
+    _CLOCK_TICKS = sysconf("SC_CLK_TCK")
+
+    """Memory page size in bytes, the unit of RSS in ``/proc``."""
+    _PAGE_SIZE = sysconf("SC_PAGE_SIZE")
+
+    """Multiplier converting ``ru_maxrss`` to bytes (kibibytes except on macOS)."""
+    _MAXRSS_SCALE = 1 if sys.platform == "darwin" else 1024
+
+    """Number of the Linux ``ioprio_set`` system call on this machine, if known."""
+    _IOPRIO_SET_SYSCALL = (
+        {
+            "aarch64": 30,
+            "armv7l": 314,
+            "i686": 289,
+            "ppc64le": 273,
+            "riscv64": 30,
+            "x86_64": 251,
+        }.get(machine())
+        if sys.platform == "linux"
+        else None
+    )
+
+    """``ioprio_set`` target kind selecting a process group."""
+    _IOPRIO_WHO_PGRP = 2
+
+    """Bit offset of the class in an I/O priority value."""
+    _IOPRIO_CLASS_SHIFT = 13
+
     """Signal grace timings for child process-group termination escalation."""
     _TERMINATION_SEQUENCE = (
         (SIGHUP, 1.0),
@@ -121,13 +1502,308 @@ if sys.platform != "win32":
             if wait_seconds > 0:
                 sleep(wait_seconds)
 
+    class _ProcfsProcessTree:
+        """Samples a process tree from ``/proc`` with cached stat handles.
+
+        Descendants are found through ``/proc/<pid>/task/<tid>/children``
+        instead of scanning every process, and each process's ``stat`` file
+        stays open between samples so it is re-read without a path lookup.
+        """
+
+        def __init__(self, root_pid: int) -> None:
+            """Initialize a sampler for the tree rooted at `root_pid`."""
+            self.root_pid = root_pid
+            self._stat_files = dict[int, BinaryIO]()
+
+        @staticmethod
+        def available(root_pid: int) -> bool:
+            """Return whether ``/proc`` can enumerate the children of `root_pid`."""
+            try:
+                listdir(f"{_PROCFS}/{root_pid}/task")
+                with open(f"{_PROCFS}/{root_pid}/task/{root_pid}/children", "rb"):
+                    return True
+            except OSError:
+                return False
+
+        def close(self) -> None:
+            """Close all cached stat handles."""
+            for file in self._stat_files.values():
+                file.close()
+            self._stat_files.clear()
+
+        def sample(self) -> tuple[int, float, int]:
+            """Return ``(process count, CPU seconds, RSS bytes)`` for the tree.
+
+            CPU time includes the reaped children of live processes, so work
+            done by finished commands stays accounted for.
+            """
+            seen = set[int]()
+            ticks = rss_pages = 0
+            stack = [self.root_pid]
+            while stack:
+                pid = stack.pop()
+                if pid in seen:
+                    continue
+                fields = self._stat(pid)
+                if fields is None:
+                    continue
+                seen.add(pid)
+                # `fields[0]` is field 3 of `proc_pid_stat(5)`.
+                ticks += sum(int(field) for field in fields[11:15])
+                rss_pages += int(fields[21])
+                stack.extend(self._children(pid))
+            for pid in self._stat_files.keys() - seen:
+                self._stat_files.pop(pid).close()
+            return len(seen), ticks / _CLOCK_TICKS, rss_pages * _PAGE_SIZE
+
+        def _stat(self, pid: int) -> list[bytes] | None:
+            """Return the fields after the command name in ``stat`` of `pid`."""
+            try:
+                file = self._stat_files.get(pid)
+                if file is None:
+                    file = self._stat_files[pid] = open(  # noqa: SIM115
+                        f"{_PROCFS}/{pid}/stat", "rb", buffering=0
+                    )
+                stat = pread(file.fileno(), 4096, 0)
+            except OSError:
+                file = self._stat_files.pop(pid, None)
+                if file is not None:
+                    file.close()
+                return None
+            return stat[stat.rfind(b")") + 2 :].split()
+
+        @staticmethod
+        def _children(pid: int) -> list[int]:
+            """Return the child pids of every thread of `pid`."""
+            children = list[int]()
+            with suppress(OSError):
+                for tid in listdir(f"{_PROCFS}/{pid}/task"):
+                    with (
+                        suppress(OSError),
+                        open(f"{_PROCFS}/{pid}/task/{tid}/children", "rb") as file,
+                    ):
+                        children.extend(int(child) for child in file.read().split())
+            return children
+
+    class _PsutilProcessTree:
+        """Samples a process tree through ``psutil`` with cached handles."""
+
+        def __init__(self, root_pid: int) -> None:
+            """Initialize a sampler for the tree rooted at `root_pid`."""
+            self.root_pid = root_pid
+            self._processes = dict[int, Any]()
+
+        def close(self) -> None:
+            """Drop all cached process handles."""
+            self._processes.clear()
+
+        def sample(self) -> tuple[int, float, int]:
+            """Return ``(process count, CPU seconds, RSS bytes)`` for the tree."""
+            assert psutil is not None
+            root = self._processes.get(self.root_pid)
+            if root is None:
+                try:
+                    root = self._processes[self.root_pid] = psutil.Process(
+                        self.root_pid
+                    )
+                except psutil.Error:
+                    return 0, 0.0, 0
+            live = dict[int, Any]()
+            with suppress(psutil.Error):
+                for process in (root, *root.children(recursive=True)):
+                    # Reuse cached handles so `psutil` keeps its per-process state.
+                    live[process.pid] = self._processes.get(process.pid, process)
+            count, seconds, rss = 0, 0.0, 0
+            for process in live.values():
+                try:
+                    with process.oneshot():
+                        times = process.cpu_times()
+                        rss += process.memory_info().rss
+                except psutil.Error:
+                    continue
+                count += 1
+                seconds += (
+                    times.user
+                    + times.system
+                    + times.children_user
+                    + times.children_system
+                )
+            self._processes = live
+            return count, float(seconds), int(rss)
+
+    def _process_tree(root_pid: int) -> _ProcfsProcessTree | _PsutilProcessTree:
+        """Return a sampler for the tree of `root_pid`, preferring ``/proc``."""
+        if _ProcfsProcessTree.available(root_pid):
+            return _ProcfsProcessTree(root_pid)
+        if psutil is not None:
+            return _PsutilProcessTree(root_pid)
+        raise NotImplementedError("neither /proc nor psutil is available")
+
+    class _ResourceMonitor:
+        """Context manager sampling a process tree in the background.
+
+        Samples are taken every `interval` seconds on a daemon thread, so a
+        large tree never delays I/O forwarding.
+        """
+
+        def __init__(
+            self, tree: _ProcfsProcessTree | _PsutilProcessTree, interval: float
+        ) -> None:
+            """Initialize a monitor sampling `tree` every `interval` seconds."""
+            self.interval = interval
+            self._tree = tree
+            self._stop = Event()
+            self._thread = Thread(target=self._run, name="resources", daemon=True)
+            self._latest: Mapping[str, object] = {}
+            self._previous: tuple[float, float] | None = None
+            self._peak_rss = self._peak_processes = 0
+
+        def __enter__(self) -> Self:
+            """Take a first sample and start the sampling thread."""
+            self.sample()
+            self._thread.start()
+            return self
+
+        def __exit__(
+            self,
+            exc_type: type[BaseException] | None,
+            exc: BaseException | None,
+            tb: TracebackType | None,
+        ) -> None:
+            """Stop the sampling thread and release cached handles."""
+            self._stop.set()
+            self._thread.join()
+            self._tree.close()
+
+        @property
+        def latest(self) -> Mapping[str, object]:
+            """The most recent sample, including peaks seen so far."""
+            return self._latest
+
+        def sample(self) -> Mapping[str, object]:
+            """Take one sample and make it the latest."""
+            at = monotonic()
+            processes, cpu_seconds, rss = self._tree.sample()
+            cpu_percent = 0.0
+            if self._previous is not None:
+                elapsed = at - self._previous[0]
+                if elapsed > 0:
+                    used = max(cpu_seconds - self._previous[1], 0.0)
+                    cpu_percent = used / elapsed * 100
+            self._previous = at, cpu_seconds
+            self._peak_rss = max(self._peak_rss, rss)
+            self._peak_processes = max(self._peak_processes, processes)
+            self._latest = {
+                "time": time(),
+                "processes": processes,
+                "cpu_seconds": cpu_seconds,
+                "cpu_percent": cpu_percent,
+                "rss_bytes": rss,
+                "peak_processes": self._peak_processes,
+                "peak_rss_bytes": self._peak_rss,
+            }
+            return self._latest
+
+        def _run(self) -> None:
+            """Sample until stopped."""
+            while not self._stop.wait(self.interval):
+                self.sample()
+
+    def _children_rusage() -> dict[str, object]:
+        """Return ``getrusage(RUSAGE_CHILDREN)`` totals for reaped children."""
+        usage = getrusage(RUSAGE_CHILDREN)
+        return {
+            "user_seconds": usage.ru_utime,
+            "system_seconds": usage.ru_stime,
+            "max_rss_bytes": usage.ru_maxrss * _MAXRSS_SCALE,
+            "minor_faults": usage.ru_minflt,
+            "major_faults": usage.ru_majflt,
+            "voluntary_switches": usage.ru_nvcsw,
+            "involuntary_switches": usage.ru_nivcsw,
+        }
+
+    def _ioprio_set(pgid: int, io_class: int, level: int) -> None:
+        """Set the Linux I/O priority of process group `pgid` (0: our own)."""
+        if _IOPRIO_SET_SYSCALL is None:
+            raise NotImplementedError("I/O priorities are not supported here")
+        ioprio = io_class << _IOPRIO_CLASS_SHIFT | level
+        libc = CDLL(None, use_errno=True)
+        if libc.syscall(_IOPRIO_SET_SYSCALL, _IOPRIO_WHO_PGRP, pgid, ioprio) < 0:
+            errno = get_errno()
+            raise OSError(errno, strerror(errno))
+
+    def _set_priority(pgids: Iterable[int], name: str) -> list[str]:
+        """Apply priority class `name` to process groups `pgids`.
+
+        Both priorities are attempted for every group and the failures are
+        returned. Raising the CPU priority back up usually fails with
+        ``PermissionError`` unless ``RLIMIT_NICE`` or ``CAP_SYS_NICE`` allow
+        it; the I/O priority can be restored without privileges.
+        """
+        nice, io_class, level = _PRIORITY_CLASSES[name]
+        errors = list[str]()
+        for pgid in dict.fromkeys(pgids):
+            try:
+                setpriority(PRIO_PGRP, pgid, nice)
+            except OSError as exc:
+                errors.append(f"{type(exc).__name__}: {exc}")
+            try:
+                _ioprio_set(pgid, io_class, level)
+            except (NotImplementedError, OSError) as exc:
+                errors.append(f"{type(exc).__name__}: {exc}")
+        return errors
+
+    """Index of the local mode flags in a `tcgetattr` result."""
+    _LFLAG = 3
+
+    class _EchoMonitor:
+        """Reports changes of the PTY's echo and line-editing modes.
+
+        `poll()` reads the terminal attributes through the master and passes
+        them to `on_change` when they differ from the last poll, starting
+        with the first one. The host can show predicted local echo while
+        ``echo`` and ``canonical`` are set, and stop when a program switches
+        to ``raw`` mode or turns echo off, e.g. at a password prompt.
+        """
+
+        def __init__(
+            self, pty_fd: int, on_change: Callable[[Mapping[str, bool]], None]
+        ) -> None:
+            """Initialize a monitor of `pty_fd`."""
+            self.pty_fd = pty_fd
+            self.on_change = on_change
+            self.state: Mapping[str, bool] | None = None
+            self._lflag: int | None = None
+
+        def poll(self) -> None:
+            """Read the modes and report them if they changed."""
+            try:
+                lflag = tcgetattr(self.pty_fd)[_LFLAG] & (ICANON | ECHO | ISIG)
+            except termios_error:
+                return
+            if lflag == self._lflag:
+                return
+            self._lflag = lflag
+            self.state = {
+                "canonical": bool(lflag & ICANON),
+                "echo": bool(lflag & ECHO),
+                "signals": bool(lflag & ISIG),
+                "raw": not lflag & (ICANON | ISIG),
+            }
+            self.on_change(self.state)
+
     class _SelectorHandler:
         """Base context-manager that registers a read-callback for an FD.
 
         Subclasses should implement `_on_read()`; this base class provides the
         common registration/unregistration logic and exposes `registered`.
+        The handler itself is the selector key's data; `_Scheduler` services
+        handlers with a lower `priority` first.
         """
 
+        """Scheduling priority; lower values are serviced first."""
+        priority = 0
+
         def __init__(self, selector: BaseSelector, fd: int) -> None:
             """Initialize the selector handler for `fd`."""
             self.selector = selector
@@ -136,7 +1812,7 @@ if sys.platform != "win32":
 
         def __enter__(self) -> Self:
             """Register the FD callback and return this manager."""
-            self.selector.register(self.fd, EVENT_READ, self._on_read)
+            self.selector.register(self.fd, EVENT_READ, self)
             self.registered = True
             return self
 
@@ -152,7 +1828,11 @@ if sys.platform != "win32":
                     self.selector.unregister(self.fd)
                 self.registered = False
 
-        def _on_read(self) -> None:
+        def __call__(self) -> int:
+            """Service the ready FD and return the number of bytes read."""
+            return self._on_read()
+
+        def _on_read(self) -> int:
             """Read callback — must be implemented by subclasses."""
             raise NotImplementedError
 
@@ -164,76 +1844,740 @@ if sys.platform != "win32":
                 self.registered = False
 
     class _PipePty(_SelectorHandler):
-        """Context manager that handles PTY -> stdout forwarding."""
+        """Context manager that handles PTY -> stdout forwarding.
+
+        Each forwarded chunk is also passed to `observers` as a `memoryview`
+        that is only valid during the call; observers that keep the data must
+        copy it. Observers must be cheap since they run on the forwarding path.
+        With a `transcoder`, output is converted before both, so observers
+        always see host-encoded text. With `bulk`, large payloads are then
+        diverted, and with `synchronized`, synchronized updates coalesced;
+        call `expire()` by `deadline` to release output held back by either.
+        """
+
+        """PTY output yields to input and control frames."""
+        priority = 1
 
-        def __init__(self, selector: BaseSelector, pty_fd: int) -> None:
+        def __init__(
+            self,
+            selector: BaseSelector,
+            pty_fd: int,
+            observers: Sequence[Callable[[memoryview], None]] = (),
+            transcoder: _Transcoder | None = None,
+        ) -> None:
             """Initialize the PTY->stdout handler."""
             super().__init__(selector, pty_fd)
+            self.observers = observers
+            self.transcoder = transcoder
+            self.bulk: _BulkPayloads | None = None
+            self.synchronized: _SynchronizedOutput | None = None
+            self._buffer = bytearray(_BUFFER_SIZE)
+            self._view = memoryview(self._buffer)
+
+        @property
+        def deadline(self) -> float | None:
+            """The `monotonic()` time held-back output must be released at."""
+            deadlines = (
+                None if self.bulk is None else self.bulk.deadline,
+                None if self.synchronized is None else self.synchronized.deadline,
+            )
+            return min(
+                (deadline for deadline in deadlines if deadline is not None),
+                default=None,
+            )
+
+        def expire(self) -> None:
+            """Forward held-back output whose deadline has passed."""
+            if self.bulk is not None:
+                for chunk in self.bulk.expire(monotonic()):
+                    self._synchronize(chunk)
+            if self.synchronized is not None:
+                for chunk in self.synchronized.expire(monotonic()):
+                    self._forward(chunk)
 
         @override
-        def _on_read(self) -> None:
+        def _on_read(self) -> int:
             """Read from the PTY and forward bytes to stdout; stop on EOF."""
-            data = _read_or_eof(self.fd)
-            if not data:
+            size = _readinto_or_eof(self.fd, self._buffer)
+            if not size:
                 self._unregister()
+                if self.transcoder is not None:
+                    self._deliver(memoryview(self.transcoder.flush()))
+                if self.bulk is not None:
+                    for chunk in self.bulk.flush():
+                        self._synchronize(chunk)
+                if self.synchronized is not None:
+                    for chunk in self.synchronized.flush():
+                        self._forward(chunk)
+                return 0
+            data = self._view[:size]
+            if self.transcoder is not None:
+                data = memoryview(self.transcoder(data))
+            self._deliver(data)
+            return size
+
+        def _deliver(self, data: memoryview) -> None:
+            """Forward `data`, diverting bulk payloads if enabled."""
+            if self.bulk is None:
+                self._synchronize(data)
+                return
+            for chunk in self.bulk.feed(data, monotonic()):
+                self._synchronize(chunk)
+
+        def _synchronize(self, data: memoryview) -> None:
+            """Forward `data`, coalescing synchronized updates if enabled."""
+            if self.synchronized is None:
+                self._forward(data)
+                return
+            for chunk in self.synchronized.feed(data, monotonic()):
+                self._forward(chunk)
+
+        def _forward(self, data: memoryview) -> None:
+            """Write `data` to stdout and pass it to the observers."""
+            if not data:
                 return
             write_all(_STDOUT, data)
+            for observer in self.observers:
+                observer(data)
 
     class _PipeStdin(_SelectorHandler):
-        """Context manager that forwards stdin -> PTY."""
+        """Context manager that forwards stdin -> PTY.
 
-        def __init__(self, selector: BaseSelector, pty_fd: int) -> None:
+        With a `transcoder`, input is converted before it reaches the PTY.
+        """
+
+        def __init__(
+            self,
+            selector: BaseSelector,
+            pty_fd: int,
+            transcoder: _Transcoder | None = None,
+        ) -> None:
             """Initialize the stdin->PTY handler."""
             super().__init__(selector, _STDIN)
             self.pty_fd = pty_fd
+            self.transcoder = transcoder
+            self._buffer = bytearray(_BUFFER_SIZE)
+            self._view = memoryview(self._buffer)
 
         @override
-        def _on_read(self) -> None:
+        def _on_read(self) -> int:
             """Read from stdin and forward bytes to the PTY; unregister on EOF."""
-            data = _read_or_eof(self.fd)
-            if not data:
+            size = _readinto_or_eof(self.fd, self._buffer)
+            if not size:
                 self._unregister()
+                if self.transcoder is not None:
+                    write_all(self.pty_fd, self.transcoder.flush())
+                return 0
+            data = self._view[:size]
+            if self.transcoder is None:
+                write_all(self.pty_fd, data)
+            else:
+                write_all(self.pty_fd, self.transcoder(data))
+            return size
+
+    class _WindowSizes:
+        """Resizes the PTY to the smallest size of all sized viewers.
+
+        Each dimension is minimized on its own so every viewer can show the
+        whole screen. The PTY is resized on every update, as the host expects
+        a resize even when the size is unchanged.
+        """
+
+        def __init__(self, pty_fd: int) -> None:
+            """Initialize with no known viewer sizes."""
+            self.pty_fd = pty_fd
+            self._sizes = dict[object, tuple[int, int]]()
+
+        @property
+        def size(self) -> tuple[int, int] | None:
+            """The negotiated ``(columns, rows)``, or `None` if none is known."""
+            if not self._sizes:
+                return None
+            return (
+                min(columns for columns, _ in self._sizes.values()),
+                min(rows for _, rows in self._sizes.values()),
+            )
+
+        def get(self, viewer: object) -> tuple[int, int] | None:
+            """Return the size last requested by `viewer`."""
+            return self._sizes.get(viewer)
+
+        def update(self, viewer: object, columns: int, rows: int) -> None:
+            """Record the size of `viewer` and resize the PTY."""
+            self._sizes[viewer] = columns, rows
+            self._apply()
+
+        def remove(self, viewer: object) -> None:
+            """Forget `viewer` and resize the PTY if its size was known."""
+            if self._sizes.pop(viewer, None) is not None:
+                self._apply()
+
+        def _apply(self) -> None:
+            """Resize the PTY to the negotiated size."""
+            size = self.size
+            if size is not None:
+                columns, rows = size
+                ioctl(self.pty_fd, TIOCSWINSZ, pack("HHHH", rows, columns, 0, 0))
+
+    class _Viewer(_SelectorHandler):
+        """One attached viewer connection of a `_ViewerHub`.
+
+        Output is sent straight from the PTY buffer with ``sendmsg``. Only
+        when the viewer falls behind is the rest queued in a backlog, which
+        is flushed when the socket becomes writable; a viewer whose backlog
+        exceeds `_VIEWER_BACKLOG_LIMIT` is disconnected.
+        """
+
+        def __init__(self, hub: _ViewerHub, connection: socket) -> None:
+            """Initialize a viewer attached to `hub` over `connection`."""
+            super().__init__(hub.selector, connection.fileno())
+            self.hub = hub
+            self.connection = connection
+            self.backlog = bytearray()
+            self._pending = bytearray()
+            self._buffer = bytearray(_CHUNK_SIZE)
+            self._view = memoryview(self._buffer)
+
+        def send(self, header: bytes, data: memoryview) -> None:
+            """Send one frame, queueing what the socket does not take now."""
+            if self.backlog:
+                self.backlog += header
+                self.backlog += data
+            else:
+                try:
+                    sent = self.connection.sendmsg(  # ty: ignore[possibly-missing-attribute]
+                        (header, data)
+                    )
+                except BlockingIOError:
+                    sent = 0
+                except OSError:
+                    self.hub.detach(self)
+                    return
+                if sent < len(header):
+                    self.backlog += header[sent:]
+                    self.backlog += data
+                elif sent < len(header) + len(data):
+                    self.backlog += data[sent - len(header) :]
+                if self.backlog:
+                    self.selector.modify(self.fd, EVENT_READ | EVENT_WRITE, self)
+            if len(self.backlog) > _VIEWER_BACKLOG_LIMIT:
+                self.hub.detach(self)
+
+        @override
+        def _on_read(self) -> int:
+            """Flush the backlog, then read and apply the viewer's frames."""
+            if not self.registered:
+                return 0
+            if self.backlog:
+                self._flush()
+            try:
+                size = self.connection.recv_into(self._buffer)
+            except BlockingIOError:
+                return 0
+            except OSError:
+                size = 0
+            if not size:
+                self.hub.detach(self)
+                return 0
+            self._pending += self._view[:size]
+            header_size = _VIEWER_HEADER.size
+            while len(self._pending) >= header_size:
+                kind, length = _VIEWER_HEADER.unpack_from(self._pending)
+                if len(self._pending) < header_size + length:
+                    break
+                payload = bytes(self._pending[header_size : header_size + length])
+                del self._pending[: header_size + length]
+                try:
+                    self._on_frame(kind, payload)
+                except ValueError:
+                    self.hub.detach(self)
+                    break
+            return size
+
+        def _on_frame(self, kind: bytes, payload: bytes) -> None:
+            """Apply one frame from the viewer; unknown types are ignored."""
+            if kind == _VIEWER_INPUT:
+                if self.hub.writers == "all":
+                    write_all(self.hub.pty_fd, payload)
+            elif kind == _VIEWER_RESIZE:
+                self.hub.sizes.update(
+                    self, *_parse_size(payload.decode(_CMDIO_ENCODING))
+                )
+
+        def _flush(self) -> None:
+            """Send as much of the backlog as the socket takes."""
+            try:
+                sent = self.connection.send(self.backlog)
+            except BlockingIOError:
+                return
+            except OSError:
+                self.hub.detach(self)
+                return
+            del self.backlog[:sent]
+            if not self.backlog:
+                self.selector.modify(self.fd, EVENT_READ, self)
+
+    class _ViewerHub(_SelectorHandler):
+        """Listens on a Unix socket and mirrors the session to viewers.
+
+        PTY output passed to `broadcast()` is sent to every viewer from the
+        same buffer. Viewers send input and resize frames; input reaches the
+        PTY only if `writers` is ``"all"``, and the PTY takes the smallest
+        size among the host and all viewers. Attachments and detachments are
+        reported as ``viewer.attached`` and ``viewer.detached`` events.
+
+        The socket is only accessible to its owner, so other local users can
+        neither watch nor type into the session. A `path` that already exists
+        and belongs to another user is refused.
+        """
+
+        def __init__(
+            self,
+            selector: BaseSelector,
+            path: str,
+            pty_fd: int,
+            sizes: _WindowSizes,
+            writers: str = _VIEWER_WRITERS[0],
+        ) -> None:
+            """Initialize a hub that will listen at `path`."""
+            self.socket = socket(AF_UNIX, SOCK_STREAM)
+            super().__init__(selector, self.socket.fileno())
+            self.path = path
+            self.pty_fd = pty_fd
+            self.sizes = sizes
+            self.writers = writers
+            self.viewers = list[_Viewer]()
+
+        @override
+        def __enter__(self) -> Self:
+            """Start listening at `path` and register for connections."""
+            with suppress(FileNotFoundError):
+                if lstat(self.path).st_uid != getuid():
+                    raise PermissionError(
+                        EPERM, "viewer socket path is owned by another user", self.path
+                    )
+            self.socket.bind(self.path)
+            # Connections are refused until `listen`, so none can slip in.
+            chmod(self.path, S_IRUSR | S_IWUSR)
+            self.socket.listen()
+            self.socket.setblocking(False)
+            return super().__enter__()
+
+        @override
+        def __exit__(
+            self,
+            exc_type: type[BaseException] | None,
+            exc: BaseException | None,
+            tb: TracebackType | None,
+        ) -> None:
+            """Disconnect all viewers, stop listening and remove the socket."""
+            for viewer in tuple(self.viewers):
+                self.detach(viewer)
+            super().__exit__(exc_type, exc, tb)
+            self.socket.close()
+            with suppress(OSError):
+                unlink(self.path)
+
+        @property
+        def backlog(self) -> int:
+            """Output bytes queued for slow viewers."""
+            return sum(len(viewer.backlog) for viewer in self.viewers)
+
+        def broadcast(self, data: memoryview) -> None:
+            """Send PTY output to every viewer."""
+            if self.viewers:
+                header = _VIEWER_HEADER.pack(_VIEWER_OUTPUT, len(data))
+                for viewer in tuple(self.viewers):
+                    viewer.send(header, data)
+
+        def detach(self, viewer: _Viewer) -> None:
+            """Disconnect `viewer` and drop its size; no-op if detached."""
+            if viewer not in self.viewers:
                 return
-            write_all(self.pty_fd, data)
+            self.viewers.remove(viewer)
+            viewer._unregister()
+            viewer.connection.close()
+            self.sizes.remove(viewer)
+            _send_event("viewer.detached", {"viewers": len(self.viewers)})
+
+        def status(self) -> Mapping[str, object]:
+            """Describe the writer policy, negotiated size and viewers."""
+            return {
+                "writers": self.writers,
+                "size": self.sizes.size,
+                "viewers": [
+                    {"size": self.sizes.get(viewer), "backlog": len(viewer.backlog)}
+                    for viewer in self.viewers
+                ],
+            }
+
+        @override
+        def _on_read(self) -> int:
+            """Accept pending viewer connections."""
+            while True:
+                try:
+                    connection, _ = self.socket.accept()
+                except BlockingIOError:
+                    return 0
+                except OSError:
+                    self._unregister()
+                    return 0
+                connection.setblocking(False)
+                viewer = _Viewer(self, connection)
+                self.viewers.append(viewer.__enter__())
+                _send_event("viewer.attached", {"viewers": len(self.viewers)})
+
+    class _Wakeup(_SelectorHandler):
+        """Self-pipe that wakes the selector loop from other threads."""
+
+        def __init__(self, selector: BaseSelector) -> None:
+            """Initialize the self-pipe."""
+            read_fd, self.write_fd = pipe()
+            super().__init__(selector, read_fd)
+            self._lock = Lock()
+            self._closed = False
+
+        @override
+        def __exit__(
+            self,
+            exc_type: type[BaseException] | None,
+            exc: BaseException | None,
+            tb: TracebackType | None,
+        ) -> None:
+            """Unregister and close both ends of the pipe.
+
+            Later `wake()` calls do nothing, so a thread still running cannot
+            write to a reused FD.
+            """
+            super().__exit__(exc_type, exc, tb)
+            with self._lock:
+                self._closed = True
+                close(self.fd)
+                close(self.write_fd)
+
+        def wake(self) -> None:
+            """Make the selector loop run a round."""
+            with self._lock, suppress(OSError):
+                if not self._closed:
+                    write(self.write_fd, b"\0")
+
+        @override
+        def _on_read(self) -> int:
+            """Drain pending wakeups."""
+            with suppress(OSError):
+                read(self.fd, _CHUNK_SIZE)
+            return 0
+
+    class _ForwardingThread:
+        """Runs a forwarding handler on its own thread with blocking I/O.
+
+        Used by the ``threads`` engine, so a slow write in one direction
+        never delays the other. The handler is never added to the selector;
+        it is only marked registered, so its EOF path just clears the flag,
+        and `wakeup` lets the selector loop notice at once. The thread waits
+        for its FD together with a stop pipe, so it stops reading on exit
+        even while idle. Reads and bytes are counted in `metrics` under
+        ``<name>_reads`` and ``<name>_bytes``.
+        """
+
+        def __init__(
+            self,
+            handler: _SelectorHandler,
+            name: str,
+            metrics: Counter[str],
+            wakeup: _Wakeup,
+            join_timeout: float | None = None,
+        ) -> None:
+            """Initialize a thread forwarding with `handler`.
+
+            On exit the thread is stopped and joined for up to `join_timeout`
+            seconds, or until it ends if `None`; only a blocked write can
+            hold it up.
+            """
+            self.handler = handler
+            self.name = name
+            self.metrics = metrics
+            self.wakeup = wakeup
+            self.join_timeout = join_timeout
+            self._stop_fd, self._stop_write_fd = pipe()
+            self._thread = Thread(target=self._run, name=name, daemon=True)
+
+        def __enter__(self) -> Self:
+            """Start forwarding."""
+            self.handler.registered = True
+            self._thread.start()
+            return self
+
+        def __exit__(
+            self,
+            exc_type: type[BaseException] | None,
+            exc: BaseException | None,
+            tb: TracebackType | None,
+        ) -> None:
+            """Stop the thread and wait for it to finish, see `__init__`."""
+            write(self._stop_write_fd, b"\0")
+            self._thread.join(self.join_timeout)
+            if not self._thread.is_alive():
+                close(self._stop_fd)
+                close(self._stop_write_fd)
+
+        @property
+        def registered(self) -> bool:
+            """Whether the handler has not reached EOF yet."""
+            return self.handler.registered
+
+        def _run(self) -> None:
+            """Forward until EOF or a stop, then wake the selector loop."""
+            reads, size = f"{self.name}_reads", f"{self.name}_bytes"
+            while self.handler.registered:
+                ready = select((self.handler.fd, self._stop_fd), (), ())[0]
+                if self._stop_fd in ready:
+                    break
+                self.metrics[size] += self.handler()
+                self.metrics[reads] += 1
+            self.wakeup.wake()
 
     class _ProcessCmdIO(_SelectorHandler):
-        """Context manager that applies window-size control frames to the PTY."""
+        """Context manager that applies window-size control frames to the PTY.
 
-        def __init__(self, selector: BaseSelector, pty_fd: int) -> None:
+        JSON request lines are dispatched to `handlers` by their ``type`` and
+        answered on the command FD.
+        """
+
+        def __init__(
+            self,
+            selector: BaseSelector,
+            pty_fd: int,
+            handlers: Mapping[str, _RequestHandler] | None = None,
+            sizes: _WindowSizes | None = None,
+        ) -> None:
             """Initialize the command-FD -> pty resizer handler."""
             super().__init__(selector, _CMDIO)
             self.pty_fd = pty_fd
+            self.handlers = {} if handlers is None else handlers
+            self.sizes = _WindowSizes(pty_fd) if sizes is None else sizes
+            self._pending = b""
+
+        @property
+        def pending_bytes(self) -> int:
+            """Bytes of an incomplete control line waiting for its end."""
+            return len(self._pending)
 
         @override
-        def _on_read(self) -> None:
-            """Read control frames from the command FD and apply window size.
+        def _on_read(self) -> int:
+            """Read control frames from the command FD and apply them.
 
-            Expected input: lines like "<rows>x<cols>"; each line triggers an
-            ioctl(TIOCSWINSZ) on the PTY.
+            Expected input: lines like "<columns>x<rows>"; each line updates
+            the host's size in `sizes`, which resizes the PTY. Lines starting
+            with ``{`` are JSON requests. A trailing incomplete line is kept for
+            the next read.
             """
             data = _read_or_eof(self.fd)
             if not data:
                 self._unregister()
-                return
-            for line in data.decode("UTF-8", "strict").splitlines():
-                rows, columns = (int(ss.strip()) for ss in line.split("x", 2))
-                ioctl(
-                    self.pty_fd,
-                    TIOCSWINSZ,
-                    pack("HHHH", columns, rows, 0, 0),
-                )
+                return 0
+            lines = (self._pending + data).split(b"\n")
+            self._pending = lines.pop()
+            for line in lines:
+                line = line.decode(_CMDIO_ENCODING, "strict").strip()
+                if line.startswith("{"):
+                    self._on_request(line)
+                elif line:
+                    self.sizes.update(self, *_parse_size(line))
+            return len(data)
+
+        def _on_request(self, line: str) -> None:
+            """Dispatch one JSON request and reply with its result or error."""
+            reply: dict[str, object] = {"id": None, "type": None}
+            try:
+                request = loads(line)
+                if not isinstance(request, dict):
+                    raise TypeError(request)
+                reply.update(id=request.get("id"), type=request.get("type"))
+                handler = self.handlers.get(str(reply["type"]))
+                if handler is None:
+                    raise LookupError(f"unsupported request type: {reply['type']}")
+                reply["result"] = handler(request)
+            except (LookupError, OSError, TypeError, ValueError) as exc:
+                reply["error"] = f"{type(exc).__name__}: {exc}"
+            _send_reply(reply)
+
+    class _Scheduler:
+        """Services ready handlers with input first and bounded output slices.
+
+        Each `run_once()` services every ready input or control handler before
+        reading PTY output, one chunk at a time. Between chunks the selector
+        is polled again so keystrokes arriving mid-slice (such as Ctrl-C) are
+        forwarded before more output. A slice ends when the PTY has nothing
+        left, or after `_OUTPUT_SLICE_BYTES` bytes or `_OUTPUT_SLICE_SECONDS`.
+        Scheduling decisions are counted in `metrics`.
+        """
+
+        def __init__(self, selector: BaseSelector, metrics: Counter[str]) -> None:
+            """Initialize a scheduler over `selector` recording into `metrics`."""
+            self.selector = selector
+            self.metrics = metrics
 
-    def main() -> None:
+        def run_once(self, timeout: float | None) -> None:
+            """Wait up to `timeout` for readiness and service one round."""
+            metrics = self.metrics
+            metrics["iterations"] += 1
+            ready = [key.data for key, _ in self.selector.select(timeout)]
+            start = monotonic()
+            output_bytes = 0
+            while ready:
+                ready.sort(key=lambda handler: handler.priority)
+                output = False
+                for handler in ready:
+                    if handler.priority > 0:
+                        output = True
+                        metrics["output_reads"] += 1
+                        output_bytes += handler()
+                    else:
+                        metrics["input_reads"] += 1
+                        metrics["input_bytes"] += handler()
+                        if output_bytes:
+                            metrics["input_preemptions"] += 1
+                if not output:
+                    break
+                if output_bytes >= _OUTPUT_SLICE_BYTES:
+                    metrics["output_slices_byte_limited"] += 1
+                    break
+                if monotonic() - start >= _OUTPUT_SLICE_SECONDS:
+                    metrics["output_slices_time_limited"] += 1
+                    break
+                ready = [key.data for key, _ in self.selector.select(0)]
+            metrics["output_bytes"] += output_bytes
+            metrics["max_slice_bytes"] = max(metrics["max_slice_bytes"], output_bytes)
+
+    def _scrollback_search_handler(index: _ScrollbackIndex) -> _RequestHandler:
+        """Return the ``scrollback.search`` handler backed by `index`.
+
+        Request fields: ``query`` (words to find) and optional ``limit``. The
+        result lists matching lines newest first.
+        """
+
+        def handle(request: Mapping[str, Any]) -> object:
+            """Search `index` for the requested words."""
+            matches = index.search(
+                str(request["query"]),
+                int(request.get("limit", _SCROLLBACK_SEARCH_LIMIT)),
+            )
+            return {
+                "lines": [{"line": line, "text": text} for line, text in matches],
+                "total": index.line_count,
+            }
+
+        return handle
+
+    def _resources_handler(
+        pid: int, interval: float, stack: ExitStack
+    ) -> _RequestHandler:
+        """Start monitoring the tree of `pid` and return the ``resources`` handler.
+
+        The result is the latest sample. If neither ``/proc`` nor ``psutil`` is
+        usable the session still runs and requests are answered with an error.
+        """
+        try:
+            monitor = stack.enter_context(
+                _ResourceMonitor(_process_tree(pid), interval)
+            )
+        except NotImplementedError as exc:
+            reason = str(exc)
+
+            def unavailable(_request: Mapping[str, Any]) -> object:
+                """Report that resource sampling is unavailable."""
+                raise LookupError(reason)
+
+            return unavailable
+        return lambda _request: monitor.latest
+
+    def _profile_handler(profiler: _Profiler) -> _RequestHandler:
+        """Return the ``profile`` handler controlling `profiler`.
+
+        Request field: ``action``, one of ``start``, ``stop`` or ``toggle``
+        (default). The result tells whether profiling is now active and which
+        files a stopped run is saved to; a ``profile.saved`` event follows.
+        """
+
+        def handle(request: Mapping[str, Any]) -> object:
+            """Apply the requested action to `profiler`."""
+            action = request.get("action", "toggle")
+            files: Sequence[str] = ()
+            if action == "start":
+                profiler.start()
+            elif action == "stop":
+                files = profiler.stop()
+            elif action == "toggle":
+                files = profiler.toggle()
+            else:
+                raise ValueError(f"unsupported profile action: {action}")
+            return {"active": profiler.active, "files": list(files)}
+
+        return handle
+
+    def _priority_handler(pid: int, pty_fd: int, name: str) -> _RequestHandler:
+        """Return the ``priority`` handler for the session led by `pid`.
+
+        Request field: optional ``class``, one of `_PRIORITY_CLASSES`. It is
+        applied to the session's process group and the terminal's foreground
+        job; jobs started later inherit it from the shell. The result has the
+        class, the groups' best nice value and the errors of the last change.
+        """
+        current = name
+        errors = list[str]()
+
+        def handle(request: Mapping[str, Any]) -> object:
+            """Apply the requested class, if any, and describe the current one."""
+            nonlocal current, errors
+            requested = request.get("class")
+            if requested is not None:
+                if requested not in _PRIORITY_CLASSES:
+                    raise ValueError(f"unsupported priority class: {requested}")
+                pgids = [getpgid(pid)]
+                with suppress(OSError):
+                    pgids.append(tcgetpgrp(pty_fd))
+                errors = _set_priority(pgids, requested)
+                current = requested
+            return {
+                "class": current,
+                "nice": getpriority(PRIO_PGRP, getpgid(pid)),
+                "errors": errors,
+            }
+
+        return handle
+
+    def main(argv: Sequence[str] | None = None) -> None:
         """Fork and proxy a child process on a pseudoterminal.
 
         The function forks; the child execs the requested program while the
         parent proxies IO between the controlling terminal and the pty.
+        `argv` defaults to ``sys.argv``; see `_argument_parser` for options.
         """
+        options = _parse_arguments((sys.argv if argv is None else argv)[1:])
+        spawned = monotonic()
         pid, pty_fd = fork()
         if pid == 0:
-            execvp(sys.argv[1], sys.argv[1:])
+            if options.priority != "normal":
+                _set_priority((0,), options.priority)
+            if options.environment_file is None:
+                execvp(options.command[0], options.command)
+            else:
+                execvpe(
+                    options.command[0],
+                    options.command,
+                    {**environ, **options.environment_file},
+                )
 
         shutdown_requested = False
+        profile_toggle_requested = False
+
+        def request_profile_toggle(
+            _signal_number: int, _frame: FrameType | None
+        ) -> None:
+            """Defer a profiling toggle to the proxy loop."""
+            nonlocal profile_toggle_requested
+            profile_toggle_requested = True
 
         def request_shutdown(_signal_number: int, _frame: FrameType | None) -> None:
             """Mark the proxy for graceful shutdown on external signals."""
@@ -242,13 +2586,141 @@ if sys.platform != "win32":
 
         old_sigint = signal(SIGINT, request_shutdown)
         old_sigterm = signal(SIGTERM, request_shutdown)
+        old_sigusr1 = None
+        if options.profile_dir is not None:
+            old_sigusr1 = signal(SIGUSR1, request_profile_toggle)
         try:
-            with (
-                DefaultSelector() as selector,
-                _PipePty(selector, pty_fd) as pipe_pty,
-                _PipeStdin(selector, pty_fd) as pipe_stdin,
-                _ProcessCmdIO(selector, pty_fd) as process_cmdio,
-            ):
+            with ExitStack() as stack:
+                observers = list[Callable[[memoryview], None]]()
+                handlers = dict[str, _RequestHandler]()
+                buffer_sizes = dict[str, Callable[[], int]]()
+                if options.scrollback_index is not None:
+                    index = stack.enter_context(
+                        _ScrollbackIndex(options.scrollback_index)
+                    )
+                    observers.append(index.feed)
+                    buffer_sizes["scrollback_backlog_chunks"] = lambda: index.backlog
+                    handlers["scrollback.search"] = _scrollback_search_handler(index)
+                if options.resource_interval is not None:
+                    handlers["resources"] = _resources_handler(
+                        pid, options.resource_interval, stack
+                    )
+                if options.command_timing:
+                    timer = _CommandTimer(spawned)
+                    observers.append(timer.feed)
+                    handlers["commands"] = lambda request: timer.summary(
+                        int(request.get("limit", _COMMAND_SUMMARY_LIMIT))
+                    )
+                if options.vault_root is not None:
+                    scanner = stack.enter_context(
+                        _VaultLinkScanner(
+                            options.vault_root,
+                            lambda links: _send_event("vault.links", {"links": links}),
+                        )
+                    )
+                    observers.append(scanner.feed)
+                    buffer_sizes["vault_links_backlog_chunks"] = lambda: scanner.backlog
+                    handlers["vault.refresh"] = lambda _request: scanner.invalidate()
+                handlers["priority"] = _priority_handler(pid, pty_fd, options.priority)
+                profiler = None
+                if options.profile_dir is not None:
+                    profiler = stack.enter_context(
+                        _Profiler(
+                            options.profile_dir,
+                            options.session_id,
+                            lambda event: _send_event("profile.saved", event),
+                        )
+                    )
+                    handlers["profile"] = _profile_handler(profiler)
+                metrics = Counter[str]()
+                handlers["metrics"] = lambda _request: dict(metrics)
+                selector = stack.enter_context(DefaultSelector())
+                scheduler = _Scheduler(selector, metrics)
+                sizes = _WindowSizes(pty_fd)
+                if options.viewer_socket is not None:
+                    hub = stack.enter_context(
+                        _ViewerHub(
+                            selector,
+                            options.viewer_socket,
+                            pty_fd,
+                            sizes,
+                            options.viewer_writers,
+                        )
+                    )
+                    observers.append(hub.broadcast)
+                    buffer_sizes["viewer_backlog_bytes"] = lambda: hub.backlog
+                    handlers["viewers"] = lambda _request: hub.status()
+                output_handler = _PipePty(selector, pty_fd, observers)
+                input_handler = _PipeStdin(selector, pty_fd)
+                if options.bulk_dir is not None:
+                    output_handler.bulk = stack.enter_context(
+                        _BulkPayloads(options.bulk_dir, options.bulk_threshold, metrics)
+                    )
+                if options.synchronized_output:
+                    output_handler.synchronized = _SynchronizedOutput(metrics)
+                if options.encoding is not None:
+                    output_handler.transcoder = _Transcoder(
+                        options.encoding, _HOST_ENCODING
+                    )
+                    input_handler.transcoder = _Transcoder(
+                        _HOST_ENCODING, options.encoding
+                    )
+                pipe_pty: _PipePty | _ForwardingThread
+                pipe_stdin: _PipeStdin | _ForwardingThread
+                if options.engine == "threads":
+                    wakeup = stack.enter_context(_Wakeup(selector))
+                    pipe_pty = stack.enter_context(
+                        _ForwardingThread(
+                            output_handler,
+                            "output",
+                            metrics,
+                            wakeup,
+                            _SELECT_TIMEOUT_SECONDS,
+                        )
+                    )
+                    pipe_stdin = stack.enter_context(
+                        _ForwardingThread(
+                            input_handler,
+                            "input",
+                            metrics,
+                            wakeup,
+                            _SELECT_TIMEOUT_SECONDS,
+                        )
+                    )
+                else:
+                    pipe_pty = stack.enter_context(output_handler)
+                    pipe_stdin = stack.enter_context(input_handler)
+                process_cmdio = stack.enter_context(
+                    _ProcessCmdIO(selector, pty_fd, handlers, sizes)
+                )
+                buffer_sizes["cmdio_pending_bytes"] = lambda: (
+                    process_cmdio.pending_bytes
+                )
+                poll_echo_mode: Callable[[], None] = lambda: None
+                if options.echo_mode:
+                    echo_monitor = _EchoMonitor(
+                        pty_fd, lambda state: _send_event("termios", state)
+                    )
+                    handlers["termios"] = lambda _request: echo_monitor.state
+                    poll_echo_mode = echo_monitor.poll
+                    poll_echo_mode()
+                beat: Callable[[], None] = lambda: None
+                if options.stall_threshold is not None:
+                    beat = stack.enter_context(
+                        _Watchdog(
+                            # The loop may also wait this long for I/O.
+                            options.stall_threshold + _SELECT_TIMEOUT_SECONDS,
+                            f"{options.diagnostics_dir}/"
+                            f"{options.session_id}.stalls.log",
+                            metrics,
+                            lambda: {
+                                "buffers": {
+                                    name: size() for name, size in buffer_sizes.items()
+                                },
+                                "metrics": dict(metrics),
+                            },
+                        )
+                    ).beat
                 # Keep proxying while all host-facing pipes are alive and
                 # no explicit shutdown signal has been requested.
                 while (
@@ -257,8 +2729,17 @@ if sys.platform != "win32":
                     and process_cmdio.registered
                     and not shutdown_requested
                 ):
-                    for key, _ in selector.select(_SELECT_TIMEOUT_SECONDS):
-                        key.data()
+                    timeout = _SELECT_TIMEOUT_SECONDS
+                    deadline = output_handler.deadline
+                    if deadline is not None:
+                        timeout = min(max(deadline - monotonic(), 0.0), timeout)
+                    scheduler.run_once(timeout)
+                    output_handler.expire()
+                    poll_echo_mode()
+                    beat()
+                    if profile_toggle_requested and profiler is not None:
+                        profile_toggle_requested = False
+                        profiler.toggle()
                     if getppid() == 1:
                         shutdown_requested = True
 
@@ -272,8 +2753,15 @@ if sys.platform != "win32":
         finally:
             signal(SIGINT, old_sigint)
             signal(SIGTERM, old_sigterm)
+            if old_sigusr1 is not None:
+                signal(SIGUSR1, old_sigusr1)
 
-        exit(waitstatus_to_exitcode(waitpid(pid, 0)[1]))
+        exit_code = waitstatus_to_exitcode(waitpid(pid, 0)[1])
+        if options.resource_interval is not None:
+            _send_event(
+                "resources.exit", {"exit_code": exit_code, **_children_rusage()}
+            )
+        exit(exit_code)
 
 
 if __name__ == "__main__":
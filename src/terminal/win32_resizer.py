@@ -6,33 +6,469 @@ size.  Most types and helpers are internal; the public API is listed in
 `__all__`.
 """
 
+from __future__ import annotations
+
 import sys
-from collections.abc import Callable, Generator
-from contextlib import contextmanager
+from collections import Counter
+from collections.abc import Callable, Generator, Iterable, Iterator, Mapping
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import AbstractContextManager, contextmanager, redirect_stdout
 from itertools import chain
-from time import sleep
+from json import dumps, loads
+from queue import Empty, SimpleQueue
+from threading import Event, Thread
+from time import monotonic, sleep
+from typing import Any
 
 from psutil import Process
 from pywinctl import Window, getAllWindows
 
 """Public API of this module."""
 __all__ = (
+    "find_window",
     "main",
     "resizer",
     "resizer_reader",
     "resizer_writer",
+    "service",
     "win_to_pid",
 )
 
-"""Sleep interval (in seconds) between attempts to locate a console window."""
-_LOOKUP_RETRY_INTERVAL = 1
+"""First sleep interval (in seconds) between attempts to locate a console window.
+
+Each following interval doubles, up to `_LOOKUP_MAX_RETRY_INTERVAL`."""
+_LOOKUP_RETRY_INTERVAL = 0.05
+
+"""Longest sleep interval (in seconds) between lookup attempts."""
+_LOOKUP_MAX_RETRY_INTERVAL = 1.0
 
-"""Maximum number of lookup attempts before giving up on a console window."""
-_LOOKUP_RETRIES = 10
+"""Maximum number of lookup attempts before giving up on a console window.
 
-"""Number of resize passes used to converge on the target terminal size."""
+With the backoff above, the attempts span about 10 seconds."""
+_LOOKUP_RETRIES = 14
+
+"""Most resize passes used to converge on the target terminal size.
+
+Passes after the first only run if the first misses the target size."""
 _RESIZE_ITERATIONS = 2
 
+"""Quiet period (in seconds) after a size before it is applied.
+
+Sizes arriving within the period replace it, so a burst costs one resize."""
+_RESIZE_DEBOUNCE = 0.03
+
+"""Longest delay (in seconds) of a size while newer sizes keep arriving."""
+_RESIZE_MAX_DELAY = 0.2
+
+
+def find_window(
+    process: Process,
+    windows: Callable[[], Iterable[Window]],
+    window_pid: Callable[[Window], int],
+    *,
+    sleep: Callable[[float], object] = sleep,
+) -> tuple[Process, Window]:
+    """Find a window owned by `process` or one of its descendants.
+
+    Each attempt lists `windows` once and indexes them by owner PID. Owner
+    PIDs are cached by window handle, so `window_pid` runs once per window
+    across attempts. The process tree is cached too: it is only refreshed
+    when no known process has a window and a window owner appeared since the
+    last refresh, as only such a window can belong to a new descendant.
+    Attempts are separated by exponentially growing sleeps; `LookupError` is
+    raised when all fail.
+    """
+    start = monotonic()
+    owners = dict[object, int]()
+    procs = {process.pid: process}
+    refreshed_owners = set[int]()
+    index = dict[int, Window]()
+    interval = _LOOKUP_RETRY_INTERVAL
+    for tries in range(_LOOKUP_RETRIES):
+        index.clear()
+        for win in windows():
+            handle = win.getHandle()
+            if handle not in owners:
+                owners[handle] = window_pid(win)
+            index.setdefault(owners[handle], win)
+        print(f"window(s) (try {tries + 1}): {len(index)}")
+        for refresh in (False, True):
+            if refresh:
+                if index.keys() <= refreshed_owners:
+                    break
+                refreshed_owners.update(index)
+                procs = {
+                    proc.pid: proc
+                    for proc in chain((process,), process.children(recursive=True))
+                }
+                print(f"process(es) (try {tries + 1}): {procs}")
+            for pid, proc in procs.items():
+                win = index.get(pid)
+                if win is not None:
+                    print(f"found in {monotonic() - start:.3f} s")
+                    return proc, win
+        sleep(interval)
+        interval = min(interval * 2, _LOOKUP_MAX_RETRY_INTERVAL)
+    raise LookupError(procs, tuple(index.values()))
+
+
+def _read_lines(lines: SimpleQueue[str | None], prompt: str) -> None:
+    """Put lines read from stdin into `lines`, then `None` at end of input."""
+    try:
+        while True:
+            lines.put(input(prompt))
+    except EOFError:
+        lines.put(None)
+
+
+def _parse_size(line: str) -> tuple[int, int]:
+    """Parse a size line of the form "<rows>x<cols>"."""
+    rows, columns = (int(s.strip()) for s in line.split("x", 2))
+    return rows, columns
+
+
+def resizer_reader(
+    process: Process,
+    lines: SimpleQueue[str | None],
+    metrics: Counter[str] | None = None,
+    *,
+    clock: Callable[[], float] = monotonic,
+) -> Iterator[tuple[int, int]]:
+    """Yield the newest (rows, columns) tuple of each burst of size lines.
+
+    Lines of the form "<rows>x<cols>" are taken from `lines`, as filled by
+    `_read_lines`. After a size, newer sizes arriving within
+    `_RESIZE_DEBOUNCE` replace it, for at most `_RESIZE_MAX_DELAY`, so only
+    the newest size of a burst is yielded. `metrics` counts the ``received``
+    and ``skipped`` sizes. Empty lines from the stdin watchdog check that
+    `process` is still running; the reader stops when it is not or at the end
+    of input. `clock` is the time source of the delays.
+    """
+    metrics = Counter[str]() if metrics is None else metrics
+    line: str | None = ""
+    while line is not None:
+        line = lines.get()
+        if line is None:
+            return
+        if not line:  # stdin watchdog triggers this loop
+            if not process.is_running():
+                return
+            continue
+        size = _parse_size(line)
+        metrics["received"] += 1
+        deadline = clock() + _RESIZE_MAX_DELAY
+        while (remaining := deadline - clock()) > 0:
+            try:
+                line = lines.get(timeout=min(_RESIZE_DEBOUNCE, remaining))
+            except Empty:
+                break
+            if line is None:
+                break
+            if line:
+                size = _parse_size(line)
+                metrics["received"] += 1
+                metrics["skipped"] += 1
+        print(
+            f"received: {size[0]}x{size[1]} "
+            f"(skipped {metrics['skipped']} of {metrics['received']})"
+        )
+        yield size
+
+
+class _ConsoleResizer:
+    """Resize a console and its window to a size in cells.
+
+    The pixel size of a cell and the window frame overhead are measured once
+    and cached, so a resize computes the target window size directly and runs
+    a single pass of setters. The console size read back after the pass
+    verifies it; on a miss, e.g. after a font or DPI change, the metrics are
+    measured again for another pass, up to `_RESIZE_ITERATIONS` passes.
+
+    `console` may be replaced by another handle to the same console, e.g.
+    after detaching from and reattaching to it; the metrics stay valid.
+    """
+
+    def __init__(
+        self,
+        console: Any,
+        window: Window,
+        *,
+        set_window_pos: Callable[[Any, int, int], object],
+        rect: Callable[[int, int, int, int], object],
+        coord: Callable[[int, int], object],
+        errors: tuple[type[BaseException], ...],
+    ) -> None:
+        """Create a resizer of `console` shown in `window`.
+
+        `set_window_pos` sets the pixel size of a window handle, `rect` and
+        `coord` build console rectangles and coordinates, and `errors` are
+        the setter errors to ignore.
+        """
+        self.console = console
+        self._window = window
+        self._handle = window.getHandle()
+        self._set_window_pos = set_window_pos
+        self._rect = rect
+        self._coord = coord
+        self._errors = errors
+        self._size = self._console_size()
+        self._cell: tuple[float, float] | None = None
+        self._frame = (0, 0)
+
+    def _console_size(self) -> tuple[int, int]:
+        """Read the visible console size as (columns, rows)."""
+        window = self.console.GetConsoleScreenBufferInfo()["Window"]
+        return (
+            int(window.Right - window.Left + 1),
+            int(window.Bottom - window.Top + 1),
+        )
+
+    def _measure(self) -> None:
+        """Measure the cell size and frame overhead in pixels."""
+        client = self._window.getClientFrame()
+        outer = self._window.size
+        width, height = client.right - client.left, client.bottom - client.top
+        columns, rows = self._size = self._console_size()
+        self._cell = width / columns, height / rows
+        self._frame = outer.width - width, outer.height - height
+
+    def _ignore_error(self, func: Callable[[], object]) -> None:
+        """Call `func()` and silently ignore setter errors."""
+        try:
+            func()
+        except self._errors:
+            pass
+
+    def _apply(self, columns: int, rows: int) -> None:
+        """Run one pass of setters towards `columns` x `rows`."""
+        if self._cell is None:
+            self._measure()
+        assert self._cell is not None
+        size = (
+            int(self._cell[0] * columns) + self._frame[0],
+            int(self._cell[1] * rows) + self._frame[1],
+        )
+        print(f"pixel size: {size}")
+        old_columns, old_rows = self._size
+        console, rect, coord = self.console, self._rect, self._coord
+        setters = [
+            # almost accurate, works for alternate screen buffer
+            lambda: self._set_window_pos(self._handle, *size),
+            # accurate, SetConsoleWindowInfo does not work for alternate screen buffer
+            lambda: console.SetConsoleWindowInfo(
+                True, rect(0, 0, columns - 1, old_rows - 1)
+            ),
+            lambda: console.SetConsoleScreenBufferSize(coord(columns, old_rows)),
+            lambda: console.SetConsoleWindowInfo(
+                True, rect(0, 0, columns - 1, rows - 1)
+            ),
+            lambda: console.SetConsoleScreenBufferSize(coord(columns, rows)),
+        ]
+        if old_columns < columns:
+            setters[1], setters[2] = setters[2], setters[1]
+        if old_rows < rows:
+            setters[3], setters[4] = setters[4], setters[3]
+        for setter in setters:
+            self._ignore_error(setter)
+
+    def resize(self, columns: int, rows: int) -> int:
+        """Resize to `columns` x `rows` and return the number of passes run."""
+        for passes in range(1, _RESIZE_ITERATIONS + 1):
+            self._apply(columns, rows)
+            self._size = self._console_size()
+            if self._size == (columns, rows):
+                return passes
+            self._cell = None
+        return _RESIZE_ITERATIONS
+
+
+class _Lookup:
+    """Result of looking up the window of a service session."""
+
+    def __init__(
+        self,
+        session: str,
+        found: tuple[Process, Window] | None,
+        exception: BaseException | None,
+    ) -> None:
+        """Record the `found` process and window or the lookup `exception`."""
+        self.session = session
+        self.found = found
+        self.exception = exception
+
+
+class _Session:
+    """State of one terminal served by `_ResizerService`."""
+
+    def __init__(self, pid: int) -> None:
+        """Create a session of the terminal process `pid`, not yet found."""
+        self.pid = pid
+        self.process: Process | None = None
+        self.window: Window | None = None
+        self.resizer: _ConsoleResizer | None = None
+        self.pending: tuple[int, int] | None = None
+        self.skipped = 0
+
+
+class _ResizerService:
+    """Resize the console windows of many terminals from one process.
+
+    Requests are JSON lines with a ``session`` name and a ``type``:
+    ``{"session": "a", "type": "attach", "pid": 123}`` looks up the console
+    window of a terminal process, ``{"session": "a", "type": "resize",
+    "columns": 80, "rows": 24}`` resizes it and ``{"session": "a", "type":
+    "detach"}`` forgets it. Each request is answered with a JSON line with the
+    same ``session`` and ``type`` and either a ``result`` or an ``error``.
+    Empty lines check that the terminal processes are still running, like the
+    stdin watchdog of the single-terminal mode.
+
+    Window lookups run on `pool` so a slow lookup does not hold up others.
+    Resizes run on the serving thread, one console at a time, since a process
+    can only be attached to one console. Resizes of a session received in a
+    burst, see `resizer_reader`, are coalesced to the newest; one requested
+    before the window is found is applied once it is.
+    """
+
+    def __init__(
+        self,
+        *,
+        find: Callable[[int], tuple[Process, Window]],
+        attach: Callable[[int], AbstractContextManager[Any]],
+        make_resizer: Callable[[Any, Window], _ConsoleResizer],
+        send: Callable[[Mapping[str, Any]], None],
+        pool: Executor,
+        errors: tuple[type[BaseException], ...] = (),
+        clock: Callable[[], float] = monotonic,
+    ) -> None:
+        """Create a service.
+
+        `find` looks up the process and window of a terminal PID, `attach`
+        attaches to the console of a PID and yields its handle, `make_resizer`
+        creates the resizer of a session, `send` writes a reply, `errors`
+        are backend errors reported to the client instead of raised and
+        `clock` is the time source of the resize delays.
+        """
+        self._find = find
+        self._attach = attach
+        self._make_resizer = make_resizer
+        self._send = send
+        self._pool = pool
+        self._errors = (LookupError, OSError, ValueError, *errors)
+        self._clock = clock
+        self._sessions = dict[str, _Session]()
+
+    def _reply(
+        self,
+        session: str,
+        kind: str,
+        result: object = None,
+        exception: BaseException | None = None,
+    ) -> None:
+        """Send the reply to a `kind` request of `session`."""
+        reply: dict[str, Any] = {"session": session, "type": kind}
+        if exception is None:
+            reply["result"] = result
+        else:
+            reply["error"] = f"{type(exception).__name__}: {exception}"
+        self._send(reply)
+
+    def _request(self, line: str, lines: SimpleQueue[object]) -> None:
+        """Handle the request `line`; lookup results are put into `lines`."""
+        session, kind = "", ""
+        try:
+            request = loads(line)
+            session, kind = str(request["session"]), str(request["type"])
+            if kind == "attach":
+                pid = int(request["pid"])
+                self._sessions[session] = _Session(pid)
+
+                def lookup() -> None:
+                    """Find the window of `pid` and report the result."""
+                    try:
+                        found = self._find(pid)
+                    except self._errors as exc:
+                        lines.put(_Lookup(session, None, exc))
+                    else:
+                        lines.put(_Lookup(session, found, None))
+
+                self._pool.submit(lookup)
+            elif kind == "resize":
+                state = self._sessions[session]
+                if state.pending is not None:
+                    state.skipped += 1
+                state.pending = (int(request["columns"]), int(request["rows"]))
+            elif kind == "detach":
+                del self._sessions[session]
+                self._reply(session, kind)
+            else:
+                raise ValueError(f"unknown request type: {kind}")
+        except (KeyError, TypeError, ValueError) as exc:
+            self._reply(session, kind, exception=exc)
+
+    def _found(self, lookup: _Lookup) -> None:
+        """Record the result of a window lookup and answer the attach request."""
+        state = self._sessions.get(lookup.session)
+        if state is None:
+            return
+        if lookup.found is None:
+            del self._sessions[lookup.session]
+            self._reply(lookup.session, "attach", exception=lookup.exception)
+            return
+        state.process, state.window = lookup.found
+        self._reply(lookup.session, "attach", {"pid": state.process.pid})
+
+    def _resize(self, session: str, state: _Session) -> None:
+        """Apply the pending size of the found `session`."""
+        assert state.process is not None and state.window is not None
+        assert state.pending is not None
+        (columns, rows), state.pending = state.pending, None
+        skipped, state.skipped = state.skipped, 0
+        try:
+            with self._attach(state.process.pid) as console:
+                if state.resizer is None:
+                    state.resizer = self._make_resizer(console, state.window)
+                else:
+                    state.resizer.console = console
+                passes = state.resizer.resize(columns, rows)
+        except self._errors as exc:
+            self._reply(session, "resize", exception=exc)
+            return
+        self._reply(session, "resize", {"passes": passes, "skipped": skipped})
+
+    def _check_processes(self) -> None:
+        """Forget sessions whose terminal process is no longer running."""
+        for session, state in tuple(self._sessions.items()):
+            if state.process is not None and not state.process.is_running():
+                del self._sessions[session]
+                self._reply(session, "detach")
+
+    def serve(self, lines: SimpleQueue[object]) -> None:
+        """Serve request lines from `lines`, as filled by `_read_lines`.
+
+        Returns at the end of input, after applying the pending resizes.
+        """
+        done = False
+        while not done:
+            items = [lines.get()]
+            deadline = self._clock() + _RESIZE_MAX_DELAY
+            while (remaining := deadline - self._clock()) > 0:
+                try:
+                    items.append(lines.get(timeout=min(_RESIZE_DEBOUNCE, remaining)))
+                except Empty:
+                    break
+            for item in items:
+                if item is None:
+                    done = True
+                elif isinstance(item, _Lookup):
+                    self._found(item)
+                elif not item:
+                    self._check_processes()
+                else:
+                    self._request(str(item), lines)
+            for session, state in tuple(self._sessions.items()):
+                if state.window is not None and state.pending is not None:
+                    self._resize(session, state)
+
 
 def main() -> None:
     """Not implemented on non-Windows platforms."""
@@ -65,31 +501,114 @@ if sys.platform == "win32":
     from win32gui import SetWindowPos
     from win32process import GetWindowThreadProcessId
 
+    @contextmanager
+    def _attach_console(
+        pid: int,
+    ) -> Generator[PyConsoleScreenBufferType, None, None]:
+        """Temporarily attach to `pid`'s console and yield its console handle."""
+        try:
+            AttachConsole(pid)
+            yield PyConsoleScreenBufferType(
+                CreateFile(
+                    "CONOUT$",
+                    GENERIC_READ | GENERIC_WRITE,
+                    FILE_SHARE_WRITE,
+                    None,
+                    OPEN_EXISTING,
+                    0,
+                    None,
+                )  # GetStdHandle gives the piped handle instead of the console handle
+            )
+        finally:
+            FreeConsole()
+
+    def _console_ctrl_handler(event: int):
+        """Console control handler that ignores CTRL events."""
+        return event in (
+            CTRL_C_EVENT,
+            CTRL_BREAK_EVENT,
+            CTRL_CLOSE_EVENT,
+        )
+
+    def _console_resizer(
+        console: PyConsoleScreenBufferType, window: Window
+    ) -> _ConsoleResizer:
+        """Hide `window` and create the resizer of `console` shown in it."""
+        window.hide(True)
+        return _ConsoleResizer(
+            console,
+            window,
+            set_window_pos=lambda handle, width, height: SetWindowPos(
+                handle,
+                None,
+                0,
+                0,
+                width,
+                height,
+                SWP_NOACTIVATE | SWP_NOREDRAW | SWP_NOZORDER,
+            ),
+            rect=PySMALL_RECTType,
+            coord=PyCOORDType,
+            errors=(error,),
+        )
+
     def main() -> None:
         """Find the console window for a PID and resize it on demand.
 
         Prompts for a PID on stdin, looks up the process's window and runs the
-        resizer loop to apply sizes received on stdin.
+        resizer loop to apply sizes received on stdin. With ``--service``, it
+        instead serves requests of many terminals, see `_ResizerService`.
         """
+        if sys.argv[1:] == ["--service"]:
+            service()
+            return
         pid = int(input("PID: "))
         print(f"received: {pid}")
-        proc = Process(pid)
-        procs = {}
-        windows = ()
-        for tries in range(_LOOKUP_RETRIES):
-            procs = {
-                proc.pid: proc for proc in chain((proc,), proc.children(recursive=True))
-            }
-            print(f"process(es) (try {tries + 1}): {procs}")
-            windows = getAllWindows()
-            print(f"window(s) (try {tries + 1}): {windows}")
-            for win in windows:
-                win_pid = win_to_pid(win)
-                if win_pid in procs:
-                    resizer(procs[win_pid], win)
-                    return
-            sleep(_LOOKUP_RETRY_INTERVAL)
-        raise LookupError(procs, windows)
+        resizer(*find_window(Process(pid), getAllWindows, win_to_pid))
+
+    def service() -> None:
+        """Serve resize requests of many terminals on stdin until its end.
+
+        Replies are the only output on stdout; diagnostics go to stderr. At
+        the end of input, queued window lookups are cancelled and running
+        ones stop before their next attempt, so exiting does not wait for
+        them to time out.
+        """
+        replies = sys.stdout
+        stopped = Event()
+
+        def send(reply: Mapping[str, Any]) -> None:
+            """Write `reply` as a JSON line."""
+            replies.write(f"{dumps(reply)}\n")
+            replies.flush()
+
+        def pause(interval: float) -> None:
+            """Wait `interval` seconds between lookup attempts unless stopped."""
+            if stopped.wait(interval):
+                raise LookupError("service stopped")
+
+        FreeConsole()
+        SetConsoleCtrlHandler(_console_ctrl_handler, True)
+        lines: SimpleQueue[object] = SimpleQueue()
+        Thread(target=_read_lines, args=(lines, ""), daemon=True).start()
+        with (
+            redirect_stdout(sys.stderr),
+            ThreadPoolExecutor(thread_name_prefix="lookup") as pool,
+        ):
+            try:
+                _ResizerService(
+                    find=lambda pid: find_window(
+                        Process(pid), getAllWindows, win_to_pid, sleep=pause
+                    ),
+                    attach=_attach_console,
+                    make_resizer=_console_resizer,
+                    send=send,
+                    pool=pool,
+                    errors=(error,),
+                ).serve(lines)
+            finally:
+                stopped.set()
+                pool.shutdown(cancel_futures=True)
 
     def win_to_pid(window: Window):
         """Return the process id that owns `window`."""
@@ -100,30 +619,18 @@ if sys.platform == "win32":
     def resizer(process: Process, window: Window):
         """Drive the resizer coroutine for `process`/`window`.
 
-        Reads sizes from `resizer_reader` and sends them to the writer
+        Reads sizes from stdin on a thread, coalesces them with
+        `resizer_reader` and sends them to the writer
         coroutine returned by `resizer_writer`.
         """
         print(f"window: {window}")
         writer = resizer_writer(process, window)
         next(writer)
-        for size in resizer_reader(process):
+        lines: SimpleQueue[str | None] = SimpleQueue()
+        Thread(target=_read_lines, args=(lines, "size: "), daemon=True).start()
+        for size in resizer_reader(process, lines):
             writer.send(size)
 
-    def resizer_reader(process: Process):
-        """Read size strings from stdin and yield (rows, columns) tuples.
-
-        The reader waits for non-empty input lines of the form "<rows>x<cols>".
-        """
-        while True:
-            size0 = ""
-            while not size0:  # stdin watchdog triggers this loop
-                if not process.is_running():
-                    return
-                size0 = input("size: ")
-            rows, columns = (int(s.strip()) for s in size0.split("x", 2))
-            print(f"received: {rows}x{columns}")
-            yield rows, columns
-
     def resizer_writer(
         process: Process, window: Window
     ) -> Generator[None, tuple[int, int], None]:
@@ -132,109 +639,14 @@ if sys.platform == "win32":
         Yields control to the caller to receive new sizes and applies a set
         of setters to resize the native window / console buffer.
         """
-        window.hide(True)
-
-        def ignore_error(func: Callable[[], None]):
-            """Call `func()` and silently ignore pywin32 errors."""
-            try:
-                func()
-            except error:
-                pass
-
-        @contextmanager
-        def attach_console(pid: int):
-            """Temporarily attach to `pid`'s console and yield its console handle."""
-            try:
-                AttachConsole(pid)
-                yield PyConsoleScreenBufferType(
-                    CreateFile(
-                        "CONOUT$",
-                        GENERIC_READ | GENERIC_WRITE,
-                        FILE_SHARE_WRITE,
-                        None,
-                        OPEN_EXISTING,
-                        0,
-                        None,
-                    )  # GetStdHandle gives the piped handle instead of the console handle
-                )
-            finally:
-                FreeConsole()
-
-        def console_ctrl_handler(event: int):
-            """Console control handler that ignores CTRL events."""
-            return event in (
-                CTRL_C_EVENT,
-                CTRL_BREAK_EVENT,
-                CTRL_CLOSE_EVENT,
-            )
-
         FreeConsole()
-        with attach_console(process.pid) as console:
-            SetConsoleCtrlHandler(console_ctrl_handler, True)
+        with _attach_console(process.pid) as console:
+            SetConsoleCtrlHandler(_console_ctrl_handler, True)
+            resizer = _console_resizer(console, window)
             while True:
                 columns, rows = yield
-                # iterate to resize accurately
-                for iter in range(_RESIZE_ITERATIONS):
-                    info = console.GetConsoleScreenBufferInfo()
-                    old_rect = window.getClientFrame()
-                    old_actual_rect = window.size
-                    old_cols = info["Window"].Right - info["Window"].Left + 1
-                    old_rows = info["Window"].Bottom - info["Window"].Top + 1
-                    old_width = old_rect.right - old_rect.left
-                    old_height = old_rect.bottom - old_rect.top
-                    size = (
-                        int(old_width * columns / old_cols)
-                        + old_actual_rect.width
-                        - old_width,
-                        int(old_height * rows / old_rows)
-                        + old_actual_rect.height
-                        - old_height,
-                    )
-                    print(f"pixel size (iteration {iter + 1}): {size}")
-                    handle = window.getHandle()
-                    assert isinstance(handle, int)  # `int` on Windows
-                    setters = [
-                        # almost accurate, works for alternate screen buffer
-                        lambda handle=handle, size=size: SetWindowPos(
-                            handle,
-                            None,
-                            0,
-                            0,
-                            size[0],
-                            size[1],
-                            SWP_NOACTIVATE | SWP_NOREDRAW | SWP_NOZORDER,
-                        ),
-                        # accurate, SetConsoleWindowInfo does not work for alternate screen buffer
-                        lambda console=console, columns=columns, old_rows=old_rows: (
-                            console.SetConsoleWindowInfo(
-                                True,
-                                PySMALL_RECTType(0, 0, columns - 1, old_rows - 1),
-                            )
-                        ),
-                        lambda console=console, columns=columns, old_rows=old_rows: (
-                            console.SetConsoleScreenBufferSize(
-                                PyCOORDType(columns, old_rows)
-                            )
-                        ),
-                        lambda console=console, columns=columns, rows=rows: (
-                            console.SetConsoleWindowInfo(
-                                True,
-                                PySMALL_RECTType(0, 0, columns - 1, rows - 1),
-                            )
-                        ),
-                        lambda console=console, columns=columns, rows=rows: (
-                            console.SetConsoleScreenBufferSize(
-                                PyCOORDType(columns, rows)
-                            )
-                        ),
-                    ]
-                    if old_cols < columns:
-                        setters[1], setters[2] = setters[2], setters[1]
-                    if old_rows < rows:
-                        setters[3], setters[4] = setters[4], setters[3]
-                    for setter in setters:
-                        ignore_error(setter)
-                print("resized")
+                passes = resizer.resize(columns, rows)
+                print(f"resized in {passes} pass(es)")
 
 
 if __name__ == "__main__":
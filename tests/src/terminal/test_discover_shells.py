@@ -0,0 +1,133 @@
+"""Tests for ``src/terminal/discover_shells.py``.
+
+These tests validate shell enumeration, time-to-prompt measurement in a
+throwaway pseudoterminal, and the on-disk measurement cache.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+from importlib.util import module_from_spec, spec_from_file_location
+from pathlib import Path
+from types import ModuleType
+from typing import Any
+
+import pytest
+
+"""Public API of this test module (empty)."""
+__all__ = ()
+
+
+def _load_module() -> ModuleType:
+    """Load the target module from source for isolated monkeypatching."""
+    path = Path(__file__).parents[3] / "src/terminal/discover_shells.py"
+    spec = spec_from_file_location("tests_discover_shells_module", path)
+    if spec is None or spec.loader is None:
+        raise AssertionError(path)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _script(path: Path, body: str) -> str:
+    """Write an executable shell script with `body` to `path`."""
+    path.write_text(f"#!/bin/sh\n{body}\n")
+    path.chmod(0o755)
+    return str(path)
+
+
+def test_shells_reads_etc_shells_and_path(tmp_path: Path) -> None:
+    """`shells` should skip comments and multiplexers, then search PATH."""
+    module = _load_module()
+    etc_shells = tmp_path / "shells"
+    etc_shells.write_text("# comment\n/bin/sh\n\n/usr/bin/tmux\n/opt/fish # x\n")
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    _script(bin_dir / "zsh", "exit")
+
+    found = list(module.shells(str(etc_shells), {"PATH": str(bin_dir)}))
+
+    assert found == ["/bin/sh", "/opt/fish", str(bin_dir / "zsh")]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX terminals only")
+def test_discover_measures_prompt_and_flags_slow_shells(tmp_path: Path) -> None:
+    """Slow, broken and missing shells should each be reported as such."""
+    module = _load_module()
+    fast = _script(tmp_path / "fast", "exec /bin/sh")
+    slow = _script(tmp_path / "slow", "sleep 0.3\nexec /bin/sh")
+    broken = _script(tmp_path / "broken", "exit 3")
+    link = tmp_path / "link"
+    link.symlink_to(fast)
+    missing = str(tmp_path / "missing")
+
+    report = module.discover(
+        (fast, str(link), slow, broken, missing, fast),
+        home=str(tmp_path),
+        slow_threshold=200.0,
+        timeout=5.0,
+    )
+
+    entries = {entry["path"]: entry for entry in report["shells"]}
+    assert list(entries) == [fast, str(link), slow, broken, missing]
+    assert entries[fast]["available"]
+    assert not entries[fast]["slow"]
+    assert entries[str(link)]["prompt_ms"] == entries[fast]["prompt_ms"]
+    assert entries[slow]["prompt_ms"] >= 300
+    assert entries[slow]["slow"]
+    assert entries[broken]["error"] == "exited with 3"
+    assert entries[missing] == {"path": missing, "available": False}
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX terminals only")
+def test_measure_gives_the_shell_a_controlling_terminal(tmp_path: Path) -> None:
+    """Shells should own the PTY as their controlling terminal, like in use."""
+    module = _load_module()
+    shell = _script(tmp_path / "shell", ": </dev/tty || exit 4\nexec /bin/sh")
+
+    assert "prompt_ms" in module.measure(shell, 5.0)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX terminals only")
+def test_measure_times_out_when_no_prompt(tmp_path: Path) -> None:
+    """A shell that never reads its input should time out."""
+    module = _load_module()
+    stuck = _script(tmp_path / "stuck", "exec sleep 30")
+
+    assert module.measure(stuck, 0.2) == {"error": "no prompt within 0.2 s"}
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX terminals only")
+def test_discover_caches_until_rc_file_changes(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    """Cached measurements should be invalidated by rc-file changes."""
+    module = _load_module()
+    bash = _script(tmp_path / "bash", "exec /bin/sh")
+    rc_file = tmp_path / ".bashrc"
+    measured = list[str]()
+
+    def measure(path: str, _timeout: float) -> dict[str, Any]:
+        """Record the measurement of `path` and return a fixed time."""
+        measured.append(path)
+        return {"prompt_ms": 1.0}
+
+    monkeypatch.setattr(module, "measure", measure)
+    cache = str(tmp_path / "cache")
+
+    def discover() -> dict[str, Any]:
+        """Run discovery of the fake bash with the cache."""
+        return module.discover((bash,), cache_dir=cache, home=str(tmp_path))
+
+    first = discover()
+    assert discover() == first
+    assert measured == [bash]
+
+    rc_file.write_text("sleep 1\n")
+    discover()
+    assert measured == [bash, bash]
+    stat = rc_file.stat()
+    os.utime(rc_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    discover()
+    assert measured == [bash, bash, bash]
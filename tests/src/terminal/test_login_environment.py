@@ -0,0 +1,121 @@
+"""Tests for ``src/terminal/login_environment.py``.
+
+These tests validate capturing a login shell's environment in a throwaway
+pseudoterminal and caching it until startup files change.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import stat
+import sys
+from importlib.util import module_from_spec, spec_from_file_location
+from pathlib import Path
+from types import ModuleType
+
+import pytest
+
+"""Public API of this test module (empty)."""
+__all__ = ()
+
+
+def _load_module() -> ModuleType:
+    """Load the target module from source for isolated monkeypatching."""
+    path = Path(__file__).parents[3] / "src/terminal/login_environment.py"
+    spec = spec_from_file_location("tests_login_environment_module", path)
+    if spec is None or spec.loader is None:
+        raise AssertionError(path)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _shell(path: Path, body: str) -> str:
+    """Write a fake login shell running `body` before its ``-c`` command."""
+    path.write_text(f'#!/bin/sh\n{body}\nexec /bin/sh -c "$4"\n')
+    path.chmod(0o755)
+    return str(path)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX terminals only")
+def test_capture_dumps_login_environment_from_a_terminal(tmp_path: Path) -> None:
+    """`capture` should return the shell's variables without volatile ones."""
+    module = _load_module()
+    shell = _shell(
+        tmp_path / "shell",
+        'export LOGIN_FLAGS="$1 $2" MULTI="a\nb"\n[ -t 0 ] && export ON_TTY=1',
+    )
+
+    environment = module.capture(shell, 5.0)
+
+    assert environment["LOGIN_FLAGS"] == "-l -i"
+    assert environment["MULTI"] == "a\nb"
+    assert environment["ON_TTY"] == "1"
+    assert "SHLVL" not in environment
+    assert "PWD" not in environment
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX terminals only")
+def test_capture_ends_when_the_shell_exits_despite_daemons(tmp_path: Path) -> None:
+    """A daemon keeping the terminal open should not delay the capture."""
+    module = _load_module()
+    shell = _shell(tmp_path / "shell", "sleep 30 &\nexport AGENT_STARTED=1")
+
+    environment = module.capture(shell, 3.0)
+
+    assert environment["AGENT_STARTED"] == "1"
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX terminals only")
+def test_capture_keeps_only_login_variables(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    """Caller, session and unchanged base variables should not be captured."""
+    module = _load_module()
+    monkeypatch.setenv("CALLER_ONLY", "1")
+    monkeypatch.setenv("DISPLAY", ":1")
+    monkeypatch.setenv("HOME", str(tmp_path))
+    shell = _shell(
+        tmp_path / "shell",
+        'echo "caller=${CALLER_ONLY-unset}" > "$HOME/seen"\n'
+        "export SSH_AUTH_SOCK=/tmp/agent EDITOR=vi",
+    )
+
+    environment = module.capture(shell, 5.0)
+
+    assert (tmp_path / "seen").read_text() == "caller=unset\n"
+    assert environment["EDITOR"] == "vi"
+    for name in ("CALLER_ONLY", "DISPLAY", "HOME", "SSH_AUTH_SOCK"):
+        assert name not in environment
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX terminals only")
+def test_capture_reports_hanging_and_failing_shells(tmp_path: Path) -> None:
+    """`capture` should time out on hanging shells and fail on broken ones."""
+    module = _load_module()
+
+    with pytest.raises(TimeoutError):
+        module.capture(_shell(tmp_path / "hang", "sleep 30"), 0.2)
+    with pytest.raises(RuntimeError, match="without dumping"):
+        module.capture(_shell(tmp_path / "fail", "exit 1"), 5.0)
+
+
+def test_cache_is_private_and_invalidated_by_startup_files(tmp_path: Path) -> None:
+    """Stored environments should be reused until a startup file changes."""
+    module = _load_module()
+    shell = str(tmp_path / "shell")
+    Path(shell).touch()
+    cache_file = str(tmp_path / "cache" / "environment.json")
+    home = str(tmp_path)
+
+    module.store(cache_file, shell, home, {"PATH": "/login/bin"})
+
+    assert stat.S_IMODE(os.stat(cache_file).st_mode) == 0o600
+    assert module.load(cache_file, shell, home) == {"PATH": "/login/bin"}
+    assert module.load(cache_file, "/bin/other", home) is None
+    (tmp_path / ".profile").write_text("export PATH=/changed\n")
+    assert module.load(cache_file, shell, home) is None
+
+    Path(cache_file).write_text(json.dumps({"environment": {"A": 1}}))
+    assert module.load(cache_file, shell, home) is None
@@ -0,0 +1,250 @@
+"""Tests for ``src/terminal/tmux_control.py``.
+
+These tests validate parsing of tmux control-mode replies and notifications,
+and attaching to, detaching from and reattaching to a real tmux session.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from glob import glob
+from importlib.util import module_from_spec, spec_from_file_location
+from io import BytesIO
+from pathlib import Path
+from selectors import EVENT_READ, DefaultSelector
+from types import ModuleType
+from typing import IO
+
+import pytest
+
+"""Public API of this test module (empty)."""
+__all__ = ()
+
+"""Path of the module under test."""
+_MODULE_PATH = Path(__file__).parents[3] / "src/terminal/tmux_control.py"
+
+"""Script running ``argv[2:]`` with the FD ``argv[1]`` as its command FD 3."""
+_REDIRECT_CMDIO = (
+    "import os, sys; os.dup2(int(sys.argv[1]), 3); "
+    "os.execv(sys.executable, (sys.executable, *sys.argv[2:]))"
+)
+
+
+"""Script constructing a client of the module at ``argv[1]`` and feeding it."""
+_CONSTRUCT_CLIENT = """\
+import io, sys
+from importlib.util import module_from_spec, spec_from_file_location
+spec = spec_from_file_location("tmux_control", sys.argv[1])
+module = module_from_spec(spec)
+spec.loader.exec_module(module)
+client = module._ControlClient(io.BytesIO(), print, lambda type, event: None)
+client.feed(b"%begin 1 1 0")
+client.feed(b"%end 1 1 0")
+client.feed(b"%session-changed $0 notes")
+print(client.session)
+"""
+
+
+def _python39() -> str | None:
+    """Return an installed Python 3.9, the oldest supported, if it runs."""
+    pyenv_root = os.environ.get("PYENV_ROOT") or os.path.expanduser("~/.pyenv")
+    for candidate in (
+        shutil.which("python3.9"),
+        *sorted(glob(os.path.join(pyenv_root, "versions", "3.9*", "bin", "python"))),
+    ):
+        if (
+            candidate is not None
+            and subprocess.run(
+                (candidate, "-c", ""), capture_output=True, check=False
+            ).returncode
+            == 0
+        ):
+            return candidate
+    return None
+
+
+def _load_module() -> ModuleType:
+    """Load the target module from source for isolated monkeypatching."""
+    spec = spec_from_file_location("tests_tmux_control_module", _MODULE_PATH)
+    if spec is None or spec.loader is None:
+        raise AssertionError(_MODULE_PATH)
+    module = module_from_spec(spec)
+    with open(os.devnull, "rb") as stdin_file, open(os.devnull, "wb") as stdout_file:
+        old_stdin = sys.stdin
+        old_stdout = sys.stdout
+        try:
+            sys.stdin = stdin_file
+            sys.stdout = stdout_file
+            spec.loader.exec_module(module)
+        finally:
+            sys.stdin = old_stdin
+            sys.stdout = old_stdout
+    return module
+
+
+def test_control_client_redraws_panes_and_forwards_their_output() -> None:
+    """Replies should reach their callbacks; only active pane output is sent."""
+    module = _load_module()
+    commands = BytesIO()
+    output = list[bytes]()
+    events = list[tuple[str, object]]()
+    client = module._ControlClient(
+        commands, output.append, lambda type, event: events.append((type, event))
+    )
+
+    for line in (
+        b"%begin 1 259 0",
+        b"%end 1 259 0",
+        b"%window-add @0",
+        b"%session-changed $0 notes",
+        b"%output %0 already\\015\\012captured",
+        b"%begin 1 265 1",
+        b"%0 2 1 0",
+        b"%end 1 265 1",
+        b"%begin 1 266 1",
+        b"\x1b[1mtop\x1b[0m",
+        b"%end 1 2 1",
+        b"$ ",
+        b"",
+        b"%end 1 266 1",
+        b"%output %1 other pane",
+        b"%output %0 new \\134 output\\033[0m",
+        b"%exit",
+    ):
+        client.feed(line)
+    client.send_keys(b"ls\r")
+    client.resize(100, 30)
+
+    assert events == [
+        ("tmux.session", {"session": "notes"}),
+        ("tmux.pane", {"pane": "%0"}),
+    ]
+    assert output == [
+        (
+            b"\x1b[?1049l\x1b[H\x1b[2J\x1b[1mtop\x1b[0m\r\n%end 1 2 1\r\n$ "
+            b"\x1b[0m\x1b[2;3H"
+        ),
+        b"new \\ output\x1b[0m",
+    ]
+    assert client.exited
+    assert commands.getvalue().decode().splitlines() == [
+        module._REFRESH_COMMAND,
+        "send-keys -H -t %0 6c 73 0d",
+        "refresh-client -C 100x30",
+    ]
+
+
+@pytest.mark.skipif(_python39() is None, reason="needs Python 3.9")
+def test_control_client_constructs_on_the_oldest_supported_python() -> None:
+    """The client should not evaluate annotations unsupported by Python 3.9."""
+    python = _python39()
+    assert python is not None
+
+    process = subprocess.run(
+        (python, "-c", _CONSTRUCT_CLIENT, str(_MODULE_PATH)),
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        check=False,
+    )
+
+    assert process.returncode == 0, process.stderr.decode()
+    assert process.stdout.decode().splitlines() == ["notes"]
+
+
+def _read_until(stream: IO[bytes], marker: bytes, timeout: float = 10.0) -> bytes:
+    """Read `stream` until `marker` has been received and return the data."""
+    data = b""
+    deadline = time.monotonic() + timeout
+    with DefaultSelector() as selector:
+        selector.register(stream, EVENT_READ)
+        while marker not in data:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not selector.select(remaining):
+                raise AssertionError(data)
+            chunk = os.read(stream.fileno(), 4096)
+            if not chunk:
+                raise AssertionError(data)
+            data += chunk
+    return data
+
+
+def _start(socket_path: Path) -> tuple[subprocess.Popen[bytes], socket.socket]:
+    """Start the helper on a fresh session and return it with its command FD."""
+    cmdio, child = socket.socketpair()
+    process = subprocess.Popen(
+        (
+            sys.executable,
+            "-c",
+            _REDIRECT_CMDIO,
+            str(child.fileno()),
+            str(_MODULE_PATH),
+            "--socket",
+            str(socket_path),
+            "--session",
+            "notes",
+            "--",
+            "sh",
+        ),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        pass_fds=(child.fileno(),),
+    )
+    child.close()
+    cmdio.sendall(b"100x30\n")
+    return process, cmdio
+
+
+@pytest.mark.skipif(
+    sys.platform == "win32" or shutil.which("tmux") is None, reason="needs tmux"
+)
+def test_sessions_survive_the_helper_and_are_redrawn_on_reattach(
+    tmp_path: Path,
+) -> None:
+    """Detached sessions should keep running and be redrawn from a capture."""
+    socket_path = tmp_path / "tmux.sock"
+    try:
+        process, cmdio = _start(socket_path)
+        assert process.stdin is not None and process.stdout is not None
+        with cmdio, cmdio.makefile("rb") as replies:
+            assert b'"pane":"%0"' in _read_until(replies, b"tmux.pane")
+            process.stdin.write(b"echo hi-$((1 + 1))\n")
+            process.stdin.flush()
+            _read_until(process.stdout, b"hi-2")
+            cmdio.sendall(b'{"id": 1, "type": "panes"}\n')
+            reply = json.loads(_read_until(replies, b'"id":1').splitlines()[-1])
+            assert reply == {
+                "id": 1,
+                "type": "panes",
+                "result": [{"pane": "%0", "active": True, "columns": 100, "rows": 30}],
+            }
+            process.stdin.close()
+            assert process.wait(10) == 0
+            process.stdout.close()
+
+        alive = subprocess.run(
+            ("tmux", "-S", str(socket_path), "has-session", "-t", "notes"),
+            check=False,
+        )
+        assert alive.returncode == 0
+
+        process, cmdio = _start(socket_path)
+        assert process.stdin is not None and process.stdout is not None
+        with cmdio:
+            redrawn = _read_until(process.stdout, b"hi-2")
+            assert b"\x1b[H\x1b[2J" in redrawn
+            assert b"echo hi-$((1 + 1))" in redrawn
+            process.stdin.close()
+            assert process.wait(10) == 0
+            process.stdout.close()
+    finally:
+        subprocess.run(
+            ("tmux", "-S", str(socket_path), "kill-server"),
+            check=False,
+            capture_output=True,
+        )
@@ -1,17 +1,29 @@
 """Regression tests for the Unix PTY proxy lifecycle.
 
 These tests validate host-disconnect behavior in
-``src/terminal/unix_pseudoterminal.py`` without spawning real PTYs.
+``src/terminal/unix_pseudoterminal.py`` without spawning real PTYs, along with
+the proxy's option parsing, control requests and optional features.
 """
 
 from __future__ import annotations
 
+import json
 import os
+import pstats
+import selectors
+import socket
+import stat
+import struct
+import subprocess
 import sys
+import time
+import tracemalloc
+import tty
 from collections.abc import Callable
 from importlib.util import module_from_spec, spec_from_file_location
 from pathlib import Path
 from types import ModuleType, SimpleNamespace
+from typing import Any
 
 import pytest
 from typing_extensions import Self
@@ -102,11 +114,11 @@ def test_main_stops_on_stdin_eof_and_terminates_child_group(
         """Raise `SystemExit` to let tests assert the exit code."""
         raise SystemExit(code)
 
-    def fake_read(fd: int, _chunk_size: int) -> bytes:
+    def fake_readv(fd: int, _buffers: object) -> int:
         """Return EOF for stdin and no PTY data for all other descriptors."""
         if fd == module._STDIN:
-            return b""
-        return b""
+            return 0
+        return 0
 
     def fake_killpg(_pgid: int, signal: int) -> None:
         """Record each signal used to terminate the child process group."""
@@ -118,13 +130,13 @@ def test_main_stops_on_stdin_eof_and_terminates_child_group(
     monkeypatch.setattr(module, "getpgid", lambda _pid: 1234, raising=False)
     monkeypatch.setattr(module, "getppid", lambda: 4242, raising=False)
     monkeypatch.setattr(module, "killpg", fake_killpg, raising=False)
-    monkeypatch.setattr(module, "read", fake_read)
+    monkeypatch.setattr(module, "readv", fake_readv)
     monkeypatch.setattr(module, "sleep", lambda _seconds: None, raising=False)
     monkeypatch.setattr(module, "waitpid", lambda pid, _flags: (pid, 0))
     monkeypatch.setattr(module, "waitstatus_to_exitcode", lambda status: status)
 
     with pytest.raises(SystemExit) as raised:
-        module.main()
+        module.main(["unix_pseudoterminal", "sh"])
 
     assert raised.value.code == 0
     assert signal_calls
@@ -142,11 +154,11 @@ def test_main_does_not_terminate_group_when_pty_exits_first(
         """Raise `SystemExit` to let tests assert the exit code."""
         raise SystemExit(code)
 
-    def fake_read(fd: int, _chunk_size: int) -> bytes:
+    def fake_readv(fd: int, _buffers: object) -> int:
         """Return PTY EOF and no stdin payload."""
         if fd == 77:
-            return b""
-        return b""
+            return 0
+        return 0
 
     def fake_killpg(_pgid: int, signal: int) -> None:
         """Record each signal if the proxy attempts group termination."""
@@ -158,13 +170,808 @@ def test_main_does_not_terminate_group_when_pty_exits_first(
     monkeypatch.setattr(module, "getpgid", lambda _pid: 55, raising=False)
     monkeypatch.setattr(module, "getppid", lambda: 4242, raising=False)
     monkeypatch.setattr(module, "killpg", fake_killpg, raising=False)
-    monkeypatch.setattr(module, "read", fake_read)
+    monkeypatch.setattr(module, "readv", fake_readv)
     monkeypatch.setattr(module, "sleep", lambda _seconds: None, raising=False)
     monkeypatch.setattr(module, "waitpid", lambda pid, _flags: (pid, 0))
     monkeypatch.setattr(module, "waitstatus_to_exitcode", lambda status: status)
 
     with pytest.raises(SystemExit) as raised:
-        module.main()
+        module.main(["unix_pseudoterminal", "sh"])
 
     assert raised.value.code == 0
     assert signal_calls == []
+
+
+def test_parse_arguments_splits_options_from_command() -> None:
+    """Options before the command are parsed; the command keeps its own flags."""
+    module = _load_unix_pseudoterminal_module()
+
+    options = module._parse_arguments(
+        ["--scrollback-index", "/tmp/lines", "--", "bash", "-l", "--norc"]
+    )
+
+    assert options.scrollback_index == "/tmp/lines"
+    assert options.command == ["bash", "-l", "--norc"]
+    assert module._parse_arguments(["sh"]).scrollback_index is None
+    assert module._parse_arguments(["sh"]).session_id == str(os.getpid())
+    with pytest.raises(SystemExit):
+        module._parse_arguments([])
+
+
+def test_process_cmdio_answers_json_requests(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """JSON control lines are dispatched by type and answered on the command FD."""
+    module = _load_unix_pseudoterminal_module()
+    chunks = [
+        b'{"id": 1, "type": "echo", "value": 4',
+        b'2}\n{"id": 2, "type": "missing"}\n{broken\n',
+    ]
+    written: list[tuple[int, bytes]] = []
+
+    def fake_write(fd: int, data: bytes) -> int:
+        """Record writes and report them as complete."""
+        written.append((fd, bytes(data)))
+        return len(data)
+
+    monkeypatch.setattr(module, "read", lambda _fd, _size: chunks.pop(0))
+    monkeypatch.setattr(module, "write", fake_write)
+    cmdio = module._ProcessCmdIO(
+        _FakeSelector(module._CMDIO), 99, {"echo": lambda request: request["value"]}
+    )
+
+    cmdio._on_read()
+    assert written == []
+    cmdio._on_read()
+
+    assert {fd for fd, _ in written} == {module._CMDIO}
+    replies = [
+        json.loads(line) for line in b"".join(d for _, d in written).splitlines()
+    ]
+    assert replies[0] == {"id": 1, "type": "echo", "result": 42}
+    assert replies[1]["id"] == 2
+    assert "unsupported request type" in replies[1]["error"]
+    assert replies[2]["id"] is None
+    assert replies[2]["error"].startswith("JSONDecodeError")
+
+
+def test_scrollback_index_searches_stripped_lines_newest_first(
+    tmp_path: Path,
+) -> None:
+    """Indexed lines are ANSI-stripped, stored on disk and searched by word."""
+    module = _load_unix_pseudoterminal_module()
+    store = tmp_path / "session.lines"
+
+    with module._ScrollbackIndex(str(store)) as index:
+        index.feed(b"\x1b[31mBuild ERROR\x1b[0m: missing foo\r\n")
+        index.feed(b"progress 10%\rprogress 100%\r\nbuild ok\nlate ")
+        index.feed(b"error in bar\n\x1b]0;title\x07error again")
+        assert index.flush(5)
+
+        assert index.line_count == 4
+        assert index.search("error") == [
+            (3, "late error in bar"),
+            (0, "Build ERROR: missing foo"),
+        ]
+        assert index.search("ERROR", limit=1) == [(3, "late error in bar")]
+        assert index.search("build error") == [(0, "Build ERROR: missing foo")]
+        assert index.search("progress") == [(1, "progress 100%")]
+        assert index.search("absent") == []
+        assert index.search("!!") == []
+
+    assert store.read_text(encoding="utf-8").splitlines() == [
+        "Build ERROR: missing foo",
+        "progress 100%",
+        "build ok",
+        "late error in bar",
+        "error again",
+    ]
+
+
+@pytest.mark.skipif(not Path("/proc/self/task").is_dir(), reason="requires /proc")
+def test_procfs_process_tree_counts_descendants() -> None:
+    """The `/proc` sampler follows children links and drops exited processes."""
+    module = _load_unix_pseudoterminal_module()
+    if not module._ProcfsProcessTree.available(os.getpid()):
+        pytest.skip("/proc does not expose children links")
+    tree = module._ProcfsProcessTree(os.getpid())
+    with subprocess.Popen(["sleep", "30"]) as child:
+        try:
+            processes, cpu_seconds, rss = tree.sample()
+            assert processes >= 2
+            assert child.pid in tree._stat_files
+            assert cpu_seconds > 0
+            assert rss > 0
+        finally:
+            child.kill()
+    tree.sample()
+    assert child.pid not in tree._stat_files
+    tree.close()
+
+
+def test_resource_monitor_reports_cpu_percent_and_peaks(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Samples derive CPU usage from consecutive totals and keep peaks."""
+    module = _load_unix_pseudoterminal_module()
+    samples = iter([(3, 1.0, 300), (2, 1.5, 100)])
+    clock = iter([10.0, 11.0])
+    monkeypatch.setattr(module, "monotonic", lambda: next(clock))
+    monitor = module._ResourceMonitor(SimpleNamespace(sample=lambda: next(samples)), 60)
+
+    first = monitor.sample()
+    second = monitor.sample()
+
+    assert first["cpu_percent"] == 0.0
+    assert second["cpu_percent"] == pytest.approx(50.0)
+    assert second["processes"] == 2
+    assert second["peak_processes"] == 3
+    assert second["peak_rss_bytes"] == 300
+    assert monitor.latest is second
+
+
+class _ScriptedHandler:
+    """A ready handler that records service order and returns a byte count."""
+
+    def __init__(self, name: str, priority: int, size: int, log: list[str]) -> None:
+        """Initialize a handler named `name` reporting `size` bytes per call."""
+        self.name = name
+        self.priority = priority
+        self.size = size
+        self.log = log
+
+    def __call__(self) -> int:
+        """Record the call and return the configured byte count."""
+        self.log.append(self.name)
+        return self.size
+
+
+def test_scheduler_services_input_before_flooding_output(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Input is forwarded first and PTY output yields after its byte budget."""
+    module = _load_unix_pseudoterminal_module()
+    monkeypatch.setattr(module, "_OUTPUT_SLICE_BYTES", 3000)
+    log: list[str] = []
+    pty = _ScriptedHandler("pty", 1, 1024, log)
+    stdin = _ScriptedHandler("stdin", 0, 1, log)
+    rounds = [[pty, stdin], [pty], [stdin, pty], [pty]]
+
+    class _Selector:
+        """Returns the scripted ready handlers, one round per call."""
+
+        def select(self, _timeout: float | None) -> list[tuple[object, int]]:
+            """Return the next scripted round of ready handlers."""
+            return [(SimpleNamespace(data=handler), 1) for handler in rounds.pop(0)]
+
+    metrics = module.Counter()
+    module._Scheduler(_Selector(), metrics).run_once(0.5)
+
+    assert log == ["stdin", "pty", "pty", "stdin", "pty"]
+    assert rounds == [[pty]]
+    assert metrics["output_bytes"] == 3072
+    assert metrics["input_preemptions"] == 1
+    assert metrics["output_slices_byte_limited"] == 1
+
+
+def test_write_all_partial_writes_do_not_copy_the_remainder(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Partial writes advance a view instead of copying what is left.
+
+    Slicing `bytes` after each 4 KiB write of a 1 MiB payload used to peak at
+    about twice the payload in copies; a view keeps the peak tiny.
+    """
+    module = _load_unix_pseudoterminal_module()
+    payload = bytes(range(256)) * 4096
+    received = bytearray(len(payload))
+    offset = 0
+
+    def fake_write(_fd: int, data: memoryview) -> int:
+        """Accept at most 4 KiB per call, like a full pipe would."""
+        nonlocal offset
+        size = min(len(data), 4096)
+        received[offset : offset + size] = data[:size]
+        offset += size
+        return size
+
+    monkeypatch.setattr(module, "write", fake_write)
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        module.write_all(1, payload)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert received == payload
+    assert peak < 64 * 1024
+
+
+def test_pipe_pty_forwards_from_a_reused_buffer(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """PTY reads land in one preallocated buffer that observers see as views."""
+    module = _load_unix_pseudoterminal_module()
+    chunks = [b"hello ", b"world", b""]
+    forwarded: list[bytes] = []
+    observed: list[bytes] = []
+    views: list[memoryview] = []
+
+    def fake_readv(_fd: int, buffers: tuple[bytearray, ...]) -> int:
+        """Copy the next scripted chunk into the caller's buffer."""
+        chunk = chunks.pop(0)
+        buffers[0][: len(chunk)] = chunk
+        return len(chunk)
+
+    def observe(data: memoryview) -> None:
+        """Record the view and a copy of its contents."""
+        views.append(data)
+        observed.append(bytes(data))
+
+    monkeypatch.setattr(module, "readv", fake_readv)
+    monkeypatch.setattr(
+        module, "write", lambda _fd, data: forwarded.append(bytes(data)) or len(data)
+    )
+    with module._PipePty(_FakeSelector(77), 77, (observe,)) as pipe_pty:
+        assert pipe_pty() == 6
+        assert pipe_pty() == 5
+        assert pipe_pty() == 0
+        assert not pipe_pty.registered
+
+    assert forwarded == observed == [b"hello ", b"world"]
+    assert views[0].obj is views[1].obj
+
+
+def test_profiler_saves_each_run_and_reports_it(tmp_path: Path) -> None:
+    """Stopped runs are saved as loadable pstats and tracemalloc files."""
+    module = _load_unix_pseudoterminal_module()
+    events: list[object] = []
+    was_tracing = tracemalloc.is_tracing()
+
+    with module._Profiler(str(tmp_path), "session", events.append) as profiler:
+        handle = module._profile_handler(profiler)
+        assert handle({"action": "start"}) == {"active": True, "files": []}
+        sum(range(1000))
+        stats_file, snapshot_file = profiler.toggle()
+        assert not profiler.active
+        assert profiler.stop() == ()
+        profiler.start()
+        with pytest.raises(ValueError, match="unsupported profile action"):
+            handle({"action": "pause"})
+
+    assert tracemalloc.is_tracing() == was_tracing
+    assert Path(stats_file).name.startswith("session-")
+    pstats.Stats(stats_file)
+    tracemalloc.Snapshot.load(snapshot_file)
+    assert events[0] == {"files": [stats_file, snapshot_file]}
+    assert len(events) == 2
+    assert len(list(tmp_path.iterdir())) == 4
+
+
+def test_profiler_reports_save_errors(tmp_path: Path) -> None:
+    """A run that cannot be saved is reported with an error."""
+    module = _load_unix_pseudoterminal_module()
+    events: list[dict[str, object]] = []
+
+    with module._Profiler(str(tmp_path / "missing"), "s", events.append) as profiler:
+        profiler.start()
+
+    assert str(events[0]["error"]).startswith("FileNotFoundError: ")
+
+
+def _viewer_frame(kind: bytes, payload: bytes) -> bytes:
+    """Encode one frame of the viewer protocol."""
+    return struct.pack(">cI", kind, len(payload)) + payload
+
+
+def test_viewer_hub_fans_out_output_and_negotiates_size(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    """Viewers share PTY output, may write, and shrink the PTY to fit."""
+    module = _load_unix_pseudoterminal_module()
+    resizes: list[bytes] = []
+    events: list[tuple[str, object]] = []
+    monkeypatch.setattr(module, "ioctl", lambda _fd, _op, size: resizes.append(size))
+    monkeypatch.setattr(module, "_send_event", lambda *event: events.append(event))
+    read_fd, write_fd = os.pipe()
+    path = str(tmp_path / "viewers")
+    sizes = module._WindowSizes(write_fd)
+    sizes.update("host", 120, 40)
+    with (
+        selectors.DefaultSelector() as selector,
+        module._ViewerHub(selector, path, write_fd, sizes, "all") as hub,
+        socket.socket(socket.AF_UNIX) as first,  # ty: ignore[possibly-missing-attribute]
+        socket.socket(socket.AF_UNIX) as second,  # ty: ignore[possibly-missing-attribute]
+    ):
+        first.connect(path)
+        second.connect(path)
+        hub()
+        assert len(hub.viewers) == 2
+        hub.broadcast(memoryview(b"shared output"))
+        for client in (first, second):
+            assert client.recv(64) == _viewer_frame(b"o", b"shared output")
+
+        first.sendall(_viewer_frame(b"r", b"200x30") + _viewer_frame(b"i", b"ls\n"))
+        hub.viewers[0]()
+        assert sizes.size == (120, 30)
+        assert resizes[-1] == struct.pack("HHHH", 30, 120, 0, 0)
+        assert os.read(read_fd, 64) == b"ls\n"
+        assert hub.status()["viewers"] == [
+            {"size": (200, 30), "backlog": 0},
+            {"size": None, "backlog": 0},
+        ]
+
+        first.close()
+        hub.viewers[0]()
+        assert len(hub.viewers) == 1
+        assert sizes.size == (120, 40)
+    os.close(read_fd)
+    os.close(write_fd)
+    assert not os.path.exists(path)
+    assert events[:2] == [
+        ("viewer.attached", {"viewers": 1}),
+        ("viewer.attached", {"viewers": 2}),
+    ]
+    assert ("viewer.detached", {"viewers": 1}) in events
+
+
+def test_viewer_hub_socket_is_private_to_its_owner(tmp_path: Path) -> None:
+    """The socket should only be accessible to its owner."""
+    module = _load_unix_pseudoterminal_module()
+    path = tmp_path / "viewers"
+    with (
+        selectors.DefaultSelector() as selector,
+        module._ViewerHub(selector, str(path), -1, module._WindowSizes(-1)),
+    ):
+        assert stat.S_IMODE(path.stat().st_mode) == 0o600
+
+
+@pytest.mark.skipif(
+    os.getuid() != 0,  # ty: ignore[possibly-missing-attribute]
+    reason="needs root to create a file owned by another user",
+)
+def test_viewer_hub_refuses_a_path_owned_by_another_user(tmp_path: Path) -> None:
+    """A path owned by another user should be refused, not bound next to."""
+    module = _load_unix_pseudoterminal_module()
+    path = tmp_path / "viewers"
+    path.touch()
+    os.chown(path, 65534, 65534)  # ty: ignore[possibly-missing-attribute]
+    with (
+        selectors.DefaultSelector() as selector,
+        pytest.raises(PermissionError),
+        module._ViewerHub(selector, str(path), -1, module._WindowSizes(-1)),
+    ):
+        pass
+
+
+def test_viewer_hub_drops_viewers_that_fall_too_far_behind(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    """A viewer that stops reading is queued, then disconnected; input is ignored."""
+    module = _load_unix_pseudoterminal_module()
+    monkeypatch.setattr(module, "_send_event", lambda *_event: None)
+    monkeypatch.setattr(module, "_VIEWER_BACKLOG_LIMIT", 1 << 18)
+    path = str(tmp_path / "viewers")
+    chunk = memoryview(bytes(1 << 16))
+    with (
+        selectors.DefaultSelector() as selector,
+        module._ViewerHub(selector, path, -1, module._WindowSizes(-1)) as hub,
+        socket.socket(socket.AF_UNIX) as client,  # ty: ignore[possibly-missing-attribute]
+    ):
+        client.connect(path)
+        hub()
+        viewer = hub.viewers[0]
+        client.sendall(_viewer_frame(b"i", b"ignored"))
+        viewer()
+        for _ in range(256):
+            hub.broadcast(chunk)
+            if not hub.viewers:
+                break
+            assert hub.status()["viewers"][0]["backlog"] <= 1 << 18
+        assert not hub.viewers
+        assert not viewer.registered
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX process groups only")
+def test_priority_handler_demotes_and_restores_the_session() -> None:
+    """Priority classes change the nice value of the session's process group."""
+    module = _load_unix_pseudoterminal_module()
+    with subprocess.Popen(("sleep", "30"), start_new_session=True) as process:
+        try:
+            handle = module._priority_handler(process.pid, -1, "normal")
+            assert handle({})["class"] == "normal"
+
+            result = handle({"class": "background"})
+            assert result["nice"] == 10
+            assert not [
+                error for error in result["errors"] if "NotImplemented" not in error
+            ]
+
+            restored = handle({"class": "normal"})
+            assert restored["class"] == "normal"
+            assert restored["nice"] == 0 or any(
+                error.startswith("PermissionError") for error in restored["errors"]
+            )
+            with pytest.raises(ValueError, match="unsupported priority class"):
+                handle({"class": "realtime"})
+        finally:
+            process.kill()
+
+
+def test_command_timer_times_osc_133_commands_across_chunks(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Marks split across chunks still time commands and the first prompt."""
+    module = _load_unix_pseudoterminal_module()
+    clock = iter((1.5, 2.0, 3.0, 5.5, 6.0, 6.0, 7.0, 7.25))
+    monkeypatch.setattr(module, "monotonic", lambda: next(clock))
+    timer = module._CommandTimer(1.0)
+    stream = (
+        b"\x1b]133;A\x07$ \x1b]133;B\x07make -j8\r\n\x1b]133;C\x07building\r\n"
+        b"\x1b]133;D;2\x1b\\\x1b]133;A\x07$ \x1b]133;B\x07\x1b[1mls\x1b[0m\r\n"
+        b"\x1b]133;C\x07\x1b]133;D;0\x07"
+    )
+    for start in range(0, len(stream), 7):
+        timer.feed(memoryview(stream[start : start + 7]))
+
+    summary = timer.summary()
+    assert summary["first_prompt_seconds"] == 0.5
+    assert (summary["commands"], summary["failed"]) == (2, 1)
+    assert summary["total_seconds"] == 2.75
+    assert summary["programs"] == [
+        {"program": "make", "count": 1, "seconds": 2.5},
+        {"program": "ls", "count": 1, "seconds": 0.25},
+    ]
+    assert [
+        (command["command"], command["seconds"], command["exit_code"])
+        for command in summary["recent"]
+    ] == [("ls", 0.25, 0), ("make -j8", 2.5, 2)]
+    assert timer.summary(1)["recent"] == summary["recent"][:1]
+
+
+def test_vault_link_scanner_reports_links_to_existing_notes(tmp_path: Path) -> None:
+    """Paths of existing notes are reported with visual column ranges."""
+    module = _load_unix_pseudoterminal_module()
+    for note in ("notes/a.md", "My Note.md", ".obsidian/hidden.md"):
+        (tmp_path / note).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / note).touch()
+    batches: list[list[dict[str, object]]] = []
+
+    with module._VaultLinkScanner(str(tmp_path), batches.append) as scanner:
+        scanner.feed(b"plain output\n\x1b[32mnotes/\x1b[0ma.md (My Note.md)\n")
+        scanner.feed(f"日本 ./notes/a.md {tmp_path}/notes/a.md\n".encode())
+        scanner.feed(b"missing.md .obsidian/hidden.md\n")
+        scanner.feed(b"new.md\n")
+        assert scanner.flush(5)
+        (tmp_path / "new.md").touch()
+        scanner.feed(b"new.md\n")
+        assert scanner.flush(5)
+        scanner.invalidate()
+        scanner.feed(b"new.md")
+
+    links = [link for batch in batches for link in batch]
+    assert links == [
+        {"line": 1, "start": 0, "end": 10, "path": "notes/a.md"},
+        {"line": 1, "start": 12, "end": 22, "path": "My Note.md"},
+        {"line": 2, "start": 5, "end": 17, "path": "notes/a.md"},
+        {
+            "line": 2,
+            "start": 18,
+            "end": 18 + len(f"{tmp_path}/notes/a.md"),
+            "path": "notes/a.md",
+        },
+        {"line": 6, "start": 0, "end": 6, "path": "new.md"},
+    ]
+
+
+def test_forwarding_thread_forwards_until_eof_and_wakes_the_loop(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """The threads engine forwards with blocking reads and signals its end."""
+    module = _load_unix_pseudoterminal_module()
+    source_read, source_write = os.pipe()
+    sink_read, sink_write = os.pipe()
+    monkeypatch.setattr(module, "_STDOUT", sink_write)
+    metrics = module.Counter()
+    with (
+        selectors.DefaultSelector() as selector,
+        module._Wakeup(selector) as wakeup,
+        module._ForwardingThread(
+            module._PipePty(selector, source_read), "output", metrics, wakeup, 5
+        ) as forwarder,
+    ):
+        assert forwarder.registered
+        os.write(source_write, b"threaded")
+        assert os.read(sink_read, 64) == b"threaded"
+        os.close(source_write)
+        assert [key.data for key, _ in selector.select(5)] == [wakeup]
+        assert wakeup() == 0
+        assert not forwarder.registered
+    assert metrics == {"output_reads": 2, "output_bytes": 8}
+    for fd in (source_read, sink_read, sink_write):
+        os.close(fd)
+
+
+def test_forwarding_thread_stops_reading_on_exit(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """An idle forwarder should stop on exit and never touch a closed wakeup."""
+    module = _load_unix_pseudoterminal_module()
+    source_read, source_write = os.pipe()
+    sink_read, sink_write = os.pipe()
+    monkeypatch.setattr(module, "_STDOUT", sink_write)
+    metrics = module.Counter()
+    with selectors.DefaultSelector() as selector:
+        with (
+            module._Wakeup(selector) as wakeup,
+            module._ForwardingThread(
+                module._PipePty(selector, source_read), "input", metrics, wakeup, 5
+            ) as forwarder,
+        ):
+            thread = forwarder._thread
+        assert not thread.is_alive()
+        os.write(source_write, b"late")
+        wakeup.wake()
+    assert os.read(source_read, 64) == b"late"
+    assert metrics == {}
+    for fd in (source_read, source_write, sink_read, sink_write):
+        os.close(fd)
+
+
+def test_parse_arguments_rejects_viewers_with_the_threads_engine() -> None:
+    """Viewer fan-out needs the selector engine."""
+    module = _load_unix_pseudoterminal_module()
+
+    assert module._parse_arguments(["--engine", "threads", "sh"]).engine == "threads"
+    with pytest.raises(SystemExit):
+        module._parse_arguments(["--engine", "threads", "--viewer-socket", "s", "sh"])
+
+
+def test_pipe_pty_transcodes_without_splitting_characters(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """GBK output reaches stdout and observers as whole UTF-8 characters."""
+    module = _load_unix_pseudoterminal_module()
+    encoded = "编码 ok 中文".encode("gbk")
+    chunks = [encoded[:1], encoded[1:3], encoded[3:8], encoded[8:], b""]
+    forwarded: list[bytes] = []
+    observed: list[bytes] = []
+
+    def fake_readv(_fd: int, buffers: tuple[bytearray, ...]) -> int:
+        """Copy the next scripted chunk into the caller's buffer."""
+        chunk = chunks.pop(0)
+        buffers[0][: len(chunk)] = chunk
+        return len(chunk)
+
+    monkeypatch.setattr(module, "readv", fake_readv)
+    monkeypatch.setattr(
+        module, "write", lambda _fd, data: forwarded.append(bytes(data)) or len(data)
+    )
+    transcoder = module._Transcoder("gbk", "UTF-8")
+    with module._PipePty(
+        _FakeSelector(77), 77, (lambda data: observed.append(bytes(data)),), transcoder
+    ) as pipe_pty:
+        while pipe_pty.registered:
+            pipe_pty()
+
+    assert forwarded == observed
+    assert [chunk.decode() for chunk in forwarded] == ["编", "码 ok ", "中文"]
+
+
+def test_parse_arguments_normalizes_encodings() -> None:
+    """UTF-8 needs no transcoding; unknown encodings are rejected."""
+    module = _load_unix_pseudoterminal_module()
+
+    assert module._parse_arguments(["--encoding", "GBK", "sh"]).encoding == "gbk"
+    assert module._parse_arguments(["--encoding", "utf8", "sh"]).encoding is None
+    with pytest.raises(SystemExit):
+        module._parse_arguments(["--encoding", "no-such-codec", "sh"])
+
+
+def test_watchdog_reports_each_stall_once_with_stacks(tmp_path: Path) -> None:
+    """A stalled loop is counted once and its thread stacks are dumped."""
+    module = _load_unix_pseudoterminal_module()
+    path = tmp_path / "session.stalls.log"
+    metrics = module.Counter()
+
+    with module._Watchdog(
+        0.1, str(path), metrics, lambda: {"buffers": {"pending": 3}}
+    ) as watchdog:
+        assert metrics["stalls"] == 0
+        time.sleep(0.4)
+        watchdog.beat()
+
+    report = path.read_text(encoding="UTF-8")
+    assert metrics["stalls"] == 1
+    assert metrics["longest_stall_ms"] >= 100
+    assert report.count("no loop iteration for") == 1
+    assert '{"buffers": {"pending": 3}}' in report
+    assert "test_watchdog_reports_each_stall_once_with_stacks" in report
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX terminals only")
+def test_echo_monitor_reports_mode_changes_once() -> None:
+    """Echo and canonical mode changes on the slave are seen via the master."""
+    module = _load_unix_pseudoterminal_module()
+    master, slave = os.openpty()  # ty: ignore[possibly-missing-attribute]
+    states: list[dict[str, bool]] = []
+    try:
+        monitor = module._EchoMonitor(master, states.append)
+        monitor.poll()
+        monitor.poll()
+        tty.setraw(slave)  # ty: ignore[possibly-missing-attribute]
+        monitor.poll()
+    finally:
+        os.close(master)
+        os.close(slave)
+    monitor.poll()
+
+    assert states == [
+        {"canonical": True, "echo": True, "signals": True, "raw": False},
+        {"canonical": False, "echo": False, "signals": False, "raw": True},
+    ]
+    assert monitor.state == states[-1]
+
+
+def test_synchronized_output_forwards_each_update_in_one_chunk() -> None:
+    """Updates split across reads are released whole; other output is not held."""
+    module = _load_unix_pseudoterminal_module()
+    metrics = module.Counter()
+    synchronized = module._SynchronizedOutput(metrics)
+    stream = b"before\x1b[?2026hframe 1\r\nframe 2\x1b[?2026lafter"
+    plain = memoryview(bytearray(b"plain"))
+
+    assert [bytes(chunk) for chunk in synchronized.feed(plain, 0.0)] == [b"plain"]
+    assert synchronized.feed(plain, 0.0)[0].obj is plain.obj
+    released = [
+        bytes(chunk)
+        for start in range(0, len(stream), 5)
+        for chunk in synchronized.feed(memoryview(stream[start : start + 5]), 0.0)
+    ]
+
+    assert released == [
+        b"befor",
+        b"e",
+        b"\x1b[?2026hframe 1\r\nframe 2\x1b[?2026l",
+        b"af",
+        b"ter",
+    ]
+    assert synchronized.deadline is None
+    assert metrics == {"sync_frames": 1}
+
+
+def test_synchronized_output_releases_unfinished_updates_on_time() -> None:
+    """An update that never ends is released once its deadline passes."""
+    module = _load_unix_pseudoterminal_module()
+    metrics = module.Counter()
+    synchronized = module._SynchronizedOutput(metrics)
+
+    assert synchronized.feed(memoryview(b"\x1b[?2026hstuck"), 1.0) == []
+    assert synchronized.deadline == 1.0 + module._SYNC_OUTPUT_TIMEOUT
+    assert synchronized.expire(1.05) == []
+    assert [bytes(chunk) for chunk in synchronized.expire(2.0)] == [b"\x1b[?2026hstuck"]
+    assert synchronized.deadline is None
+    assert [bytes(chunk) for chunk in synchronized.feed(memoryview(b"x\x1b"), 3.0)]
+    assert [bytes(chunk) for chunk in synchronized.flush()] == [b"\x1b"]
+    assert metrics == {"sync_timeouts": 1}
+
+
+def _bulk_feed(bulk: Any, data: bytes, size: int, now: float = 0.0) -> bytes:
+    """Feed `data` to `bulk` in chunks of `size` bytes and join the output."""
+    return b"".join(
+        bytes(chunk)
+        for start in range(0, len(data), size)
+        for chunk in bulk.feed(memoryview(data[start : start + size]), now)
+    )
+
+
+def test_bulk_payloads_divert_long_payloads_to_files(tmp_path: Path) -> None:
+    """Long payloads should be left as references; short ones pass unchanged."""
+    module = _load_unix_pseudoterminal_module()
+    metrics = module.Counter()
+    bulk = module._BulkPayloads(str(tmp_path), 64, metrics)
+    clipboard = b"\x1b]52;c;" + b"QQ==" * 4 + b"\x07"
+    sixel = b"\x1bP0;1;0q" + b"#0~" * 100 + b"\x1b\\"
+    kitty = b"\x1b_Ga=T,f=100;" + b"A" * 200 + b"\x1b\\"
+    stream = b"a" + clipboard + b"b" + sixel + b"c\x1b]133;A\x07" + kitty + b"d"
+
+    for size in (1, 7, len(stream)):
+        for file in tmp_path.iterdir():
+            file.unlink()
+        output = _bulk_feed(bulk, stream, size) + b"".join(
+            bytes(chunk) for chunk in bulk.flush()
+        )
+
+        references = [
+            part.split(b"\x1b\\")[0].split(b";")
+            for part in output.split(b"\x1b]7710;")[1:]
+        ]
+        assert [kind for kind, _size, _path in references] == [b"sixel", b"kitty"]
+        assert [
+            Path(path.decode()).read_bytes() for _kind, _size, path in references
+        ] == [
+            sixel,
+            kitty,
+        ]
+        assert [int(size) for _kind, size, _path in references] == [
+            len(sixel),
+            len(kitty),
+        ]
+        assert output.startswith(b"a" + clipboard + b"b\x1b]7710;sixel;")
+        assert b"c\x1b]133;A\x07\x1b]7710;kitty;" in output
+        assert output.endswith(b"\x1b\\d")
+        assert bulk.deadline is None
+    assert metrics["bulk_payloads"] == 6
+    assert metrics["bulk_bytes"] == 3 * (len(sixel) + len(kitty))
+
+
+def test_bulk_payloads_remove_their_files_on_exit(tmp_path: Path) -> None:
+    """Diverted files should be removed, including one still being written."""
+    module = _load_unix_pseudoterminal_module()
+    kitty = b"\x1b_Ga=T,f=100;" + b"A" * 200 + b"\x1b\\"
+
+    with module._BulkPayloads(str(tmp_path), 64, module.Counter()) as bulk:
+        _bulk_feed(bulk, kitty + kitty[:-2], 100)
+        assert len(list(tmp_path.iterdir())) == 2
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_bulk_payloads_release_held_output_on_time(tmp_path: Path) -> None:
+    """Held output should be released unchanged once it is held too long."""
+    module = _load_unix_pseudoterminal_module()
+    metrics = module.Counter()
+    bulk = module._BulkPayloads(str(tmp_path), 64, metrics)
+
+    assert _bulk_feed(bulk, b"x\x1b]5", 100, 1.0) == b"x"
+    assert bulk.deadline == 1.0 + module._BULK_HOLD_TIMEOUT
+    assert bulk.expire(1.05) == []
+    assert [bytes(chunk) for chunk in bulk.expire(2.0)] == [b"\x1b]5"]
+    assert _bulk_feed(bulk, b"\x1b]52;c;slow", 100, 3.0) == b""
+    assert [bytes(chunk) for chunk in bulk.expire(4.0)] == [b"\x1b]52;c;slow"]
+    assert _bulk_feed(bulk, b"er" + b"A" * 100 + b"\x07z", 100, 5.0) == (
+        b"er" + b"A" * 100 + b"\x07z"
+    )
+    assert bulk.deadline is None
+    assert metrics["bulk_timeouts"] == 1
+    assert metrics["bulk_payloads"] == 0
+    assert not list(tmp_path.iterdir())
+
+
+def test_environment_file_overrides_the_spawned_environment(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    """The child should exec with captured variables over inherited ones."""
+    module = _load_unix_pseudoterminal_module()
+    environment_file = tmp_path / "environment.json"
+    environment_file.write_text(
+        json.dumps({"environment": {"PATH": "/login/bin", "EDITOR": "vi"}})
+    )
+    calls = list[tuple[str, list[str], dict[str, str]]]()
+
+    class _Execed(Exception):
+        """Stop the forked child at its exec call."""
+
+    def fake_execvpe(file: str, args: list[str], env: dict[str, str]) -> None:
+        """Record the exec call instead of replacing the process."""
+        calls.append((file, args, env))
+        raise _Execed
+
+    monkeypatch.setattr(module, "fork", lambda: (0, -1))
+    monkeypatch.setattr(module, "execvpe", fake_execvpe)
+    monkeypatch.setattr(module, "environ", {"PATH": "/gui/bin", "HOME": "/h"})
+
+    with pytest.raises(_Execed):
+        module.main(
+            ["unix_pseudoterminal", "--environment-file", str(environment_file), "sh"]
+        )
+
+    assert calls == [
+        ("sh", ["sh"], {"PATH": "/login/bin", "HOME": "/h", "EDITOR": "vi"})
+    ]
+    environment_file.write_text(json.dumps({"environment": {"PATH": 1}}))
+    with pytest.raises(SystemExit):
+        module._parse_arguments(["--environment-file", str(environment_file), "sh"])
+    with pytest.raises(SystemExit):
+        module._parse_arguments(["--environment-file", str(tmp_path / "no"), "sh"])
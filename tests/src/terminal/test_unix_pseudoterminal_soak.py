@@ -0,0 +1,455 @@
+"""Soak and scale harness for ``src/terminal/unix_pseudoterminal.py``.
+
+This file is split from ``test_unix_pseudoterminal.py`` because it launches
+real proxies on real PTYs instead of faking the selector. The harness runs many
+concurrent sessions with mixed workloads (idle shells, output floods, resize
+storms and abrupt host disconnects) and reports aggregate RSS, FD counts, CPU
+time, leaked processes and keystroke echo latency percentiles.
+
+It also holds a forwarding microbenchmark reporting CPU time and peak
+allocation per MiB pushed through the proxy's hot path.
+
+Under pytest both run in a small smoke configuration. For a full soak run it
+as a script, e.g. ``python tests/src/terminal/test_unix_pseudoterminal_soak.py
+--sessions 300 --duration 120``, or pass ``--benchmark 256`` to forward 256 MiB
+instead; it prints the report as JSON. ``--engine threads`` soaks the proxy's
+thread-per-direction engine instead of its selector loop, for comparing
+throughput (``bytes_forwarded``) and echo latency between the two.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import tracemalloc
+from argparse import ArgumentParser
+from collections.abc import Callable, Mapping, Sequence
+from dataclasses import asdict, dataclass, field
+from importlib.util import module_from_spec, spec_from_file_location
+from itertools import cycle
+from pathlib import Path
+from random import Random
+from selectors import EVENT_READ, DefaultSelector
+from threading import Thread
+from time import monotonic, sleep, thread_time
+from types import ModuleType, SimpleNamespace
+
+import psutil
+import pytest
+
+"""Public API of this test module (empty)."""
+__all__ = ()
+
+"""Skip the whole module where the Unix proxy cannot run."""
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32", reason="Unix pseudoterminal proxy is POSIX-only"
+)
+
+"""Path to the proxy script under test."""
+_PROXY = Path(__file__).parents[3] / "src/terminal/unix_pseudoterminal.py"
+
+"""Workloads assigned to sessions in round-robin order."""
+_WORKLOADS = ("idle", "flood", "resize", "disconnect")
+
+"""Seconds between keystroke echo probes of a non-flooding session."""
+_PROBE_INTERVAL = 0.25
+
+"""Seconds between process resource samples."""
+_SAMPLE_INTERVAL = 1.0
+
+"""Resize frames sent per harness tick by a resize-storm session."""
+_RESIZES_PER_TICK = 16
+
+"""Seconds a proxy may take to exit after its host disconnects."""
+_EXIT_TIMEOUT = 10.0
+
+"""Bytes of recent output kept per session to find split probe tokens."""
+_OUTPUT_TAIL = 256
+
+"""Bytes in a mebibyte, the unit of the forwarding microbenchmark."""
+_MIB = 1 << 20
+
+"""Bytes accepted per `write` call when benchmarking partial writes."""
+_PARTIAL_WRITE_SIZE = 4096
+
+
+@dataclass
+class SoakReport:
+    """Aggregate results of one soak run."""
+
+    sessions: int
+    duration: float
+    workloads: dict[str, int]
+    bytes_forwarded: int
+    peak_rss_bytes: int
+    peak_fds: int
+    proxy_cpu_seconds: float
+    probes: int
+    lost_probes: int
+    latency_ms: dict[str, float]
+    stuck_proxies: int
+    orphans: list[int] = field(default_factory=list)
+    zombies: list[int] = field(default_factory=list)
+    engine: str = "selector"
+
+
+class _Session:
+    """One proxy process with its host-side pipes and workload state."""
+
+    def __init__(self, index: int, workload: str, engine: str = "selector") -> None:
+        """Launch a proxy running ``sh`` with the control FD on a socket pair."""
+        self.index = index
+        self.workload = workload
+        self.cmdio, proxy_cmdio = socket.socketpair()
+        self.process = subprocess.Popen(
+            (sys.executable, str(_PROXY), "--engine", engine, "sh"),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            pass_fds=(3,),
+            # The harness is single-threaded, so `preexec_fn` is safe here.
+            preexec_fn=lambda: os.dup2(proxy_cmdio.fileno(), 3),  # noqa: PLW1509
+        )
+        proxy_cmdio.close()
+        self.connected = True
+        self.tail = b""
+        self.probe: tuple[bytes, float] | None = None
+        self.probe_count = 0
+        self.next_probe = monotonic()
+        self.descendants = dict[int, float]()
+        self.cpu_seconds = 0.0
+        assert self.process.stdin is not None and self.process.stdout is not None
+        self.stdin = self.process.stdin
+        self.stdout = self.process.stdout
+        if workload == "flood":
+            self.send(b"yes soak-flood-line\n")
+
+    def send(self, data: bytes) -> None:
+        """Write keystrokes to the proxy, tolerating an exited proxy."""
+        try:
+            self.stdin.write(data)
+            self.stdin.flush()
+        except OSError:
+            self.disconnect()
+
+    def disconnect(self) -> None:
+        """Close every host-side pipe, as a crashing host would."""
+        if not self.connected:
+            return
+        self.connected = False
+        for stream in (self.stdin, self.stdout, self.cmdio):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+    def record_tree(self) -> tuple[int, int, float]:
+        """Return ``(tree RSS bytes, proxy FDs, proxy CPU seconds)``; note descendants.
+
+        Descendants are remembered with their creation time so leak checks
+        can tell a survivor from a reused pid.
+        """
+        try:
+            proxy = psutil.Process(self.process.pid)
+            tree = [proxy, *proxy.children(recursive=True)]
+            fds = int(proxy.num_fds())  # ty: ignore[possibly-missing-attribute]
+        except psutil.Error:
+            return 0, 0, self.cpu_seconds
+        rss, cpu = 0, 0.0
+        for process in tree:
+            try:
+                with process.oneshot():
+                    rss += int(process.memory_info().rss)
+                    times = process.cpu_times()
+                    if process.pid == proxy.pid:
+                        cpu += float(times.user + times.system)
+                    else:
+                        self.descendants[process.pid] = float(process.create_time())
+            except psutil.Error:
+                continue
+        self.cpu_seconds = max(self.cpu_seconds, cpu)
+        return rss, fds, self.cpu_seconds
+
+
+def _percentiles(samples: Sequence[float]) -> dict[str, float]:
+    """Return p50/p90/p99/max of `samples` in milliseconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def at(fraction: float) -> float:
+        """Return the nearest-rank percentile at `fraction`."""
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+
+    return {"p50": at(0.5), "p90": at(0.9), "p99": at(0.99), "max": ordered[-1] * 1000}
+
+
+def _leaked(sessions: Sequence[_Session]) -> tuple[list[int], list[int]]:
+    """Return ``(orphans, zombies)``: recorded descendants that outlived the run."""
+    orphans, zombies = list[int](), list[int]()
+    for session in sessions:
+        for pid, created in session.descendants.items():
+            try:
+                process = psutil.Process(pid)
+                if process.create_time() != created:
+                    continue
+                status = process.status()
+            except psutil.Error:
+                continue
+            (zombies if status == psutil.STATUS_ZOMBIE else orphans).append(pid)
+    return orphans, zombies
+
+
+def run_soak(
+    sessions: int, duration: float, seed: int = 0, engine: str = "selector"
+) -> SoakReport:
+    """Run `sessions` concurrent proxies for `duration` seconds and report.
+
+    Idle and resize-storm sessions are probed for keystroke echo latency;
+    flood sessions run ``yes``; disconnect sessions lose their host at a
+    random time. At the end every remaining host disconnects and each proxy
+    must exit and take its process group with it. Proxies use `engine`.
+    """
+    rng = Random(seed)
+    workloads = cycle(_WORKLOADS)
+    running = [_Session(index, next(workloads), engine) for index in range(sessions)]
+    disconnect_at = {
+        session.index: rng.uniform(0, duration)
+        for session in running
+        if session.workload == "disconnect"
+    }
+    latencies = list[float]()
+    bytes_forwarded = peak_rss = peak_fds = lost_probes = 0
+    by_fd = {session.stdout.fileno(): session for session in running}
+    with DefaultSelector() as selector:
+        for session in running:
+            selector.register(session.stdout, EVENT_READ)
+        start = next_sample = monotonic()
+        while (now := monotonic()) - start < duration:
+            for key, _ in selector.select(0.05):
+                session = by_fd[key.fd]
+                try:
+                    chunk = os.read(session.stdout.fileno(), 1 << 16)
+                except OSError:
+                    chunk = b""
+                if not chunk:
+                    selector.unregister(session.stdout)
+                    session.disconnect()
+                    continue
+                bytes_forwarded += len(chunk)
+                if session.probe is not None:
+                    window = session.tail + chunk
+                    token, sent = session.probe
+                    if token in window:
+                        latencies.append(monotonic() - sent)
+                        session.probe = None
+                    session.tail = window[-_OUTPUT_TAIL:]
+            for session in running:
+                if not session.connected:
+                    continue
+                if disconnect_at.get(session.index, duration) <= now - start:
+                    session.record_tree()
+                    selector.unregister(session.stdout)
+                    session.disconnect()
+                    continue
+                if session.workload == "resize":
+                    frames = "".join(
+                        f"{rng.randint(20, 300)}x{rng.randint(5, 100)}\n"
+                        for _ in range(_RESIZES_PER_TICK)
+                    )
+                    try:
+                        session.cmdio.sendall(frames.encode())
+                    except OSError:
+                        session.disconnect()
+                        continue
+                if session.workload != "flood" and now >= session.next_probe:
+                    if session.probe is not None:
+                        lost_probes += 1
+                    session.probe_count += 1
+                    token = f"soak{session.index}x{session.probe_count}".encode()
+                    session.probe = token, monotonic()
+                    session.tail = b""
+                    session.next_probe = now + _PROBE_INTERVAL
+                    session.send(b": " + token + b"\n")
+            if now >= next_sample:
+                next_sample = now + _SAMPLE_INTERVAL
+                totals = [s.record_tree() for s in running if s.connected]
+                peak_rss = max(peak_rss, sum(rss for rss, _, _ in totals))
+                peak_fds = max(peak_fds, sum(fds for _, fds, _ in totals))
+        for session in running:
+            if session.connected:
+                session.record_tree()
+                selector.unregister(session.stdout)
+                session.disconnect()
+    deadline = monotonic() + _EXIT_TIMEOUT
+    stuck = 0
+    for session in running:
+        try:
+            session.process.wait(max(deadline - monotonic(), 0.1))
+        except subprocess.TimeoutExpired:
+            stuck += 1
+            session.process.kill()
+            session.process.wait()
+    sleep(0.5)  # let init reap reparented descendants before checking leaks
+    orphans, zombies = _leaked(running)
+    for pid in orphans:
+        try:
+            psutil.Process(pid).kill()
+        except psutil.Error:
+            pass
+    counts = dict[str, int]()
+    for session in running:
+        counts[session.workload] = counts.get(session.workload, 0) + 1
+    return SoakReport(
+        sessions=sessions,
+        duration=duration,
+        workloads=counts,
+        bytes_forwarded=bytes_forwarded,
+        peak_rss_bytes=peak_rss,
+        peak_fds=peak_fds,
+        proxy_cpu_seconds=sum(session.cpu_seconds for session in running),
+        probes=len(latencies) + lost_probes,
+        lost_probes=lost_probes,
+        latency_ms=_percentiles(latencies),
+        stuck_proxies=stuck,
+        orphans=orphans,
+        zombies=zombies,
+        engine=engine,
+    )
+
+
+@pytest.mark.parametrize("engine", ("selector", "threads"))
+def test_soak_smoke_has_no_leaks_and_responsive_echo(engine: str) -> None:
+    """A short mixed-workload run leaks nothing and keeps echo responsive."""
+    report = run_soak(sessions=8, duration=3.0, engine=engine)
+
+    assert report.workloads == dict.fromkeys(_WORKLOADS, 2)
+    assert report.stuck_proxies == 0
+    assert report.orphans == []
+    assert report.zombies == []
+    assert report.bytes_forwarded > 0
+    assert report.peak_rss_bytes > 0
+    assert report.probes > 0
+    assert report.latency_ms["p50"] < 1000
+
+
+def _load_proxy_module() -> ModuleType:
+    """Load the proxy from source with stdio pointed at ``/dev/null``."""
+    spec = spec_from_file_location("tests_unix_pseudoterminal_soak_proxy", _PROXY)
+    if spec is None or spec.loader is None:
+        raise AssertionError(_PROXY)
+    module = module_from_spec(spec)
+    with open(os.devnull, "rb") as stdin_file, open(os.devnull, "wb") as stdout_file:
+        old_stdin, old_stdout = sys.stdin, sys.stdout
+        try:
+            sys.stdin, sys.stdout = stdin_file, stdout_file
+            spec.loader.exec_module(module)
+        finally:
+            sys.stdin, sys.stdout = old_stdin, old_stdout
+    return module
+
+
+def _measure(run: Callable[[], object]) -> tuple[float, int]:
+    """Return this thread's CPU seconds and the peak traced allocation of `run`."""
+    tracemalloc.start()
+    try:
+        start = thread_time()
+        run()
+        cpu = thread_time() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return cpu, peak
+
+
+def run_forwarding_benchmark(megabytes: int) -> dict[str, float]:
+    """Measure the proxy's forwarding hot path over `megabytes` MiB.
+
+    PTY output is fed through `_PipePty` from a pipe to ``/dev/null``, and the
+    same amount is pushed through `write_all` accepting only 4 KiB per call.
+    Each pass reports this thread's CPU milliseconds per MiB and the peak
+    traced allocation in bytes, including the handler's own buffer.
+    """
+    module = _load_proxy_module()
+    total = megabytes * _MIB
+    payload = bytes(total)
+    read_fd, write_fd = os.pipe()
+    null_fd = os.open(os.devnull, os.O_WRONLY)
+    selector = SimpleNamespace(register=lambda *_: None, unregister=lambda *_: None)
+
+    def produce() -> None:
+        """Write `payload` into the pipe, then close it."""
+        view = memoryview(payload)
+        for offset in range(0, total, 65536):
+            os.write(write_fd, view[offset : offset + 65536])
+        os.close(write_fd)
+
+    def forward() -> None:
+        """Forward the pipe's contents until EOF."""
+        with module._PipePty(selector, read_fd) as pipe_pty:
+            while pipe_pty():
+                pass
+
+    def partial_write() -> None:
+        """Write `payload` through `write_all` with short writes."""
+        module.write_all(1, payload)
+
+    producer = Thread(target=produce)
+    producer.start()
+    try:
+        with pytest.MonkeyPatch.context() as patch:
+            patch.setattr(module, "_STDOUT", null_fd)
+            forward_cpu, forward_peak = _measure(forward)
+            patch.setattr(
+                module, "write", lambda _fd, data: min(len(data), _PARTIAL_WRITE_SIZE)
+            )
+            partial_cpu, partial_peak = _measure(partial_write)
+    finally:
+        producer.join()
+        os.close(read_fd)
+        os.close(null_fd)
+    return {
+        "forward_cpu_ms_per_mib": forward_cpu * 1000 / megabytes,
+        "forward_peak_alloc_bytes": forward_peak,
+        "partial_write_cpu_ms_per_mib": partial_cpu * 1000 / megabytes,
+        "partial_write_peak_alloc_bytes": partial_peak,
+    }
+
+
+def test_forwarding_benchmark_smoke_allocates_nothing_per_chunk() -> None:
+    """The hot path's peak allocation stays far below the data forwarded."""
+    report = run_forwarding_benchmark(4)
+
+    assert report["forward_peak_alloc_bytes"] < _MIB
+    assert report["partial_write_peak_alloc_bytes"] < _MIB
+
+
+def _main(argv: Sequence[str]) -> None:
+    """Run a soak from the command line and print its report as JSON."""
+    parser = ArgumentParser(description="Soak-test the Unix PTY proxy.")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--benchmark", type=int, metavar="MIB")
+    parser.add_argument("--engine", choices=("selector", "threads"), default="selector")
+    options = parser.parse_args(argv)
+    report: Mapping[str, object] = (
+        asdict(
+            run_soak(
+                options.sessions,
+                options.duration,
+                options.seed,
+                options.engine,
+            )
+        )
+        if options.benchmark is None
+        else run_forwarding_benchmark(options.benchmark)
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    _main(sys.argv[1:])
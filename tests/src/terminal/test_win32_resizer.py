@@ -8,9 +8,17 @@ from __future__ import annotations
 
 import ast
 import importlib.util
+import json
 import sys
+from collections import Counter
+from collections.abc import Callable, Generator, Iterable
+from contextlib import contextmanager
+from heapq import heappop, heappush
+from itertools import count
 from pathlib import Path
-from types import ModuleType
+from queue import Empty, SimpleQueue
+from types import ModuleType, SimpleNamespace
+from typing import Any
 
 import pytest
 
@@ -61,6 +69,569 @@ def _load_module() -> ModuleType:
     return module
 
 
+class _FakeProcess:
+    """Stand-in for `psutil.Process` with a mutable list of descendants."""
+
+    def __init__(self, pid: int) -> None:
+        """Initialize a process without descendants."""
+        self.pid = pid
+        self.descendants = list[_FakeProcess]()
+        self.children_calls = 0
+        self.running = True
+
+    def children(self, *, recursive: bool = False) -> list[_FakeProcess]:
+        """Return the descendants and count the (expensive) call."""
+        assert recursive
+        self.children_calls += 1
+        return list(self.descendants)
+
+    def is_running(self) -> bool:
+        """Return whether the process is still running."""
+        return self.running
+
+
+class _FakeWindow:
+    """Stand-in for `pywinctl.Window` owned by a process."""
+
+    def __init__(self, handle: int, pid: int) -> None:
+        """Initialize a window with its handle and owner PID."""
+        self.handle = handle
+        self.pid = pid
+
+    def getHandle(self) -> int:
+        """Return the native window handle."""
+        return self.handle
+
+
+def _load_module_with_fakes(monkeypatch: pytest.MonkeyPatch) -> ModuleType:
+    """Load the target module with fake ``psutil`` and ``pywinctl`` backends."""
+    monkeypatch.setitem(sys.modules, "psutil", SimpleNamespace(Process=_FakeProcess))
+    monkeypatch.setitem(
+        sys.modules,
+        "pywinctl",
+        SimpleNamespace(Window=_FakeWindow, getAllWindows=list),
+    )
+    return _load_module()
+
+
+def _window_lister(
+    snapshots: Iterable[list[_FakeWindow]],
+) -> tuple[Callable[[], list[_FakeWindow]], Callable[[_FakeWindow], int], list[int]]:
+    """Return fakes listing `snapshots` in turn and resolving window owners.
+
+    The returned list records every owner PID lookup by window handle.
+    """
+    snapshots = iter(snapshots)
+    lookups = list[int]()
+    last = list[_FakeWindow]()
+
+    def windows() -> list[_FakeWindow]:
+        """Return the next snapshot, or the last one when exhausted."""
+        nonlocal last
+        last = next(snapshots, last)
+        return last
+
+    def window_pid(window: _FakeWindow) -> int:
+        """Return the owner of `window` and record the lookup."""
+        lookups.append(window.handle)
+        return window.pid
+
+    return windows, window_pid, lookups
+
+
+def test_find_window_indexes_windows_and_backs_off(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A console appearing late should be found quickly with few lookups."""
+    module = _load_module_with_fakes(monkeypatch)
+    root = _FakeProcess(100)
+    conhost = _FakeProcess(101)
+    desktop = [_FakeWindow(handle, 1000 + handle) for handle in range(50)]
+    console = _FakeWindow(99, conhost.pid)
+    windows, window_pid, lookups = _window_lister(
+        (
+            desktop,
+            desktop,
+            [*desktop, console],
+        )
+    )
+    sleeps = list[float]()
+
+    def spawn_on_sleep(seconds: float) -> None:
+        """Record the backoff and let the console host start meanwhile."""
+        sleeps.append(seconds)
+        root.descendants = [conhost]
+
+    found = module.find_window(root, windows, window_pid, sleep=spawn_on_sleep)
+
+    assert found == (conhost, console)
+    assert sleeps == [0.05, 0.1]
+    assert sorted(lookups) == list(range(50)) + [99]
+    assert root.children_calls == 2
+
+
+def test_find_window_gives_up_after_about_ten_seconds(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """The backoff should be capped and bounded by the retry count."""
+    module = _load_module_with_fakes(monkeypatch)
+    windows, window_pid, lookups = _window_lister(([_FakeWindow(1, 2)],))
+    sleeps = list[float]()
+    process = _FakeProcess(1)
+
+    with pytest.raises(LookupError):
+        module.find_window(process, windows, window_pid, sleep=sleeps.append)
+
+    assert len(sleeps) == module._LOOKUP_RETRIES
+    assert max(sleeps) == module._LOOKUP_MAX_RETRY_INTERVAL
+    assert 9 <= sum(sleeps) <= 11
+    assert lookups == [1]
+    assert process.children_calls == 1
+
+
+def test_find_window_refreshes_the_tree_only_for_new_window_owners(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Retries without new window owners should not walk the process tree."""
+    module = _load_module_with_fakes(monkeypatch)
+    root = _FakeProcess(100)
+    conhost = _FakeProcess(101)
+    desktop = [_FakeWindow(handle, 1000 + handle) for handle in range(5)]
+    other = _FakeWindow(50, 2000)
+    console = _FakeWindow(99, conhost.pid)
+    windows, window_pid, _lookups = _window_lister(
+        (
+            desktop,
+            desktop,
+            desktop,
+            [*desktop, other],
+            [*desktop, other],
+            [*desktop, other, console],
+        )
+    )
+    calls = list[int]()
+
+    def record_calls(_seconds: float) -> None:
+        """Record the tree walks so far and start the console host last."""
+        calls.append(root.children_calls)
+        if len(calls) == 5:
+            root.descendants = [conhost]
+
+    found = module.find_window(root, windows, window_pid, sleep=record_calls)
+
+    assert found == (conhost, console)
+    assert calls == [1, 1, 1, 2, 2]
+    assert root.children_calls == 3
+
+
+def _queue(*lines: str | None) -> SimpleQueue[str | None]:
+    """Return a queue holding `lines`, as filled by the stdin reader thread."""
+    queue: SimpleQueue[str | None] = SimpleQueue()
+    for line in lines:
+        queue.put(line)
+    return queue
+
+
+class _FakeLines:
+    """Stand-in for the stdin line queue on a fake clock.
+
+    Lines scheduled with `at` are delivered at their time; scheduled
+    callables are called at their time instead. A `get` that would wait
+    longer than its timeout advances the clock by the timeout and raises
+    `Empty` instead, so no test waits in real time. `put` delivers an item
+    after `delay`, which fake window lookups set to their duration.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty queue at time zero."""
+        self.now = 0.0
+        self.delay = 0.0
+        self._events = list[tuple[float, int, object]]()
+        self._order = count()
+
+    def clock(self) -> float:
+        """Return the fake time."""
+        return self.now
+
+    def at(self, when: float, item: object) -> None:
+        """Deliver `item` at the time `when`."""
+        heappush(self._events, (when, next(self._order), item))
+
+    def put(self, item: object) -> None:
+        """Deliver `item` after `delay`, which is reset."""
+        self.at(self.now + self.delay, item)
+        self.delay = 0.0
+
+    def get(self, timeout: float | None = None) -> object:
+        """Return the next item, advancing the clock to its time."""
+        item = self._get(timeout)
+        while callable(item):
+            item()
+            item = self._get(timeout)
+        return item
+
+    def _get(self, timeout: float | None) -> object:
+        """Return the next item or callable, advancing the clock to its time."""
+        if not self._events:
+            if timeout is None:
+                raise AssertionError("get would block forever")
+            self.now += timeout
+            raise Empty
+        when, _, item = self._events[0]
+        if timeout is not None and when > self.now + timeout:
+            self.now += timeout
+            raise Empty
+        heappop(self._events)
+        self.now = max(self.now, when)
+        return item
+
+
+def test_resizer_reader_applies_only_the_newest_size_of_a_burst(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Pending sizes should be drained and counted as skipped."""
+    module = _load_module_with_fakes(monkeypatch)
+    metrics = Counter[str]()
+    lines = _queue("80x24", "", "81x25", " 82 x 26 ", None)
+
+    sizes = list(module.resizer_reader(_FakeProcess(1), lines, metrics))
+
+    assert sizes == [(82, 26)]
+    assert metrics == {"received": 3, "skipped": 2}
+
+
+def test_resizer_reader_stops_when_the_process_exits(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Watchdog lines should end the reader once the process is gone."""
+    module = _load_module_with_fakes(monkeypatch)
+    process = _FakeProcess(1)
+    lines = _queue("80x24")
+    reader = module.resizer_reader(process, lines)
+
+    assert next(reader) == (80, 24)
+    lines.put("")
+    lines.put("90x30")
+    process.running = False
+    assert list(reader) == []
+
+
+def test_resizer_reader_bounds_the_delay_during_a_resize_storm(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A continuous storm should still apply sizes every maximum delay."""
+    module = _load_module_with_fakes(monkeypatch)
+    monkeypatch.setattr(module, "_RESIZE_DEBOUNCE", 0.05)
+    monkeypatch.setattr(module, "_RESIZE_MAX_DELAY", 0.155)
+    metrics = Counter[str]()
+    lines = _FakeLines()
+    for columns in range(60):  # a size every 10 ms for 0.6 s
+        lines.at(columns * 0.01, f"{columns}x24")
+    lines.at(0.6, None)
+
+    sizes = list(
+        module.resizer_reader(_FakeProcess(1), lines, metrics, clock=lines.clock)
+    )
+
+    assert sizes == [(15, 24), (31, 24), (47, 24), (59, 24)]
+    assert metrics["received"] == 60
+    assert metrics["skipped"] == 60 - len(sizes)
+
+
+def test_resizer_reader_applies_a_size_after_a_quiet_period(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A size followed by silence should be applied after one debounce period."""
+    module = _load_module_with_fakes(monkeypatch)
+    lines = _FakeLines()
+    lines.at(1.0, "80x24")
+    lines.at(1.01, "81x24")
+    lines.at(2.0, "90x30")
+    lines.at(3.0, None)
+    reader = module.resizer_reader(_FakeProcess(1), lines, clock=lines.clock)
+
+    assert next(reader) == (81, 24)
+    assert lines.now == pytest.approx(1.01 + module._RESIZE_DEBOUNCE)
+    assert list(reader) == [(90, 30)]
+
+
+class _FakeConsoleHost:
+    """Fake console with its host window, counting every backend call.
+
+    The console's visible size is limited by its buffer and by the client
+    area of the window, like a real console: setters that would violate
+    either raise, and shrinking the window shrinks the visible console.
+    """
+
+    def __init__(self, cell: tuple[int, int], columns: int, rows: int) -> None:
+        """Initialize a host showing `columns` x `rows` cells of size `cell`."""
+        self.cell = cell
+        self.frame = (16, 39)
+        self.buffer = (columns, rows)
+        self.visible = (columns, rows)
+        self.client = (columns * cell[0], rows * cell[1])
+        self.calls = Counter[str]()
+        self.process: _FakeProcess | None = None
+
+    def GetConsoleScreenBufferInfo(self) -> dict[str, SimpleNamespace]:
+        """Return the visible console rectangle."""
+        self.calls["GetConsoleScreenBufferInfo"] += 1
+        columns, rows = self.visible
+        return {
+            "Window": SimpleNamespace(Left=0, Top=0, Right=columns - 1, Bottom=rows - 1)
+        }
+
+    def _fits(self) -> tuple[int, int]:
+        """Return the most cells the client area can show."""
+        return self.client[0] // self.cell[0], self.client[1] // self.cell[1]
+
+    def SetConsoleWindowInfo(self, _absolute: bool, rect: SimpleNamespace) -> None:
+        """Show `rect` if it fits in the buffer and the window."""
+        self.calls["SetConsoleWindowInfo"] += 1
+        size = (rect.Right - rect.Left + 1, rect.Bottom - rect.Top + 1)
+        limit = tuple(map(min, self.buffer, self._fits()))
+        if size[0] > limit[0] or size[1] > limit[1]:
+            raise OSError(size)
+        self.visible = size
+
+    def SetConsoleScreenBufferSize(self, coord: SimpleNamespace) -> None:
+        """Resize the buffer if it still holds the visible rectangle."""
+        self.calls["SetConsoleScreenBufferSize"] += 1
+        if coord.X < self.visible[0] or coord.Y < self.visible[1]:
+            raise OSError(coord)
+        self.buffer = (coord.X, coord.Y)
+
+    def set_window_pos(self, _handle: int, width: int, height: int) -> None:
+        """Resize the window, shrinking the visible console to fit."""
+        self.calls["SetWindowPos"] += 1
+        self.client = (width - self.frame[0], height - self.frame[1])
+        fits = self._fits()
+        self.visible = (min(self.visible[0], fits[0]), min(self.visible[1], fits[1]))
+
+    def getHandle(self) -> int:
+        """Return the native window handle."""
+        self.calls["getHandle"] += 1
+        return 1
+
+    def getClientFrame(self) -> SimpleNamespace:
+        """Return the client area rectangle."""
+        self.calls["getClientFrame"] += 1
+        return SimpleNamespace(
+            left=8, top=31, right=8 + self.client[0], bottom=31 + self.client[1]
+        )
+
+    @property
+    def size(self) -> SimpleNamespace:
+        """Return the outer window size."""
+        self.calls["size"] += 1
+        return SimpleNamespace(
+            width=self.client[0] + self.frame[0], height=self.client[1] + self.frame[1]
+        )
+
+
+def _console_resizer(module: ModuleType, host: _FakeConsoleHost) -> Any:
+    """Create the module's console resizer driving the fake `host`."""
+    return module._ConsoleResizer(
+        host,
+        host,
+        set_window_pos=host.set_window_pos,
+        rect=lambda left, top, right, bottom: SimpleNamespace(
+            Left=left, Top=top, Right=right, Bottom=bottom
+        ),
+        coord=lambda x, y: SimpleNamespace(X=x, Y=y),
+        errors=(OSError,),
+    )
+
+
+def test_console_resizer_resizes_in_one_pass_with_cached_metrics(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Resizes should converge in one pass and re-measure only on a miss."""
+    module = _load_module_with_fakes(monkeypatch)
+    host = _FakeConsoleHost((8, 16), 80, 24)
+    resizer = _console_resizer(module, host)
+
+    for columns, rows in ((120, 40), (60, 20), (100, 50), (100, 10)):
+        assert resizer.resize(columns, rows) == 1
+        assert host.visible == host.buffer == (columns, rows)
+    assert host.calls["getClientFrame"] == 1
+
+    host.cell = (10, 20)  # e.g. the font changed
+    assert resizer.resize(90, 30) == 2
+    assert host.visible == (90, 30)
+    assert host.calls["getClientFrame"] == 2
+    assert resizer.resize(95, 35) == 1
+
+
+def test_console_resizer_benchmark_halves_backend_calls(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A drag sequence should need at most half the calls of two full passes.
+
+    Two full passes cost 3 measurement calls and 5 setters each, i.e. 16
+    backend calls per resize, plus a window handle lookup per pass.
+    """
+    module = _load_module_with_fakes(monkeypatch)
+    host = _FakeConsoleHost((9, 19), 80, 24)
+    resizer = _console_resizer(module, host)
+    sizes = [(80 + offset % 37, 24 + offset % 13) for offset in range(1, 201)]
+    host.calls.clear()
+
+    passes = sum(resizer.resize(columns, rows) for columns, rows in sizes)
+
+    assert passes == len(sizes)
+    assert sum(host.calls.values()) <= len(sizes) * 16 / 2
+    assert host.calls["getClientFrame"] == 1
+    assert host.calls["SetWindowPos"] == len(sizes)
+    assert host.visible == sizes[-1]
+
+
+class _FakePool:
+    """Stand-in for the lookup executor that runs each lookup when submitted."""
+
+    def submit(self, func: Callable[[], object]) -> None:
+        """Run `func` now; its result reaches the service through its queue."""
+        func()
+
+
+def _serve(
+    module: ModuleType,
+    hosts: dict[int, _FakeConsoleHost],
+    lines: _FakeLines,
+    *,
+    find_delays: dict[int, float] | None = None,
+) -> tuple[list[dict[str, Any]], list[int]]:
+    """Serve `lines` with stand-in backends driving the fake `hosts` by PID.
+
+    The fake process of a host is `_FakeConsoleHost.process`. A lookup of a
+    PID in `find_delays` reports its result that much later. Returns the
+    replies and the PIDs attached to in order once the input has ended.
+    """
+    replies = list[dict[str, Any]]()
+    attached = list[int]()
+    delays = find_delays or {}
+
+    def find(pid: int) -> tuple[_FakeProcess, _FakeConsoleHost]:
+        """Find the fake host of `pid`, delaying the result by its delay."""
+        lines.delay = delays.get(pid, 0.0)
+        if pid not in hosts:
+            raise LookupError(f"no window for {pid}")
+        host = hosts[pid]
+        host.process = _FakeProcess(pid)
+        return host.process, host
+
+    @contextmanager
+    def attach(pid: int) -> Generator[_FakeConsoleHost, None, None]:
+        """Attach to the fake console of `pid`."""
+        attached.append(pid)
+        yield hosts[pid]
+
+    module._ResizerService(
+        find=find,
+        attach=attach,
+        make_resizer=lambda console, _window: _console_resizer(module, console),
+        send=replies.append,
+        pool=_FakePool(),
+        clock=lines.clock,
+    ).serve(lines)
+    return replies, attached
+
+
+def _request(
+    lines: _FakeLines, when: float, session: str, kind: str, **fields: Any
+) -> None:
+    """Schedule a service request line in `lines` at the time `when`."""
+    lines.at(when, json.dumps({"session": session, "type": kind, **fields}))
+
+
+def test_resizer_service_serves_many_terminals(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """One service should resize every terminal, coalescing bursts per terminal.
+
+    A slow window lookup must not hold up the other terminals.
+    """
+    module = _load_module_with_fakes(monkeypatch)
+    hosts = {pid: _FakeConsoleHost((8, 16), 80, 24) for pid in (1, 2)}
+    lines = _FakeLines()
+    _request(lines, 0.0, "a", "attach", pid=1)
+    _request(lines, 0.0, "b", "attach", pid=2)
+    _request(lines, 0.0, "c", "attach", pid=3)
+    _request(lines, 0.0, "b", "resize", columns=50, rows=10)
+    for columns in range(100, 110):
+        _request(lines, 0.3, "a", "resize", columns=columns, rows=30)
+    _request(lines, 0.8, "c", "resize", columns=1, rows=1)
+    _request(lines, 0.8, "a", "detach")
+    _request(lines, 0.8, "a", "resize", columns=1, rows=1)
+    lines.at(0.8, "{")
+    lines.at(0.8, None)
+
+    replies, attached = _serve(module, hosts, lines, find_delays={2: 0.5})
+
+    assert [reply for reply in replies if reply["session"] == "a"] == [
+        {"session": "a", "type": "attach", "result": {"pid": 1}},
+        {"session": "a", "type": "resize", "result": {"passes": 1, "skipped": 9}},
+        {"session": "a", "type": "detach", "result": None},
+        {"session": "a", "type": "resize", "error": "KeyError: 'a'"},
+    ]
+    assert [reply for reply in replies if reply["session"] == "b"] == [
+        {"session": "b", "type": "attach", "result": {"pid": 2}},
+        {"session": "b", "type": "resize", "result": {"passes": 1, "skipped": 0}},
+    ]
+    attach_order = [reply["session"] for reply in replies if reply["type"] == "attach"]
+    assert attach_order == ["a", "c", "b"]
+    assert replies.index(
+        {"session": "a", "type": "resize", "result": {"passes": 1, "skipped": 9}}
+    ) < replies.index({"session": "b", "type": "attach", "result": {"pid": 2}})
+    assert {
+        "session": "c",
+        "type": "attach",
+        "error": "LookupError: no window for 3",
+    } in replies
+    assert {"session": "c", "type": "resize", "error": "KeyError: 'c'"} in replies
+    assert replies[-1]["session"] == ""
+    assert replies[-1]["error"].startswith("JSONDecodeError: ")
+    assert hosts[1].visible == (109, 30)
+    assert hosts[2].visible == (50, 10)
+    assert attached == [1, 2]
+
+
+def test_resizer_service_reattaches_and_drops_exited_terminals(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Each resize should reattach to the console; exited terminals are dropped."""
+    module = _load_module_with_fakes(monkeypatch)
+    host = _FakeConsoleHost((8, 16), 80, 24)
+    lines = _FakeLines()
+
+    def exit_terminal() -> None:
+        """Let the terminal process of the host exit."""
+        assert host.process is not None
+        host.process.running = False
+
+    _request(lines, 0.0, "a", "attach", pid=1)
+    _request(lines, 0.3, "a", "resize", columns=90, rows=30)
+    _request(lines, 0.6, "a", "resize", columns=70, rows=20)
+    lines.at(0.9, "")
+    lines.at(1.2, exit_terminal)
+    lines.at(1.2, "")
+    _request(lines, 1.5, "a", "resize", columns=60, rows=10)
+    lines.at(1.5, None)
+
+    replies, attached = _serve(module, {1: host}, lines)
+
+    assert attached == [1, 1]
+    assert host.visible == (70, 20)
+    assert host.calls["getClientFrame"] == 1
+    assert [(reply["type"], "error" in reply) for reply in replies] == [
+        ("attach", False),
+        ("resize", False),
+        ("resize", False),
+        ("detach", False),
+        ("resize", True),
+    ]
+
+
 def test_module_declares_expected_public_api_names() -> None:
     """`__all__` should list the documented public API surface."""
     node = _module_ast()
@@ -68,10 +639,12 @@ def test_module_declares_expected_public_api_names() -> None:
     assert isinstance(all_node, ast.Tuple)
     all_values = ast.literal_eval(all_node)
     assert all_values == (
+        "find_window",
         "main",
         "resizer",
         "resizer_reader",
         "resizer_writer",
+        "service",
         "win_to_pid",
     )
 
@@ -80,14 +653,24 @@ def test_module_constants_have_expected_types_and_ranges() -> None:
     """Timing and iteration constants should remain sane and positive."""
     node = _module_ast()
     retry_interval = _find_top_level_assign_value(node, "_LOOKUP_RETRY_INTERVAL")
+    max_retry_interval = _find_top_level_assign_value(
+        node, "_LOOKUP_MAX_RETRY_INTERVAL"
+    )
     retries = _find_top_level_assign_value(node, "_LOOKUP_RETRIES")
     resize_iterations = _find_top_level_assign_value(node, "_RESIZE_ITERATIONS")
+    debounce = _find_top_level_assign_value(node, "_RESIZE_DEBOUNCE")
+    max_delay = _find_top_level_assign_value(node, "_RESIZE_MAX_DELAY")
 
     assert retry_interval is not None
     retry_interval_value = ast.literal_eval(retry_interval)
     assert isinstance(retry_interval_value, (int, float))
     assert retry_interval_value > 0
 
+    assert max_retry_interval is not None
+    max_retry_interval_value = ast.literal_eval(max_retry_interval)
+    assert isinstance(max_retry_interval_value, (int, float))
+    assert max_retry_interval_value >= retry_interval_value
+
     assert retries is not None
     retries_value = ast.literal_eval(retries)
     assert isinstance(retries_value, int)
@@ -98,6 +681,10 @@ def test_module_constants_have_expected_types_and_ranges() -> None:
     assert isinstance(resize_iterations_value, int)
     assert resize_iterations_value > 0
 
+    assert debounce is not None
+    assert max_delay is not None
+    assert 0 < ast.literal_eval(debounce) <= ast.literal_eval(max_delay)
+
 
 def test_non_windows_main_stub_raises_not_implemented() -> None:
     """The top-level (non-Windows) `main` stub should raise NotImplementedError."""
@@ -123,3 +710,4 @@ def test_module_imports_on_windows_and_exports_callables() -> None:
     assert callable(module.resizer)
     assert callable(module.resizer_reader)
     assert callable(module.resizer_writer)
+    assert callable(module.service)
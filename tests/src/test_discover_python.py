@@ -0,0 +1,133 @@
+"""Tests for ``src/discover_python.py``.
+
+These tests validate candidate enumeration, concurrent probing, suitability
+and the on-disk capability cache of the interpreter discovery helper.
+"""
+
+import importlib.util
+import os
+import platform
+import subprocess
+import sys
+from pathlib import Path
+from types import ModuleType
+from typing import Any
+
+import pytest
+
+"""Public API of this test module (empty)."""
+__all__ = ()
+
+
+def _load_module() -> ModuleType:
+    """Load the target module from source for isolated monkeypatching."""
+    path = Path(__file__).parents[2] / "src/discover_python.py"
+    spec = importlib.util.spec_from_file_location("tests_discover_python_module", path)
+    if spec is None or spec.loader is None:
+        raise AssertionError(path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX layout")
+def test_candidates_cover_path_venv_and_pyenv(tmp_path: Path) -> None:
+    """`candidates` should list PATH, virtual environment and pyenv entries."""
+    module = _load_module()
+    pyenv = tmp_path / "pyenv" / "versions" / "3.12.0" / "bin"
+    pyenv.mkdir(parents=True)
+    (pyenv / "python").touch()
+    env = {
+        "PATH": os.pathsep.join(("/one", "", "/two")),
+        "VIRTUAL_ENV": "/venv",
+        "PYENV_ROOT": str(tmp_path / "pyenv"),
+        "UV_PYTHON_INSTALL_DIR": str(tmp_path / "uv"),
+    }
+
+    found = list(module.candidates(env, str(tmp_path / "project")))
+
+    assert found[0] == "/one/python3"
+    assert "/two/python3.9" in found
+    assert found[-3:] == [
+        "/venv/bin/python",
+        str(tmp_path / "project" / ".venv" / "bin" / "python"),
+        str(pyenv / "python"),
+    ]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX shell scripts")
+def test_discover_deduplicates_and_picks_suitable(tmp_path: Path) -> None:
+    """`discover` should merge aliases, keep venvs apart and skip broken ones."""
+    module = _load_module()
+    base = os.path.realpath(getattr(sys, "_base_executable", sys.executable))
+    link = tmp_path / "python-link"
+    link.symlink_to(base)
+    venv = tmp_path / "venv"
+    subprocess.run((base, "-m", "venv", "--without-pip", str(venv)), check=True)
+    venv_python = str(venv / "bin" / "python")
+    broken = tmp_path / "broken"
+    broken.write_text("#!/bin/sh\nexit 1\n")
+    broken.chmod(0o755)
+
+    report = module.discover(
+        (base, str(link), venv_python, str(broken), str(tmp_path / "missing")),
+        ("pytest", "surely-not-installed-package"),
+    )
+
+    records = {record["executable"]: record for record in report["interpreters"]}
+    assert set(records) == {base, venv_python, str(broken)}
+    good = records[base]
+    assert good["python"] == platform.python_version()
+    assert good["prefix"] == sys.base_prefix
+    assert good["packages"]["surely-not-installed-package"] is None
+    assert good["startup_ms"] > 0
+    assert not good["suitable"]
+    assert records[venv_python]["prefix"] == str(venv)
+    assert records[venv_python]["packages"]["pytest"] is None
+    assert "error" in records[str(broken)]
+    assert report["best"] is None
+
+    report = module.discover((sys.executable,), ("pytest",))
+    assert report["best"] == os.path.abspath(sys.executable)
+
+
+def test_discover_reuses_cached_records(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    """Cached records should be reused until the requested packages change."""
+    module = _load_module()
+    site = tmp_path / "site"
+    site.mkdir()
+    probed = list[str]()
+
+    def probe(
+        path: str, packages: Any, _timeout: float, _source: str
+    ) -> dict[str, Any]:
+        """Return a fake record for `path` with only "present" installed."""
+        probed.append(path)
+        return {
+            "executable": path,
+            "prefix": str(tmp_path),
+            "python": "3.9.0",
+            "packages": {
+                package: "1.0" if package == "present" else None for package in packages
+            },
+            "site": {str(site): site.stat().st_mtime_ns},
+            "startup_ms": 1.0,
+        }
+
+    monkeypatch.setattr(module, "probe", probe)
+    interpreter = os.path.realpath(sys.executable)
+    cache = str(tmp_path / "cache")
+
+    first = module.discover((interpreter,), ("present",), cache_dir=cache)
+    assert first["best"] == interpreter
+    second = module.discover((interpreter,), ("present",), cache_dir=cache)
+    assert second == first
+    assert probed == [interpreter]
+
+    module.discover((interpreter,), ("present", "absent"), cache_dir=cache)
+    assert probed == [interpreter, interpreter]
+    report = module.discover((interpreter,), ("absent",), cache_dir=cache)
+    assert probed == [interpreter, interpreter]
+    assert report["best"] is None
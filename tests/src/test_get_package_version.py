@@ -5,6 +5,10 @@ version helper.
 """
 
 import importlib.util
+import json
+import os
+import platform
+import sys
 from pathlib import Path
 from types import ModuleType
 
@@ -65,3 +69,121 @@ def test_main_prints_empty_fields_when_no_package_name_provided(
     module = _load_module()
     module.main(["prog"])
     assert capsys.readouterr().out == " \n"
+
+
+def test_main_json_probes_interpreter_and_packages(
+    capsys: pytest.CaptureFixture[str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """`main --json` should report every requested package in one object."""
+    module = _load_module()
+    versions = {"present": "4.5.6"}
+
+    def lookup(pkg: str) -> str:
+        """Return the fake version of `pkg` or fail like a missing package."""
+        try:
+            return versions[pkg]
+        except KeyError:
+            raise module.PackageNotFoundError from None
+
+    monkeypatch.setattr(module, "version", lookup)
+
+    module.main(["prog", "--json", "present", "absent"])
+
+    result = json.loads(capsys.readouterr().out)
+    assert result["packages"] == {"present": "4.5.6", "absent": None}
+    assert result["python"] == platform.python_version()
+    assert result["platform"] == sys.platform
+    assert set(result["accelerators"]) == {"uvloop", "winloop"}
+
+
+def test_main_json_stores_cache_until_site_changes(
+    capsys: pytest.CaptureFixture[str],
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> None:
+    """Stored probes should be valid until a site directory changes."""
+    module = _load_module()
+    site = tmp_path / "site"
+    site.mkdir()
+    monkeypatch.setattr(module, "path", [str(site)])
+    monkeypatch.setattr(module, "version", lambda _pkg: "1.0")
+    cache = str(tmp_path / "cache")
+
+    module.main(
+        ["prog", "--json", "--cache-dir", cache, "--interpreter", sys.executable, "x"]
+    )
+    first = json.loads(capsys.readouterr().out)
+    assert module.load_cached(cache, sys.executable, ["x"]) == first
+    assert module.load_cached(cache, sys.executable) == first
+
+    assert module.load_cached(cache, sys.executable, ["other"]) is None
+    stat = site.stat()
+    os.utime(site, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert module.load_cached(cache, sys.executable, ["x"]) is None
+
+
+def test_cache_is_keyed_on_the_launched_path(
+    capsys: pytest.CaptureFixture[str],
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> None:
+    """Virtual environments sharing a base interpreter should not share records."""
+    module = _load_module()
+    monkeypatch.setattr(module, "path", [])
+    monkeypatch.setattr(module, "version", lambda _pkg: "1.0")
+    cache = str(tmp_path / "cache")
+    base = tmp_path / "python"
+    base.touch()
+    venvs = (tmp_path / "a" / "bin" / "python", tmp_path / "b" / "bin" / "python")
+    for venv in venvs:
+        venv.parent.mkdir(parents=True)
+        venv.symlink_to(base)
+
+    module.main(
+        ["prog", "--json", "--cache-dir", cache, "--interpreter", str(venvs[0])]
+    )
+    first = json.loads(capsys.readouterr().out)
+
+    assert module.load_cached(cache, str(venvs[0])) == first
+    assert module.load_cached(cache, str(venvs[1])) is None
+    assert module.load_cached(cache, str(base)) is None
+
+    stat = base.stat()
+    os.utime(base, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert module.load_cached(cache, str(venvs[0])) is None
+
+
+def test_cache_is_invalidated_by_pyvenv_cfg(
+    capsys: pytest.CaptureFixture[str],
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> None:
+    """Creating, changing or removing ``pyvenv.cfg`` should invalidate a record."""
+    module = _load_module()
+    monkeypatch.setattr(module, "path", [])
+    monkeypatch.setattr(module, "version", lambda _pkg: "1.0")
+    cache = str(tmp_path / "cache")
+    interpreter = tmp_path / "venv" / "bin" / "python"
+    interpreter.parent.mkdir(parents=True)
+    interpreter.touch()
+    config = tmp_path / "venv" / "pyvenv.cfg"
+    argv = ["prog", "--json", "--cache-dir", cache, "--interpreter", str(interpreter)]
+
+    module.main(argv)
+    capsys.readouterr()
+    assert module.load_cached(cache, str(interpreter)) is not None
+    config.write_text("home = /usr/bin\n")
+    assert module.load_cached(cache, str(interpreter)) is None
+
+    module.main(argv)
+    capsys.readouterr()
+    assert module.load_cached(cache, str(interpreter)) is not None
+    stat = config.stat()
+    os.utime(config, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert module.load_cached(cache, str(interpreter)) is None
+
+    module.main(argv)
+    capsys.readouterr()
+    config.unlink()
+    assert module.load_cached(cache, str(interpreter)) is None
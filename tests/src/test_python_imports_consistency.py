@@ -35,13 +35,23 @@ _STDLIB_MODULE_NAMES: AbstractSet[str] = (
     if hasattr(sys, "stdlib_module_names")
     else frozenset(
         {
-            "__future__",
             "abc",
+            "argparse",
+            "array",
+            "bisect",
+            "codecs",
             "collections",
+            "concurrent",
             "contextlib",
+            "cProfile",
+            "ctypes",
             "enum",
+            "faulthandler",
             "fcntl",
             "functools",
+            "__future__",
+            "glob",
+            "hashlib",
             "importlib",
             "inspect",
             "io",
@@ -53,11 +63,15 @@ _STDLIB_MODULE_NAMES: AbstractSet[str] = (
             "os",
             "pathlib",
             "platform",
+            "posixpath",
             "pty",
+            "queue",
             "re",
+            "resource",
             "selectors",
             "shutil",
             "signal",
+            "socket",
             "struct",
             "subprocess",
             "sys",
@@ -65,8 +79,10 @@ _STDLIB_MODULE_NAMES: AbstractSet[str] = (
             "termios",
             "threading",
             "time",
+            "tracemalloc",
             "types",
             "typing",
+            "unicodedata",
             "uuid",
             "warnings",
             "weakref",